@@ -0,0 +1,119 @@
+"""initial schema
+
+Revision ID: 6f1c2a9d3b10
+Revises: 
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1c2a9d3b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # las bases de datos existentes ya tienen estas tablas, solo se crean las que no existen
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('email', sa.String(), unique=True),
+            sa.Column('password', sa.String()),
+            sa.Column('admin', sa.Boolean()),
+        )
+        op.create_index('ix_user_id', 'user', ['id'])
+
+    if 'profile' not in existing:
+        op.create_table(
+            'profile',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String()),
+            sa.Column('phone', sa.String()),
+            sa.Column('profile_photo_path', sa.String()),
+            sa.Column('cover_photo_path', sa.String()),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id')),
+        )
+        op.create_index('ix_profile_id', 'profile', ['id'])
+
+    if 'conservation_area' not in existing:
+        op.create_table(
+            'conservation_area',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String()),
+            sa.Column('description', sa.String()),
+            sa.Column('photos_path', sa.String()),
+            sa.Column('region_path', sa.String()),
+        )
+        op.create_index('ix_conservation_area_id', 'conservation_area', ['id'])
+
+    if 'tourist_destination' not in existing:
+        op.create_table(
+            'tourist_destination',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String()),
+            sa.Column('description', sa.String()),
+            sa.Column('schedule', sa.String()),
+            sa.Column('fare', sa.String()),
+            sa.Column('contact', sa.String()),
+            sa.Column('recommendation', sa.String()),
+            sa.Column('difficulty', sa.Integer()),
+            sa.Column('latitude', sa.Float()),
+            sa.Column('longitude', sa.Float()),
+            sa.Column('hikes', sa.String()),
+            sa.Column('photos_path', sa.String()),
+            sa.Column('is_beach', sa.Boolean()),
+            sa.Column('is_forest', sa.Boolean()),
+            sa.Column('is_volcano', sa.Boolean()),
+            sa.Column('is_mountain', sa.Boolean()),
+            sa.Column('start_season', sa.Integer()),
+            sa.Column('end_season', sa.Integer()),
+            sa.Column('conservation_area_id', sa.Integer(), sa.ForeignKey('conservation_area.id')),
+        )
+        op.create_index('ix_tourist_destination_id', 'tourist_destination', ['id'])
+
+    for table, target in [('favorite_area', 'conservation_area'), ('favorite_destination', 'tourist_destination'),
+                          ('visited_destination', 'tourist_destination')]:
+        if table not in existing:
+            op.create_table(
+                table,
+                sa.Column('id', sa.Integer(), primary_key=True),
+                sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id')),
+                sa.Column(f'{target}_id', sa.Integer(), sa.ForeignKey(f'{target}.id')),
+            )
+            op.create_index(f'ix_{table}_id', table, ['id'])
+
+    if 'review' not in existing:
+        op.create_table(
+            'review',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('title', sa.String()),
+            sa.Column('text', sa.String()),
+            sa.Column('date', sa.DateTime()),
+            sa.Column('calification', sa.Integer()),
+            sa.Column('image_path', sa.String()),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id')),
+            sa.Column('tourist_destination_id', sa.Integer(), sa.ForeignKey('tourist_destination.id')),
+        )
+        op.create_index('ix_review_id', 'review', ['id'])
+
+    if 'gallery' not in existing:
+        op.create_table(
+            'gallery',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('photos_path', sa.String()),
+            sa.Column('profile_id', sa.Integer(), sa.ForeignKey('profile.id')),
+        )
+        op.create_index('ix_gallery_id', 'gallery', ['id'])
+
+
+def downgrade():
+    for table in ['gallery', 'review', 'visited_destination', 'favorite_destination', 'favorite_area',
+                  'tourist_destination', 'conservation_area', 'profile', 'user']:
+        op.drop_table(table)
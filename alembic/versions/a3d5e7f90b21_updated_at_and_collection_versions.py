@@ -0,0 +1,43 @@
+"""updated_at columns and collection versions
+
+Revision ID: a3d5e7f90b21
+Revises: 6f1c2a9d3b10
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5e7f90b21'
+down_revision = '6f1c2a9d3b10'
+branch_labels = None
+depends_on = None
+
+# Tablas con fecha de modificación y versión de colección
+VERSIONED_TABLES = ['conservation_area', 'tourist_destination', 'review', 'profile']
+
+
+def upgrade():
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+    collection_version = op.create_table(
+        'collection_version',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(collection_version, [{'name': table, 'version': 1, 'updated_at': now} for table in VERSIONED_TABLES])
+
+
+def downgrade():
+    op.drop_table('collection_version')
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,57 @@
+"""destination detail indexes
+
+Revision ID: b5d9e2f7a4c8
+Revises: f2a8d4c6b1e3
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d9e2f7a4c8'
+down_revision = 'f2a8d4c6b1e3'
+branch_labels = None
+depends_on = None
+
+# Índices compuestos de las consultas del detalle de un destino
+DETAIL_INDEXES = [
+    ('review', ['tourist_destination_id', 'date']),
+    ('review', ['user_id', 'tourist_destination_id']),
+    ('favorite_destination', ['user_id', 'tourist_destination_id']),
+    ('visited_destination', ['user_id', 'tourist_destination_id']),
+]
+
+# Índices de una columna que quedan cubiertos por el prefijo de los índices compuestos
+REDUNDANT_INDEXES = [
+    ('review', 'tourist_destination_id'),
+    ('review', 'user_id'),
+    ('favorite_destination', 'user_id'),
+    ('visited_destination', 'user_id'),
+]
+
+
+def upgrade():
+    existing = {(table, index['name']) for table, _ in DETAIL_INDEXES
+                for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    # en PostgreSQL los índices se crean de forma concurrente para no bloquear las escrituras, lo cual
+    # no se permite dentro de una transacción
+    with op.get_context().autocommit_block():
+        for table, columns in DETAIL_INDEXES:
+            name = f"ix_{table}_{'_'.join(columns)}"
+            if (table, name) not in existing:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        # se eliminan después de crear los compuestos para que las consultas por usuario siempre tengan un índice
+        for table, column in REDUNDANT_INDEXES:
+            name = f'ix_{table}_{column}'
+            if (table, name) in existing:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, column in reversed(REDUNDANT_INDEXES):
+            op.create_index(f'ix_{table}_{column}', table, [column], postgresql_concurrently=True)
+        for table, columns in reversed(DETAIL_INDEXES):
+            op.drop_index(f"ix_{table}_{'_'.join(columns)}", table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,46 @@
+"""foreign key indexes
+
+Revision ID: c81e4b62d7f3
+Revises: a3d5e7f90b21
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e4b62d7f3'
+down_revision = 'a3d5e7f90b21'
+branch_labels = None
+depends_on = None
+
+# Columnas de llaves foráneas utilizadas en los filtros de las rutas
+FOREIGN_KEY_INDEXES = [
+    ('favorite_area', 'user_id'),
+    ('favorite_destination', 'user_id'),
+    ('visited_destination', 'user_id'),
+    ('review', 'tourist_destination_id'),
+    ('review', 'user_id'),
+    ('tourist_destination', 'conservation_area_id'),
+    ('profile', 'user_id'),
+    ('gallery', 'profile_id'),
+]
+
+
+def upgrade():
+    existing = {(table, index['name']) for table, _ in FOREIGN_KEY_INDEXES
+                for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    # en PostgreSQL los índices se crean de forma concurrente para no bloquear las escrituras, lo cual
+    # no se permite dentro de una transacción
+    with op.get_context().autocommit_block():
+        for table, column in FOREIGN_KEY_INDEXES:
+            name = f'ix_{table}_{column}'
+            if (table, name) not in existing:
+                op.create_index(name, table, [column], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, column in reversed(FOREIGN_KEY_INDEXES):
+            op.drop_index(f'ix_{table}_{column}', table_name=table, postgresql_concurrently=True)
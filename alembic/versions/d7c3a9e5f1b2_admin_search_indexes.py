@@ -0,0 +1,43 @@
+"""admin search indexes
+
+Revision ID: d7c3a9e5f1b2
+Revises: b5d9e2f7a4c8
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7c3a9e5f1b2'
+down_revision = 'b5d9e2f7a4c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    existing = {(table, index['name']) for table in ('user', 'profile')
+                for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    if postgresql:
+        # el índice de trigramas del nombre requiere la extensión pg_trgm
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # en PostgreSQL los índices se crean de forma concurrente para no bloquear las escrituras, lo cual
+    # no se permite dentro de una transacción
+    with op.get_context().autocommit_block():
+        if ('user', 'ix_user_email_pattern') not in existing:
+            # prefijo del correo sin distinguir mayúsculas, LIKE utiliza text_pattern_ops con cualquier intercalación
+            op.create_index('ix_user_email_pattern', 'user',
+                            [sa.text('lower(email) text_pattern_ops' if postgresql else 'lower(email)')],
+                            postgresql_concurrently=True)
+        if ('profile', 'ix_profile_name_trgm') not in existing:
+            # búsqueda de una parte del nombre con ILIKE
+            op.create_index('ix_profile_name_trgm', 'profile', ['name'], postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_profile_name_trgm', table_name='profile', postgresql_concurrently=True)
+        op.drop_index('ix_user_email_pattern', table_name='user', postgresql_concurrently=True)
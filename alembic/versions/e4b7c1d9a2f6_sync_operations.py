@@ -0,0 +1,35 @@
+"""sync operations
+
+Revision ID: e4b7c1d9a2f6
+Revises: c81e4b62d7f3
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c1d9a2f6'
+down_revision = 'c81e4b62d7f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sync_operation',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('op_id', sa.String(), nullable=False),
+        sa.Column('status', sa.Integer(), nullable=False),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('user_id', 'op_id'),
+    )
+    op.create_index('ix_sync_operation_id', 'sync_operation', ['id'])
+
+
+def downgrade():
+    op.drop_index('ix_sync_operation_id', table_name='sync_operation')
+    op.drop_table('sync_operation')
@@ -0,0 +1,41 @@
+"""change log
+
+Revision ID: f2a8d4c6b1e3
+Revises: e4b7c1d9a2f6
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8d4c6b1e3'
+down_revision = 'e4b7c1d9a2f6'
+branch_labels = None
+depends_on = None
+
+# Colecciones incluidas en la sincronización incremental
+CHANGE_LOG_TABLES = ['conservation_area', 'tourist_destination', 'review']
+
+
+def upgrade():
+    op.create_table(
+        'change_log',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('collection', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.String(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_change_log_collection_entity_id', 'change_log', ['collection', 'entity_id'])
+    # los registros existentes se agregan como cambios, de forma que el cursor cero corresponde al catálogo completo
+    for table in CHANGE_LOG_TABLES:
+        op.execute(f"INSERT INTO change_log (collection, entity_id, operation, changed_at) "
+                   f"SELECT '{table}', id, 'upsert', CURRENT_TIMESTAMP FROM {table} ORDER BY id")
+
+
+def downgrade():
+    op.drop_index('ix_change_log_collection_entity_id', table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_test import PASSWORD, Recorder, create_client, git_commit, prepare, zipf_weights
+
+"""
+Se compara la pantalla de un destino turístico con las cinco solicitudes que realiza actualmente la
+aplicación móvil (destino, /reviews, /user-review, /favorite y /visited, una después de otra) y con la
+ruta /tourist-destination/{id}/detail que responde lo mismo en una sola solicitud. Se mide el tiempo
+hasta tener todos los datos de la pantalla, con los mismos usuarios virtuales y destinos elegidos con
+la distribución de popularidad de las pruebas de carga; cada usuario alterna el orden de los recorridos.
+
+Uso:
+    python benchmarks/destination_detail.py --users 20 --iterations 20
+    python benchmarks/destination_detail.py --url http://localhost:8000 --users 50
+"""
+
+CURRENT_FLOW = 'cinco solicitudes'
+DETAIL_FLOW = 'GET /tourist-destination/{id}/detail'
+
+
+def current_requests(destination_id):
+    # solicitudes actuales de la pantalla, /user-review responde 404 si el usuario no tiene opinión
+    return [(f'/tourist-destination/{destination_id}', (200,)),
+            (f'/tourist-destination/{destination_id}/reviews', (200,)),
+            (f'/tourist-destination/{destination_id}/user-review', (200, 404)),
+            (f'/tourist-destination/{destination_id}/favorite', (200,)),
+            (f'/tourist-destination/{destination_id}/visited', (200,))]
+
+
+async def screen(client, recorder, name, requests, headers):
+    """
+    Función para obtener los datos de la pantalla con una lista de solicitudes y registrar la duración total.
+    :param client: cliente HTTP.
+    :param recorder: registro de las duraciones.
+    :param name: nombre del recorrido en el reporte.
+    :param requests: lista de direcciones con los códigos de estado esperados.
+    :param headers: encabezados con el token del usuario.
+    """
+    started = time.perf_counter()
+    failed = False
+    for url, expected in requests:
+        response = await client.get(url, headers=headers)
+        failed = failed or response.status_code not in expected
+    recorder.latencies.setdefault(name, []).append(time.perf_counter() - started)
+    if failed:
+        recorder.errors[name] = recorder.errors.get(name, 0) + 1
+
+
+async def virtual_user(client, recorder, email, destinations, weights, rng, iterations):
+    """
+    Función que abre la pantalla de destinos elegidos al azar con ambos recorridos.
+    """
+    response = await client.post('/login', json={'email': email, 'password': PASSWORD})
+    headers = {'Authorization': f"Bearer {response.json()['token']}"}
+    for iteration in range(iterations):
+        destination_id = rng.choices(destinations, weights)[0]
+        flows = [(CURRENT_FLOW, current_requests(destination_id)),
+                 (DETAIL_FLOW, [(f'/tourist-destination/{destination_id}/detail', (200,))])]
+        for name, requests in flows if iteration % 2 == 0 else reversed(flows):
+            await screen(client, recorder, name, requests, headers)
+
+
+async def run(args):
+    """
+    Función para ejecutar la comparación.
+    :param args: parámetros de la línea de comandos.
+    :return: diccionario con la configuración y los resultados de cada recorrido.
+    """
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    async with create_client(args.url) as client:
+        emails, destinations = await prepare(client, args.users, args.seed)
+        rng.shuffle(destinations)
+        weights = zipf_weights(len(destinations))
+        started = time.perf_counter()
+        await asyncio.gather(*[virtual_user(client, recorder, email, destinations, weights,
+                                            random.Random(rng.random()), args.iterations) for email in emails])
+        elapsed = time.perf_counter() - started
+    return {
+        'commit': git_commit(),
+        'target': args.url or 'in-process',
+        'config': {'users': args.users, 'iterations': args.iterations, 'seed': args.seed},
+        'elapsed': elapsed,
+        'flows': recorder.report(elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara la pantalla de un destino con cinco solicitudes '
+                                                 'y con la ruta de detalle.')
+    parser.add_argument('--url', help='dirección de un servidor en ejecución, por defecto el mismo proceso')
+    parser.add_argument('--users', type=int, default=10, help='cantidad de usuarios virtuales concurrentes')
+    parser.add_argument('--iterations', type=int, default=20, help='pantallas abiertas por usuario')
+    parser.add_argument('--seed', type=int, default=2021, help='semilla de los datos y recorridos')
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    # Se cargan las variables de entorno de la aplicación, la base de datos debe ser de prueba
+    load_dotenv('.env')
+    results = asyncio.run(run(args))
+
+    print(f"{'recorrido':<40} {'pantallas':>9} {'errores':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, item in results['flows'].items():
+        print(f"{name:<40} {item['requests']:>9} {item['errors']:>7} "
+              f"{item['p50_ms']:>8.1f} {item['p95_ms']:>8.1f} {item['p99_ms']:>8.1f}")
+    current, detail = results['flows'].get(CURRENT_FLOW), results['flows'].get(DETAIL_FLOW)
+    if current and detail and detail['p50_ms'] and detail['p95_ms']:
+        print(f"La ruta de detalle es {current['p50_ms'] / detail['p50_ms']:.1f} veces más rápida en p50 y "
+              f"{current['p95_ms'] / detail['p95_ms']:.1f} veces en p95")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'Resultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
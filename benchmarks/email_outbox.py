@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Se cargan las variables de entorno de la aplicación, el servidor de correo es local
+load_dotenv('.env')
+
+from aiosmtpd.controller import Controller
+from fastapi import HTTPException
+
+from src.outbox import EmailOutbox
+
+"""
+Se verifica la bandeja de salida de correos contra un servidor SMTP local (aiosmtpd): la entrega de
+todos los correos en lotes con una sola conexión, los reintentos ante fallas temporales del servidor,
+los correos reservados que se liberan o descartan, el rechazo con 503 cuando la bandeja está llena y
+la cancelación de los reintentos pendientes al detenerla. El script termina con error si alguna
+verificación falla.
+
+Uso:
+    python benchmarks/email_outbox.py --messages 500
+"""
+
+
+class Handler:
+    """
+    Servidor SMTP de prueba que guarda los destinatarios recibidos y responde con una falla temporal
+    a los primeros mensajes indicados.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failures:
+            self.failures -= 1
+            return '451 4.3.0 Temporary failure'
+        self.received.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+
+def create_outbox(port, **kwargs):
+    return EmailOutbox(hostname='127.0.0.1', port=port, sender='noreply@sinac.test', start_tls=False,
+                       use_credentials=False, template_folder=os.path.join(ROOT, 'assets', 'email'),
+                       retry_delay=0.05, **kwargs)
+
+
+async def wait_until(condition, timeout):
+    started = time.monotonic()
+    while not condition() and time.monotonic() - started < timeout:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+async def check_delivery(handler, port, messages):
+    outbox = create_outbox(port, batch_size=50)
+    started = time.perf_counter()
+    for number in range(messages):
+        await outbox.enqueue(f'user{number}@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'})
+    delivered = await wait_until(lambda: len(handler.received) == messages, 30)
+    elapsed = time.perf_counter() - started
+    await outbox.stop()
+    assert delivered, f'{len(handler.received)}/{messages} correos recibidos'
+    assert len(set(handler.received)) == messages, 'se recibieron correos duplicados'
+    return f'{messages} correos en {elapsed:.2f} s ({messages / elapsed:.0f}/s), {outbox.connections} conexiones'
+
+
+async def check_retries(handler, port):
+    handler.failures = 3
+    outbox = create_outbox(port)
+    await outbox.enqueue('retry@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'})
+    delivered = await wait_until(lambda: 'retry@sinac.test' in handler.received, 10)
+    await outbox.stop()
+    assert delivered, 'el correo no se entregó después de las fallas temporales'
+    assert outbox.retried == 3 and outbox.failed == 0, f'{outbox.stats()}'
+    return f'entregado después de {outbox.retried} reintentos'
+
+
+async def check_hold(handler, port):
+    outbox = create_outbox(port)
+    released = await outbox.enqueue('released@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'},
+                                    hold=True)
+    discarded = await outbox.enqueue('discarded@sinac.test', 'Prueba', 'reset_password.html',
+                                     {'password': 'x'}, hold=True)
+    await asyncio.sleep(0.2)
+    assert 'released@sinac.test' not in handler.received, 'se envió un correo reservado'
+    outbox.discard(discarded)
+    outbox.release(released)
+    delivered = await wait_until(lambda: 'released@sinac.test' in handler.received, 10)
+    await outbox.stop()
+    assert delivered, 'el correo liberado no se entregó'
+    assert 'discarded@sinac.test' not in handler.received, 'se envió un correo descartado'
+    return 'el correo liberado se entrega y el descartado no'
+
+
+async def check_full(port):
+    outbox = create_outbox(port, max_queue=2)
+    await outbox.enqueue('a@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'}, hold=True)
+    await outbox.enqueue('b@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'}, hold=True)
+    try:
+        await outbox.enqueue('c@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'})
+        status = None
+    except HTTPException as error:
+        status = error.status_code
+    outbox.held.clear()
+    await outbox.stop()
+    assert status == 503, f'se esperaba 503 con la bandeja llena, se obtuvo {status}'
+    return 'la bandeja llena responde 503'
+
+
+async def check_stop(handler, port):
+    handler.failures = 1000
+    outbox = create_outbox(port, max_retries=1000)
+    outbox.retry_delay = 60
+    await outbox.enqueue('stop@sinac.test', 'Prueba', 'reset_password.html', {'password': 'x'})
+    scheduled = await wait_until(lambda: bool(outbox.retries), 10)
+    tasks = set(outbox.retries)
+    await outbox.stop(timeout=0.1)
+    await asyncio.sleep(0)
+    handler.failures = 0
+    assert scheduled, 'no se programó el reintento'
+    assert not outbox.retries and all(task.cancelled() for task in tasks), 'quedaron reintentos pendientes'
+    return f'{len(tasks)} reintentos cancelados al detener la bandeja'
+
+
+async def run(args):
+    handler = Handler()
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    checks = [
+        ('entrega', check_delivery(handler, args.port, args.messages)),
+        ('reintentos', check_retries(handler, args.port)),
+        ('reservados', check_hold(handler, args.port)),
+        ('bandeja llena', check_full(args.port)),
+        ('detener', check_stop(handler, args.port)),
+    ]
+    failures = 0
+    try:
+        for name, check in checks:
+            try:
+                print(f'ok   {name}: {await check}')
+            except AssertionError as error:
+                failures += 1
+                print(f'FAIL {name}: {error}')
+    finally:
+        controller.stop()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica la bandeja de salida de correos con un servidor SMTP local.')
+    parser.add_argument('--port', type=int, default=8025, help='puerto del servidor SMTP de prueba')
+    parser.add_argument('--messages', type=int, default=200, help='cantidad de correos de la prueba de entrega')
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(run(args)) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+"""
+Se establecen las pruebas de carga de la API. Cada usuario virtual repite el recorrido de la aplicación
+móvil: inicio de sesión, catálogo de áreas y destinos, detalle de un destino, opiniones, marcar o
+desmarcar el destino como favorito y subir una fotografía de perfil. Los destinos se eligen con una
+distribución de popularidad sesgada (Zipf) a partir de una semilla, de forma que las ejecuciones sean
+comparables. La API se ejecuta en el mismo proceso (cliente ASGI) o se indica la dirección de un
+servidor uvicorn en ejecución. Los resultados se guardan en JSON junto al commit evaluado.
+
+Uso:
+    python benchmarks/load_test.py --users 20 --iterations 10
+    python benchmarks/load_test.py --url http://localhost:8000 --users 50 --duration 60
+    python benchmarks/load_test.py --compare benchmarks/results/anterior.json
+"""
+
+# Contraseña de los usuarios creados para las pruebas
+PASSWORD = "LoadTest-2021"
+
+# Destinos creados si el catálogo tiene menos que esta cantidad
+MIN_DESTINATIONS = 20
+
+# Percentiles reportados
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """
+    Clase que almacena la duración de cada solicitud por ruta.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, client, name, method, url, expected=(200, 201), **kwargs):
+        """
+        Función para realizar una solicitud y registrar su duración.
+        :param client: cliente HTTP.
+        :param name: nombre de la ruta en el reporte.
+        :param method: método HTTP.
+        :param url: dirección de la ruta.
+        :param expected: códigos de estado esperados.
+        :return: respuesta recibida o None si falló.
+        """
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        if response is None or response.status_code not in expected:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None
+        return response
+
+    def report(self, elapsed):
+        """
+        Función para calcular las métricas de cada ruta.
+        :param elapsed: segundos de duración de la prueba.
+        :return: diccionario con las solicitudes, errores, rendimiento y percentiles por ruta.
+        """
+        results = {}
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            results[name] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(name, 0),
+                'throughput': len(latencies) / elapsed,
+                'mean_ms': sum(latencies) / len(latencies) * 1000,
+                **{f'p{p}_ms': percentile(latencies, p) * 1000 for p in PERCENTILES},
+            }
+        return results
+
+
+def percentile(values, p):
+    """
+    Función para obtener un percentil de una lista ordenada, por el método del rango más cercano.
+    :param values: lista ordenada de valores.
+    :param p: percentil entre 0 y 100.
+    :return: valor del percentil.
+    """
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Función para obtener los pesos de una distribución de popularidad sesgada, pocos destinos
+    concentran la mayoría de las visitas.
+    :param count: cantidad de elementos.
+    :param exponent: sesgo de la distribución.
+    :return: lista de pesos.
+    """
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def sample_image():
+    """
+    Función para generar una fotografía de prueba en JPEG.
+    :return: bytes de la imagen.
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (34, 139, 34)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+async def prepare(client, users, seed):
+    """
+    Función para crear los usuarios de la prueba y completar el catálogo si está vacío.
+    :param client: cliente HTTP.
+    :param users: cantidad de usuarios virtuales.
+    :param seed: semilla de la prueba, forma parte del correo de los usuarios.
+    :return: tupla con la lista de correos y la lista de identificadores de destinos.
+    """
+    emails = []
+    for index in range(users):
+        email = f'loadtest-{seed}-{index}@sinac.test'
+        response = await client.post('/add-user', json={'id': 0, 'email': email, 'password': PASSWORD,
+                                                        'admin': index == 0})
+        if response.status_code == 201:
+            await client.post('/add-profile', json={'id': 0, 'name': f'Carga {index}', 'phone': '',
+                                                    'user_id': response.json()['id'], 'profile_photo_path': '',
+                                                    'cover_photo_path': ''})
+        emails.append(email)
+
+    destinations = [item['id'] for item in (await client.get('/tourist-destination')).json()]
+    if len(destinations) < MIN_DESTINATIONS:
+        token = (await client.post('/login', json={'email': emails[0], 'password': PASSWORD})).json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        area = await client.post('/conservation-area', headers=headers, json={
+            'id': 0, 'name': 'Área de carga', 'description': '', 'photos_path': '', 'region_path': ''})
+        for index in range(MIN_DESTINATIONS - len(destinations)):
+            response = await client.post('/tourist-destination', headers=headers, json={
+                'id': 0, 'name': f'Destino de carga {index}', 'description': '', 'schedule': '', 'fare': '',
+                'contact': '', 'recommendation': '', 'difficulty': 1, 'latitude': 10.0, 'longitude': -84.0,
+                'hikes': '', 'photos_path': '', 'is_beach': index % 2 == 0, 'is_forest': index % 3 == 0,
+                'is_volcano': index % 5 == 0, 'is_mountain': index % 7 == 0, 'start_season': 1,
+                'end_season': 12, 'conservation_area_id': area.json()['id']})
+            destinations.append(response.json()['id'])
+    return emails, destinations
+
+
+async def mobile_session(client, recorder, email, destinations, weights, rng, image):
+    """
+    Función que ejecuta una vez el recorrido de un usuario de la aplicación móvil.
+    :param client: cliente HTTP.
+    :param recorder: registro de las solicitudes.
+    :param email: correo del usuario virtual.
+    :param destinations: identificadores de los destinos.
+    :param weights: popularidad de cada destino.
+    :param rng: generador de números aleatorios del usuario.
+    :param image: fotografía a subir.
+    """
+    response = await recorder.request(client, 'POST /login', 'POST', '/login',
+                                      json={'email': email, 'password': PASSWORD})
+    if response is None:
+        return
+    headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+    await recorder.request(client, 'GET /conservation-area', 'GET', '/conservation-area')
+    await recorder.request(client, 'GET /tourist-destination', 'GET', '/tourist-destination')
+
+    destination_id = rng.choices(destinations, weights)[0]
+    await recorder.request(client, 'GET /tourist-destination/{id}', 'GET', f'/tourist-destination/{destination_id}')
+    await recorder.request(client, 'GET /tourist-destination/{id}/reviews', 'GET',
+                           f'/tourist-destination/{destination_id}/reviews')
+
+    # se marca el destino como favorito o se desmarca si ya lo era
+    response = await recorder.request(client, 'GET /tourist-destination/{id}/favorite', 'GET',
+                                      f'/tourist-destination/{destination_id}/favorite', headers=headers)
+    if response is not None and response.json():
+        await recorder.request(client, 'DELETE /tourist-destination/all/favorite/{id}', 'DELETE',
+                               f'/tourist-destination/all/favorite/{response.json()}', headers=headers)
+    elif response is not None:
+        await recorder.request(client, 'POST /tourist-destination/{id}/favorite', 'POST',
+                               f'/tourist-destination/{destination_id}/favorite', headers=headers)
+
+    await recorder.request(client, 'POST /profiles/photo/{type}', 'POST', '/profiles/photo/profile', headers=headers,
+                           files={'image': ('profile.jpg', image, 'image/jpeg')})
+
+
+async def virtual_user(client, recorder, email, destinations, weights, rng, image, iterations, deadline):
+    """
+    Función que repite el recorrido de un usuario hasta completar las iteraciones o el tiempo de la prueba.
+    """
+    iteration = 0
+    while (deadline is None and iteration < iterations) or (deadline is not None and time.monotonic() < deadline):
+        await mobile_session(client, recorder, email, destinations, weights, rng, image)
+        iteration += 1
+
+
+def create_client(url):
+    """
+    Función para crear el cliente HTTP, contra un servidor en ejecución o la aplicación en el mismo proceso.
+    :param url: dirección del servidor o None.
+    :return: cliente HTTP asíncrono.
+    """
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+    # los límites de intentos de inicio de sesión se desactivan, todos los usuarios comparten la dirección
+    os.environ.setdefault('THROTTLE_IP_LIMIT', '1000000')
+    os.environ.setdefault('THROTTLE_EMAIL_LIMIT', '1000000')
+    from main import sinac_turismo_api
+    return httpx.AsyncClient(app=sinac_turismo_api, base_url='http://loadtest', timeout=60)
+
+
+def git_commit():
+    """
+    Función para obtener el commit evaluado, permite comparar resultados entre versiones.
+    :return: identificador corto del commit o None fuera del repositorio.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    """
+    Función para mostrar la diferencia de latencia con una ejecución anterior.
+    :param results: resultados de la ejecución actual.
+    :param previous_path: archivo JSON de la ejecución anterior.
+    """
+    with open(previous_path) as file:
+        previous = json.load(file)
+    print(f"\nComparación con {previous.get('commit')} ({previous.get('timestamp')}):")
+    for name, current in results['endpoints'].items():
+        before = previous['endpoints'].get(name)
+        if before:
+            change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            print(f"  {name:<48} p95 {before['p95_ms']:8.1f} -> {current['p95_ms']:8.1f} ms ({change:+.1f}%)")
+
+
+async def run(args):
+    """
+    Función para ejecutar la prueba de carga.
+    :param args: parámetros de la línea de comandos.
+    :return: diccionario con la configuración y los resultados por ruta.
+    """
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    async with create_client(args.url) as client:
+        emails, destinations = await prepare(client, args.users, args.seed)
+        rng.shuffle(destinations)
+        weights = zipf_weights(len(destinations))
+        image = sample_image()
+        deadline = time.monotonic() + args.duration if args.duration else None
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            virtual_user(client, recorder, email, destinations, weights, random.Random(rng.random()), image,
+                         args.iterations, deadline) for email in emails])
+        elapsed = time.perf_counter() - started
+    endpoints = recorder.report(elapsed)
+    total = sum(item['requests'] for item in endpoints.values())
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'target': args.url or 'in-process',
+        'config': {'users': args.users, 'iterations': args.iterations, 'duration': args.duration, 'seed': args.seed},
+        'elapsed': elapsed,
+        'throughput': total / elapsed,
+        'endpoints': endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pruebas de carga de la API con el recorrido de la aplicación móvil.')
+    parser.add_argument('--url', help='dirección de un servidor en ejecución, por defecto se utiliza el mismo proceso')
+    parser.add_argument('--users', type=int, default=10, help='cantidad de usuarios virtuales concurrentes')
+    parser.add_argument('--iterations', type=int, default=5, help='recorridos por usuario')
+    parser.add_argument('--duration', type=float, help='segundos de la prueba, reemplaza a --iterations')
+    parser.add_argument('--seed', type=int, default=2021, help='semilla de los datos y recorridos')
+    parser.add_argument('--output', help='archivo JSON de resultados, por defecto en benchmarks/results')
+    parser.add_argument('--compare', help='archivo JSON de una ejecución anterior')
+    args = parser.parse_args()
+
+    # Se cargan las variables de entorno de la aplicación, la base de datos debe ser de prueba
+    load_dotenv('.env')
+    results = asyncio.run(run(args))
+
+    print(f"{'ruta':<48} {'solic.':>7} {'errores':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, item in results['endpoints'].items():
+        print(f"{name:<48} {item['requests']:>7} {item['errors']:>7} {item['throughput']:>8.1f} "
+              f"{item['p50_ms']:>8.1f} {item['p95_ms']:>8.1f} {item['p99_ms']:>8.1f}")
+    print(f"Total: {results['throughput']:.1f} solicitudes por segundo en {results['elapsed']:.1f} s")
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"load-{results['commit'] or 'local'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Resultados guardados en {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
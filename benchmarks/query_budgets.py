@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Se cargan las variables de entorno de la aplicación, la base de datos debe ser de prueba
+load_dotenv('.env')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///query_budgets.sqlite')
+# el paquete del catálogo no se regenera en segundo plano, el presupuesto cuenta todas las consultas del proceso
+os.environ.setdefault('CATALOG_BUNDLE_SECONDS', '0')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from benchmarks.query_plans import seed
+from main import sinac_turismo_api
+from src.authentication import encode_token
+from src.query_stats import query_budget
+from src.response_cache import response_cache
+
+"""
+Se verifica la cantidad de consultas SQL de las rutas principales. Cada ruta se solicita con la caché
+de respuestas vacía sobre una base de datos con datos de prueba y el script termina con error si
+alguna supera su presupuesto de consultas.
+
+Uso:
+    DATABASE_URL=sqlite:///query_budgets.sqlite python benchmarks/query_budgets.py
+"""
+
+# Ruta, si requiere autenticación y cantidad máxima de consultas
+BUDGETS = [
+    ('/conservation-area', False, 2),
+    ('/conservation-area/1', False, 2),
+    ('/conservation-area/1/detail', False, 4),
+    ('/tourist-destination', False, 2),
+    ('/tourist-destination/1', False, 2),
+    ('/tourist-destination/conservation-area/1', False, 2),
+    ('/tourist-destination/season/3', False, 2),
+    ('/tourist-destination/1/reviews', False, 2),
+    ('/tourist-destination/1/detail', True, 5),
+    ('/tourist-destination/all/favorite', True, 2),
+    ('/tourist-destination/all/visited', True, 2),
+    ('/conservation-area/all/favorite', True, 2),
+    ('/profile', True, 2),
+    ('/profile/recommendation/', True, 3),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica el presupuesto de consultas de las rutas.')
+    parser.add_argument('--user', type=int, default=1, help='usuario utilizado en las rutas autenticadas')
+    args = parser.parse_args()
+
+    seed(create_engine(os.environ['DATABASE_URL'].replace('+aiosqlite', '').replace('+asyncpg', '')))
+    headers = {'Authorization': 'Bearer ' + encode_token(args.user, profile_id=args.user)}
+
+    # se utiliza la caché de respuestas en memoria para vaciarla antes de cada ruta
+    response_cache.unavailable_until = float('inf')
+
+    failures = 0
+    with TestClient(sinac_turismo_api) as client:
+        for path, authenticated, budget in BUDGETS:
+            response_cache.local.clear()
+            try:
+                with query_budget(budget) as stats:
+                    response = client.get(path, headers=headers if authenticated else {})
+                print(f'ok   {path}: {stats.count}/{budget} consultas ({response.status_code})')
+            except AssertionError as error:
+                failures += 1
+                print(f'FAIL {path}: {error}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
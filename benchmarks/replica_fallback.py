@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+"""
+Se verifica el enrutamiento de lecturas a réplicas con dos bases de datos SQLite locales, una como
+base de datos principal y otra como réplica, cada una con un registro distinto para saber cuál
+respondió una lectura. Se utilizan las dependencias get_session y get_read_session de las rutas:
+las lecturas van a la réplica, las lecturas de un usuario que acaba de escribir van a la base de
+datos principal (también en otro proceso, a través de Redis) y se vuelve a la base de datos principal
+si la réplica tiene un retraso mayor al permitido o no responde. El script termina con error si
+alguna verificación falla.
+
+Uso:
+    python benchmarks/replica_fallback.py
+    python benchmarks/replica_fallback.py --fake-redis
+"""
+
+PRIMARY = 'principal'
+REPLICA = 'réplica'
+
+
+def configure(directory):
+    # Se cargan las variables de entorno de la aplicación, las bases de datos son archivos temporales
+    load_dotenv('.env')
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/primary.sqlite'
+    os.environ['DATABASE_REPLICA_URLS'] = f'sqlite:///{directory}/replica.sqlite'
+    os.environ['REPLICA_CHECK_SECONDS'] = '0'
+    os.environ['REPLICA_STICKY_SECONDS'] = '30'
+
+
+def seed(url, name):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from src.models import Base, ConservationArea
+
+    database_engine = create_engine(url)
+    Base.metadata.create_all(database_engine)
+    with Session(database_engine) as session:
+        session.add(ConservationArea(name=name, description='', photos_path='', region_path=''))
+        session.commit()
+    database_engine.dispose()
+
+
+def create_request(user_id=None, host='10.0.0.1'):
+    from starlette.requests import Request
+
+    from src.authentication import encode_token
+
+    headers = [(b'authorization', f'Bearer {encode_token(user_id)}'.encode())] if user_id else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers, 'client': (host, 1234)})
+
+
+async def read_source(request):
+    """
+    Función para obtener la base de datos que responde una lectura con la sesión de get_read_session.
+    :param request: solicitud del usuario.
+    :return: nombre de la base de datos, principal o réplica.
+    """
+    from sqlalchemy import select
+
+    from src.database import get_read_session
+    from src.models import ConservationArea
+
+    dependency = get_read_session(request)
+    session = await dependency.__anext__()
+    try:
+        result = await session.execute(select(ConservationArea.name).order_by(ConservationArea.id).limit(1))
+        return result.scalar()
+    finally:
+        await dependency.aclose()
+
+
+async def write(request):
+    """
+    Función para realizar una escritura con la sesión de get_session, como lo hace una ruta.
+    :param request: solicitud del usuario.
+    """
+    from src.database import get_session
+    from src.models import ConservationArea
+
+    dependency = get_session(request)
+    session = await dependency.__anext__()
+    try:
+        session.add(ConservationArea(name='nueva', description='', photos_path='', region_path=''))
+        await session.commit()
+    finally:
+        await dependency.aclose()
+
+
+async def check_replica_reads():
+    source = await read_source(create_request(1))
+    assert source == REPLICA, f'la lectura se respondió desde {source}'
+    return 'las lecturas se responden desde la réplica'
+
+
+async def check_read_your_writes():
+    await write(create_request(7))
+    writer, other = await read_source(create_request(7)), await read_source(create_request(8))
+    assert writer == PRIMARY, f'la lectura del usuario que escribió se respondió desde {writer}'
+    assert other == REPLICA, f'la lectura de otro usuario se respondió desde {other}'
+    return 'el usuario que escribió lee de la principal y los demás de la réplica'
+
+
+async def check_other_process():
+    from src.database import replica_router
+
+    await write(create_request(9))
+    # otro proceso no tiene la escritura en su memoria, solo en Redis
+    replica_router.writes.clear()
+    source = await read_source(create_request(9))
+    if not replica_router._redis_available():
+        return 'omitido, Redis no está disponible (se puede utilizar --fake-redis)'
+    assert source == PRIMARY, f'la lectura en otro proceso se respondió desde {source}'
+    return 'la escritura registrada en Redis se respeta en otro proceso'
+
+
+async def check_lag():
+    from src.database import replica_router
+
+    replica = replica_router.replicas[0]
+    replica_router.check_seconds = 3600
+    replica.lag, replica.checked = replica_router.max_lag + 1, time.monotonic()
+    fallbacks = replica_router.fallbacks
+    try:
+        source = await read_source(create_request(1))
+    finally:
+        replica_router.check_seconds = 0
+        replica.lag = 0.0
+    assert source == PRIMARY, f'la lectura con la réplica retrasada se respondió desde {source}'
+    assert replica_router.fallbacks == fallbacks + 1, 'no se registró el uso de la principal'
+    return f'con {replica_router.max_lag + 1:.0f} s de retraso se lee de la principal'
+
+
+async def check_unavailable(directory):
+    from src.database import replica_router
+
+    path = os.path.join(directory, 'replica.sqlite')
+    # un directorio en la ruta del archivo hace que la conexión a la réplica falle
+    os.rename(path, path + '.bak')
+    os.mkdir(path)
+    try:
+        source = await read_source(create_request(1))
+        healthy = replica_router.replicas[0].healthy
+    finally:
+        os.rmdir(path)
+        os.rename(path + '.bak', path)
+    assert source == PRIMARY and not healthy, f'la lectura con la réplica caída se respondió desde {source}'
+    recovered = await read_source(create_request(1))
+    assert recovered == REPLICA, f'después de recuperarse la réplica se leyó desde {recovered}'
+    return 'sin conexión a la réplica se lee de la principal y se vuelve a la réplica al recuperarse'
+
+
+async def run(args, directory):
+    from src.database import dispose_engine, replica_router
+
+    if args.fake_redis:
+        import fakeredis.aioredis
+        replica_router.client = fakeredis.aioredis.FakeRedis()
+    checks = [
+        ('réplica', check_replica_reads),
+        ('leer lo escrito', check_read_your_writes),
+        ('otro proceso', check_other_process),
+        ('retraso', check_lag),
+        ('sin conexión', lambda: check_unavailable(directory)),
+    ]
+    failures = 0
+    try:
+        for name, check in checks:
+            try:
+                print(f'ok   {name}: {await check()}')
+            except AssertionError as error:
+                failures += 1
+                print(f'FAIL {name}: {error}')
+    finally:
+        await dispose_engine()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica el enrutamiento de lecturas a réplicas con dos '
+                                                 'bases de datos SQLite.')
+    parser.add_argument('--fake-redis', action='store_true',
+                        help='utiliza un Redis en memoria compartido en lugar de REDIS_URL')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='replica-fallback-')
+    try:
+        configure(directory)
+        seed(os.environ['DATABASE_URL'], PRIMARY)
+        seed(os.environ['DATABASE_REPLICA_URLS'], REPLICA)
+        failures = asyncio.run(run(args, directory))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
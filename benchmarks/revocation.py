@@ -0,0 +1,145 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+"""
+Se verifica la revocación de tokens con Redis en memoria (fakeredis) y una base de datos SQLite
+temporal, a través de las rutas de la aplicación: el cierre de sesión rechaza el token de acceso y el
+de refresco, la revocación de todas las sesiones rechaza los tokens anteriores, un inicio de sesión
+inmediatamente después de la revocación es válido aunque ocurra en el mismo segundo y otro proceso
+con el mismo Redis rechaza los tokens revocados. El script termina con error si alguna verificación
+falla.
+
+Uso:
+    python benchmarks/revocation.py
+"""
+
+EMAIL = 'revocation@sinac.test'
+PASSWORD = 'revocation-password'
+
+
+def configure(directory):
+    # Se cargan las variables de entorno de la aplicación, la base de datos es un archivo temporal
+    load_dotenv('.env')
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/revocation.sqlite'
+    os.environ['DATABASE_REPLICA_URLS'] = ''
+    os.environ['CATALOG_BUNDLE_SECONDS'] = '0'
+
+
+def login(client):
+    response = client.post('/login', json={'email': EMAIL, 'password': PASSWORD})
+    assert response.status_code == 200 and 'token' in response.json(), f'inicio de sesión: {response.text}'
+    return response.json()
+
+
+def headers(tokens):
+    return {'Authorization': f"Bearer {tokens['token']}"}
+
+
+def check_logout(client):
+    tokens = login(client)
+    assert client.get('/user', headers=headers(tokens)).status_code == 200, 'el token nuevo se rechazó'
+    client.post('/logout', json={'refresh_token': tokens['refresh_token']}, headers=headers(tokens))
+    status = client.get('/user', headers=headers(tokens)).status_code
+    assert status == 401, f'el token de acceso revocado respondió {status}'
+    status = client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code
+    assert status == 401, f'el token de refresco revocado respondió {status}'
+    return 'el cierre de sesión rechaza el token de acceso y el de refresco'
+
+
+def check_revoke_sessions(client):
+    first, second = login(client), login(client)
+    client.post('/revoke-sessions', headers=headers(first))
+    statuses = [client.get('/user', headers=headers(tokens)).status_code for tokens in (first, second)]
+    assert statuses == [401, 401], f'los tokens anteriores a la revocación respondieron {statuses}'
+    status = client.post('/refresh', json={'refresh_token': second['refresh_token']}).status_code
+    assert status == 401, f'el token de refresco anterior a la revocación respondió {status}'
+    return 'la revocación de todas las sesiones rechaza los tokens anteriores'
+
+
+def check_new_login(client):
+    tokens = login(client)
+    client.post('/revoke-sessions', headers=headers(tokens))
+    # sin esperar, el nuevo inicio de sesión ocurre normalmente en el mismo segundo que la revocación
+    tokens = login(client)
+    status = client.get('/user', headers=headers(tokens)).status_code
+    assert status == 200, f'el token emitido después de la revocación respondió {status}'
+    status = client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code
+    assert status == 200, f'el token de refresco emitido después de la revocación respondió {status}'
+    return 'un inicio de sesión después de la revocación es válido'
+
+
+def check_other_process(client, server):
+    import fakeredis
+
+    from src.authentication import decode_claims
+    from src.revocation import RevocationList
+
+    tokens = login(client)
+    client.post('/logout', headers=headers(tokens))
+    # otro proceso tiene su propio filtro de Bloom y lo sincroniza desde Redis
+    other = RevocationList(client=fakeredis.FakeRedis(server=server), sync_seconds=0)
+    assert other.is_revoked(decode_claims(tokens['token'])), 'otro proceso aceptó el token revocado'
+    assert not other.is_revoked(decode_claims(login(client)['token'])), 'otro proceso rechazó un token válido'
+    return 'otro proceso con el mismo Redis rechaza el token revocado'
+
+
+def run():
+    import fakeredis
+    from fastapi.testclient import TestClient
+
+    from main import sinac_turismo_api
+    from src.revocation import revocation_list
+    from src.throttling import email_limiter
+
+    server = fakeredis.FakeServer()
+    revocation_list.client = fakeredis.FakeRedis(server=server)
+    checks = [
+        ('cerrar sesión', check_logout),
+        ('revocar sesiones', check_revoke_sessions),
+        ('nuevo inicio de sesión', check_new_login),
+        ('otro proceso', lambda client: check_other_process(client, server)),
+    ]
+    failures = 0
+    with TestClient(sinac_turismo_api) as client:
+        response = client.post('/add-user', json={'id': 0, 'email': EMAIL, 'password': PASSWORD, 'admin': False})
+        assert response.status_code == 201, f'no se creó el usuario: {response.text}'
+        for name, check in checks:
+            # los inicios de sesión de las verificaciones no deben alcanzar el límite por correo
+            email_limiter.reset(EMAIL)
+            try:
+                print(f'ok   {name}: {check(client)}')
+            except AssertionError as error:
+                failures += 1
+                print(f'FAIL {name}: {error}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica la revocación de tokens con Redis en memoria.')
+    parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='revocation-')
+    try:
+        configure(directory)
+        from sqlalchemy import create_engine
+
+        from src.models import Base
+
+        database_engine = create_engine(os.environ['DATABASE_URL'])
+        Base.metadata.create_all(database_engine)
+        database_engine.dispose()
+        failures = run()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
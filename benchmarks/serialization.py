@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Se cargan las variables de entorno de la aplicación, la base de datos debe ser de prueba
+load_dotenv('.env')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///serialization.sqlite')
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from benchmarks.query_plans import seed
+from src.fast_json import select_list
+from src.models import Profile, Review, TouristDestination
+from src.response_cache import encode_response
+from src.router.review import formatDate
+
+"""
+Se compara la codificación de las listas del catálogo con objetos del ORM (pydantic y jsonable_encoder)
+contra la codificación rápida (columnas y orjson). Para cada lista se mide el tiempo de CPU y el pico de
+memoria de consultar y codificar la respuesta, y se verifica que ambos contenidos sean iguales.
+
+Uso:
+    python benchmarks/serialization.py --rows 5000 --runs 5
+"""
+
+# Nombre de la lista, consulta y conversiones de columnas, igual que en las rutas
+LISTS = [
+    ('tourist-destination', lambda: select(TouristDestination), {}),
+    ('reviews', lambda: select(Review).where(Review.tourist_destination_id == 1).order_by(Review.date.desc()),
+     {'date': formatDate}),
+    ('profiles', lambda: select(Profile), {}),
+]
+
+
+class DirectSession:
+    """
+    Clase que expone execute de una sesión síncrona como corrutina, en el mismo hilo, para medir
+    únicamente la consulta y la codificación.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+
+def prepare(engine, rows):
+    """
+    Función para insertar los datos de prueba, incluyendo las opiniones del primer destino.
+    :param engine: motor de la base de datos.
+    :param rows: cantidad de filas de cada lista.
+    """
+    seed(engine, users=rows, areas=10, destinations=rows)
+    with engine.begin() as connection:
+        current = connection.execute(select(func.count()).select_from(Review).
+                                     where(Review.tourist_destination_id == 1)).scalar()
+        if current < rows:
+            now = datetime.utcnow()
+            connection.execute(insert(Review), [
+                {'title': f'Opinión {i}', 'text': 'Muy recomendado, el sendero está en buen estado.',
+                 'date': now - timedelta(hours=i), 'calification': i % 5 + 1, 'image_path': '',
+                 'user_id': i % rows + 1, 'tourist_destination_id': 1} for i in range(rows - current)])
+
+
+def measure(engine, statement, converters, fast):
+    """
+    Función para consultar y codificar una lista, midiendo el tiempo de CPU y el pico de memoria.
+    :param engine: motor de la base de datos.
+    :param statement: consulta de la lista.
+    :param converters: conversiones de columnas de la ruta.
+    :param fast: verdadero para utilizar la codificación rápida.
+    :return: tupla con los segundos de CPU, los bytes del pico de memoria y el contenido codificado.
+    """
+    def run():
+        with Session(engine) as session:
+            return encode_response(asyncio.run(select_list(DirectSession(session), statement, fast, **converters)))
+
+    # el tiempo se mide sin tracemalloc porque este hace más lenta cada asignación de memoria
+    started = time.process_time()
+    content = run()
+    elapsed = time.process_time() - started
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara la codificación de listas con el ORM y con orjson.')
+    parser.add_argument('--rows', type=int, default=5000, help='filas de cada lista')
+    parser.add_argument('--runs', type=int, default=5, help='mediciones de cada codificación')
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ['DATABASE_URL'].replace('+aiosqlite', '').replace('+asyncpg', ''))
+    prepare(engine, args.rows)
+
+    failures = 0
+    print(f'{"lista":<22} {"filas":>7} {"CPU ORM":>10} {"CPU rápida":>11} {"memoria ORM":>12} {"memoria rápida":>15}')
+    for name, statement, converters in LISTS:
+        results = {}
+        for fast in (False, True):
+            runs = [measure(engine, statement(), converters, fast) for _ in range(args.runs)]
+            results[fast] = (statistics.median(run[0] for run in runs), statistics.median(run[1] for run in runs),
+                             runs[0][2])
+        orm, fast = results[False], results[True]
+        rows = len(json.loads(orm[2]))
+        print(f'{name:<22} {rows:>7} {orm[0] * 1000:>8.1f}ms {fast[0] * 1000:>9.1f}ms '
+              f'{orm[1] / 2 ** 20:>10.1f}MB {fast[1] / 2 ** 20:>13.1f}MB   x{orm[0] / max(fast[0], 1e-9):.1f}')
+        if json.loads(orm[2]) != json.loads(fast[2]):
+            print(f'  {name}: el contenido de la codificación rápida es diferente')
+            failures += 1
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+"""
+Se mide el tiempo de inicio de la aplicación: el tiempo de importar main.py en un proceso nuevo y el
+tiempo desde que se inicia uvicorn hasta la primera respuesta de la ruta raíz. Los trabajadores que se
+agregan al escalar deben atender solicitudes lo antes posible, por lo que el script termina con error
+si alguno de los tiempos supera su presupuesto. Con --modules se muestran los módulos más lentos de
+importar según python -X importtime.
+
+Uso (desde la raíz del proyecto, con el archivo .env):
+    python benchmarks/startup.py --runs 5 --import-budget 1.0 --ready-budget 2.5
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que mide la importación de la aplicación en un proceso nuevo
+IMPORT_CODE = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def environment():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def import_time():
+    """
+    Función para medir el tiempo de importar la aplicación en un proceso nuevo.
+    :return: segundos de la importación.
+    """
+    output = subprocess.run([sys.executable, '-c', IMPORT_CODE], env=environment(), check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_modules(limit):
+    """
+    Función para obtener los módulos que más tardan en importarse, incluyendo sus dependencias.
+    :param limit: cantidad de módulos.
+    :return: lista de tuplas con el módulo, su tiempo propio y su tiempo acumulado en milisegundos.
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], env=environment(),
+                            check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        # solo se muestran las dependencias directas de la aplicación, no las internas de cada paquete
+        if len(name) - len(name.lstrip()) <= 3:
+            modules.append((name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return sorted(modules, key=lambda module: module[2], reverse=True)[:limit]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def ready_time(timeout):
+    """
+    Función para medir el tiempo desde que se inicia uvicorn hasta la primera respuesta exitosa.
+    :param timeout: segundos máximos de espera.
+    :return: segundos hasta la primera respuesta.
+    :raise RuntimeError: el servidor no respondió dentro del tiempo indicado.
+    """
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:sinac_turismo_api', '--port', str(port),
+                               '--log-level', 'warning'], env=environment(), stdout=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f'uvicorn finalizó con código {server.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'la aplicación no respondió en {timeout} s')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mide el tiempo de inicio de la aplicación.')
+    parser.add_argument('--runs', type=int, default=5, help='cantidad de mediciones de cada tiempo')
+    parser.add_argument('--import-budget', type=float, default=1.0, help='segundos máximos para importar main.py')
+    parser.add_argument('--ready-budget', type=float, default=2.5, help='segundos máximos hasta la primera respuesta')
+    parser.add_argument('--modules', type=int, default=0, help='cantidad de módulos más lentos a mostrar')
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    ready = [ready_time(args.ready_budget * 4) for _ in range(args.runs)]
+
+    failed = False
+    for name, values, budget in (('importación de main.py', imports, args.import_budget),
+                                 ('primera respuesta', ready, args.ready_budget)):
+        median = statistics.median(values)
+        status = 'ok' if median <= budget else 'EXCEDE'
+        failed = failed or median > budget
+        print(f'{name}: mediana {median * 1000:.0f} ms, mínimo {min(values) * 1000:.0f} ms, '
+              f'máximo {max(values) * 1000:.0f} ms (presupuesto {budget * 1000:.0f} ms) {status}')
+
+    if args.modules:
+        print(f'\n{"módulo":<45} {"propio":>10} {"acumulado":>10}')
+        for name, own, cumulative in slowest_modules(args.modules):
+            print(f'{name:<45} {own:>8.1f}ms {cumulative:>8.1f}ms')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
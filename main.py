@@ -20,14 +20,9 @@ Copyright (C) 2021 Brandon Ledezma, Walter Morales, Yosefin Solano
 ========================================================================
 """
 
-import os
-import uvicorn
-
-from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 
 from fastapi.staticfiles import StaticFiles
-from fastapi_sqlalchemy import DBSessionMiddleware
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -37,17 +32,24 @@ from src.router.conservation_area import conservation_area_router
 from src.router.user import user
 from src.router.profile import profile
 from src.router.gallery import gallery
+from src.router.profiling import profiling_router
+from src.router.export import export_router
+from src.router.bulk_import import import_router
+from src.router.sync import sync_router
+from src.router.catalog import catalog_router
+from src.catalog_bundle import catalog_bundle
+from src.reset_password import outbox
+from src.database import dispose_engine
+from src.query_stats import QueryCounterMiddleware
+from src.metrics import CONTENT_TYPE, MetricsMiddleware, render_metrics
+from src.profiling import ProfilerMiddleware
+from src.settings import settings
 
 sinac_turismo_api = FastAPI()
 
 # Se establece un directorio para la solicitud de archivos
 sinac_turismo_api.mount('/data_repository', StaticFiles(directory="data_repository"), name='data_repository')
 
-# Se cargan las variables de entorno del archivo .env
-load_dotenv('.env')
-
-# Se establece el enlace a la base de datos
-sinac_turismo_api.add_middleware(DBSessionMiddleware, db_url=os.environ["DATABASE_URL"])
 sinac_turismo_api.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -60,6 +62,35 @@ sinac_turismo_api.add_middleware(
     allow_headers=["*"],
 )
 
+# Se cuentan las consultas SQL de cada solicitud
+sinac_turismo_api.add_middleware(QueryCounterMiddleware)
+
+# Se perfilan las solicitudes de administradores con el encabezado X-Profile o el parámetro profile
+sinac_turismo_api.add_middleware(ProfilerMiddleware)
+
+# Se miden la duración y las solicitudes en curso de cada ruta
+sinac_turismo_api.add_middleware(MetricsMiddleware)
+
+# Token requerido para consultar las métricas, si no se indica la ruta es pública
+METRICS_TOKEN = settings.metrics_token
+
+
+@sinac_turismo_api.on_event("startup")
+async def startup():
+    # Se inicia el envío de correos en segundo plano
+    outbox.start()
+    # Se regenera el paquete del catálogo cuando cambian los datos
+    catalog_bundle.start()
+
+
+@sinac_turismo_api.on_event("shutdown")
+async def shutdown():
+    # Se envían los correos pendientes antes de finalizar
+    await outbox.stop()
+    await catalog_bundle.stop()
+    # Se cierran las conexiones a la base de datos
+    await dispose_engine()
+
 
 # Ruta predefinida
 @sinac_turismo_api.get("/")
@@ -67,6 +98,19 @@ async def root():
     return {'message': "SINAC Turismo API"}
 
 
+@sinac_turismo_api.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Ruta para obtener las métricas de la aplicación en el formato de Prometheus.
+    :param request: solicitud HTTP, contiene el token de las métricas.
+    :return: texto con las métricas.
+    :raise Error 401: el token no es válido.
+    """
+    if METRICS_TOKEN and request.headers.get('authorization') != f'Bearer {METRICS_TOKEN}':
+        raise HTTPException(status_code=401, detail='Invalid metrics token')
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 # Se incluyen las rutas de las áreas de conservación
 sinac_turismo_api.include_router(conservation_area_router)
 
@@ -85,6 +129,23 @@ sinac_turismo_api.include_router(profile)
 # Se incluyen las rutas de la galerua
 sinac_turismo_api.include_router(gallery)
 
+# Se incluyen las rutas de los perfiles de solicitudes
+sinac_turismo_api.include_router(profiling_router)
+
+# Se incluyen las rutas de exportación del catálogo
+sinac_turismo_api.include_router(export_router)
+
+# Se incluyen las rutas de importación del catálogo
+sinac_turismo_api.include_router(import_router)
+
+# Se incluyen las rutas de sincronización de la aplicación móvil
+sinac_turismo_api.include_router(sync_router)
+
+# Se incluyen las rutas del paquete del catálogo
+sinac_turismo_api.include_router(catalog_router)
+
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(sinac_turismo_api, host="0.0.0.0", port=8000, reload=True)
@@ -1,26 +1,161 @@
-import os
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-import jwt
-from dotenv import load_dotenv
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
+from src.cache import MISSING, TTLCache
+from src.metrics import PASSWORD_SECONDS, register_collector
+from src.revocation import revocation_list
+from src.settings import settings
 
-# se cargan las variables de entorno, donde se encuentra la clave secreta.
-load_dotenv(".env")
 
-secret_key = os.environ["SECRET_KEY"]
+secret_key = settings.secret_key
 
 algorithm = "HS256"
 
 # se establecen los patrones de Seguridad a utilizar
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 secret = secret_key
 
 
+@lru_cache()
+def password_context():
+    """
+    Función para obtener el contexto de hash de contraseñas, passlib y bcrypt se importan en el primer
+    uso para no retrasar el inicio de la aplicación.
+    :return: contexto de passlib configurado con bcrypt.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Número de hilos dedicados exclusivamente al cálculo de hashes de contraseñas (bcrypt)
+PASSWORD_WORKERS = settings.password_workers
+
+# Cantidad máxima de operaciones de hash en espera o en ejecución antes de rechazar solicitudes
+PASSWORD_MAX_PENDING = settings.password_max_pending
+
+
+class PasswordExecutor:
+    """
+    Clase que administra un conjunto de hilos de tamaño limitado para calcular y verificar
+    hashes de contraseñas, de forma que bcrypt no compita con los demás endpoints por los
+    hilos de Starlette. Lleva métricas de la cola de espera.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _execute(self, enqueued, function, *args):
+        """
+        Función que se ejecuta en uno de los hilos dedicados, registra el tiempo en espera
+        y el tiempo de ejecución de la operación.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            wait = started - enqueued
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return function(*args)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+                self.total_run += time.perf_counter() - started
+            PASSWORD_SECONDS.observe(time.perf_counter() - started, function.__name__)
+
+    async def run(self, function, *args):
+        """
+        Función para ejecutar una operación en el conjunto de hilos dedicado.
+        :param function: función a ejecutar.
+        :param args: argumentos de la función.
+        :return: resultado de la función.
+        :raise Error 503: la cola de espera se encuentra llena.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail='Server busy, try again later')
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._execute, time.perf_counter(), function, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        """
+        Función para obtener las métricas del conjunto de hilos.
+        :return: diccionario con las métricas de la cola y ejecución.
+        """
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'active': self.active,
+                'queued': max(self.pending - self.active, 0),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'average_wait': self.total_wait / self.completed if self.completed else 0.0,
+                'max_wait': self.max_wait,
+                'average_run': self.total_run / self.completed if self.completed else 0.0,
+            }
+
+
+password_executor = PasswordExecutor(PASSWORD_WORKERS, PASSWORD_MAX_PENDING)
+
+
+@register_collector
+def password_executor_metrics():
+    stats = password_executor.stats()
+    labels = {'pool': 'password'}
+    return [
+        ('sinac_threadpool_max_workers', 'gauge', 'Hilos máximos de cada conjunto de hilos.',
+         [(labels, stats['workers'])]),
+        ('sinac_threadpool_active', 'gauge', 'Hilos ocupados de cada conjunto de hilos.',
+         [(labels, stats['active'])]),
+        ('sinac_threadpool_queued', 'gauge', 'Tareas en espera de un hilo en cada conjunto de hilos.',
+         [(labels, stats['queued'])]),
+        ('sinac_threadpool_rejected_total', 'counter', 'Tareas rechazadas porque la cola de espera se encuentra llena.',
+         [(labels, stats['rejected'])]),
+    ]
+
+# Caché de tokens ya validados, evita verificar la firma y decodificar el contenido en cada solicitud
+TOKEN_CACHE_SIZE = settings.token_cache_size
+TOKEN_CACHE_TTL = settings.token_cache_ttl
+
+token_cache = TTLCache("token", TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# Duración de los tokens de acceso y de refresco
+ACCESS_TOKEN_MINUTES = settings.access_token_minutes
+REFRESH_TOKEN_DAYS = settings.refresh_token_days
+
+# Tipos de token y roles que se firman en el contenido de los tokens
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+ADMIN_ROLE = "admin"
+USER_ROLE = "user"
+
+
 def create_access_token(data):
     """
     Funcion para crear tokens de acceso para acceder a los endpoint
@@ -28,6 +163,8 @@ def create_access_token(data):
     :param data: datos que se codificaran en el tocken a crear
     :return: token generado con los datos, llave secreta y algoritmos seleccionados
     """
+    import jwt
+
     to_encode = data.copy()
     access_token = jwt.encode(to_encode, secret_key, algorithm=algorithm)
     return access_token
@@ -39,7 +176,7 @@ def get_password_hash(password):
     :param password: contraseñá en texto plano
     :return: codigo hash de la contraseña
     """
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
 def verify_password(plain_password, hashed_password):
@@ -49,20 +186,52 @@ def verify_password(plain_password, hashed_password):
     :param hashed_password: valor hash de la contraseña registrada
     :return: verdadero si coninciden, falso en otro caso
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
+
+
+async def hash_password(password):
+    """
+    Funcion para hashear una contraseña en el conjunto de hilos dedicado, sin bloquear
+    los hilos utilizados por los demás endpoints.
+    :param password: contraseñá en texto plano
+    :return: codigo hash de la contraseña
+    """
+    return await password_executor.run(get_password_hash, password)
+
+
+async def check_password(plain_password, hashed_password):
+    """
+    Funcion para verificar una contraseña en el conjunto de hilos dedicado, sin bloquear
+    los hilos utilizados por los demás endpoints.
+    :param plain_password: contraseña en tento plano
+    :param hashed_password: valor hash de la contraseña registrada
+    :return: verdadero si coninciden, falso en otro caso
+    """
+    return await password_executor.run(verify_password, plain_password, hashed_password)
 
 
-def encode_token(user_id):
+def encode_token(user_id, admin=False, profile_id=None):
     """
-    Funcion para codificar un nuevo token con una fecha de expiración, justo al id
-    del usuario al que se le asigna el token.
+    Funcion para codificar un nuevo token de acceso de corta duración, junto al id del usuario
+    al que se le asigna el token, su rol y el identificador de su perfil. Los datos quedan firmados
+    por lo que las rutas pueden autorizar sin consultar la base de datos.
     : param user_id: identificador del usuario del token
+    : param admin: verdadero si el usuario es administrador
+    : param profile_id: identificador del perfil del usuario, si lo tiene
     : return: un nuevo token
     """
+    import jwt
+
     payload = {
-        'exp': datetime.utcnow() + timedelta(days=365, minutes=0),
+        'exp': datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_MINUTES),
         'iat': datetime.utcnow(),
-        'sub': user_id
+        # fecha de emisión en milisegundos, utilizada para comparar con la revocación de sesiones
+        'iat_ms': int(time.time() * 1000),
+        'sub': user_id,
+        'jti': uuid.uuid4().hex,
+        'type': ACCESS_TOKEN,
+        'role': ADMIN_ROLE if admin else USER_ROLE,
+        'pid': profile_id
     }
     return jwt.encode(
         payload,
@@ -71,31 +240,175 @@ def encode_token(user_id):
     )
 
 
-def decode_token(token):
+def encode_refresh_token(user_id):
+    """
+    Funcion para codificar un token de refresco, utilizado únicamente para obtener nuevos
+    tokens de acceso cuando estos expiran.
+    : param user_id: identificador del usuario del token
+    : return: un nuevo token de refresco
+    """
+    import jwt
+
+    payload = {
+        'exp': datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS),
+        'iat': datetime.utcnow(),
+        'iat_ms': int(time.time() * 1000),
+        'sub': user_id,
+        'jti': uuid.uuid4().hex,
+        'type': REFRESH_TOKEN
+    }
+    return jwt.encode(
+        payload,
+        secret,
+        algorithm='HS256'
+    )
+
+
+def decode_claims(token):
     """
-    Funcion para decodificar el contenido de un token
+    Funcion para decodificar y validar el contenido completo de un token, los tokens
+    validados se almacenan en caché hasta su expiración.
     :param token: token utilizado por un usuario
-    :return: identificador del usuario que usa el token
+    :return: diccionario con el contenido del token
     :raise Error 401: el token ya expiro
     :raise  Error 401: el token es invalido
     """
+    payload = token_cache.get(token)
+    if payload is not MISSING:
+        return payload
+    import jwt
+
     try:
         payload = jwt.decode(token, secret, algorithms=['HS256'])
-        return payload['sub']
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail='Signature has expired')
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail='Invalid token')
+    # el token se almacena como máximo hasta su fecha de expiración
+    token_cache.set(token, payload, payload['exp'] - time.time())
+    return payload
+
+
+def check_token_type(payload, token_type):
+    """
+    Funcion para verificar el tipo de un token. Los tokens sin tipo o sin identificador (jti),
+    emitidos antes de la lista de revocación con una duración de un año, no se pueden revocar
+    individualmente y se rechazan.
+    :param payload: contenido del token
+    :param token_type: tipo de token esperado
+    :raise  Error 401: el token es invalido
+    """
+    if payload.get('type') != token_type or not payload.get('jti'):
+        raise HTTPException(status_code=401, detail='Invalid token')
+
+
+def access_claims(token):
+    """
+    Funcion para obtener el contenido de un token de acceso, los tokens de refresco no
+    son válidos para acceder a los endpoint.
+    :param token: token utilizado por un usuario
+    :return: diccionario con el contenido del token
+    :raise  Error 401: el token es invalido
+    """
+    payload = decode_claims(token)
+    check_token_type(payload, ACCESS_TOKEN)
+    if revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail='Token has been revoked')
+    return payload
+
+
+async def verify_access_claims(token):
+    """
+    Funcion para obtener el contenido de un token de acceso desde una ruta asíncrona, las consultas
+    a Redis de la lista de revocación se realizan en el conjunto de hilos.
+    :param token: token utilizado por un usuario
+    :return: diccionario con el contenido del token
+    :raise  Error 401: el token es invalido o fue revocado
+    """
+    payload = decode_claims(token)
+    check_token_type(payload, ACCESS_TOKEN)
+    if await revocation_list.is_revoked_async(payload):
+        raise HTTPException(status_code=401, detail='Token has been revoked')
+    return payload
+
+
+def decode_token(token):
+    """
+    Funcion para decodificar el contenido de un token de acceso
+    :param token: token utilizado por un usuario
+    :return: identificador del usuario que usa el token
+    :raise Error 401: el token ya expiro
+    :raise  Error 401: el token es invalido
+    """
+    return access_claims(token)['sub']
+
+
+async def decode_refresh_token(token):
+    """
+    Funcion para decodificar un token de refresco.
+    :param token: token de refresco
+    :return: contenido del token de refresco
+    :raise  Error 401: el token es invalido, fue revocado o ya expiro
+    """
+    payload = decode_claims(token)
+    check_token_type(payload, REFRESH_TOKEN)
+    if await revocation_list.is_revoked_async(payload):
+        raise HTTPException(status_code=401, detail='Token has been revoked')
+    return payload
+
+
+async def revoke_token(payload):
+    """
+    Funcion para revocar un token, deja de ser válido aunque no haya expirado. La escritura en
+    Redis se realiza en el conjunto de hilos para no bloquear el ciclo de eventos.
+    :param payload: contenido del token a revocar.
+    """
+    await run_in_threadpool(revocation_list.revoke_token, payload)
+
+
+async def revoke_user_sessions(user_id):
+    """
+    Funcion para revocar todos los tokens emitidos a un usuario hasta este momento, también se
+    eliminan de la caché sus tokens ya validados con el rol firmado. La escritura en Redis se
+    realiza en el conjunto de hilos para no bloquear el ciclo de eventos.
+    :param user_id: identificador del usuario.
+    """
+    await run_in_threadpool(revocation_list.revoke_user, user_id, REFRESH_TOKEN_DAYS * 24 * 60 * 60)
+    token_cache.invalidate_where(lambda token, payload: payload.get('sub') == user_id)
 
 
-def auth_wrapper(auth: HTTPAuthorizationCredentials = Security(security)):
+async def auth_wrapper(auth: HTTPAuthorizationCredentials = Security(security)):
     """
     Funcion utilizada para verificar la autorización de las credenciales usadas para acceder a un endpoint
     de la API, verifica que el token sea valido, en caso contrario retorna un error HTTP 401.
     :param auth: credenciales utilizadas para acceder a un endpoint.
     :return: contenido del token.
     """
-    return decode_token(auth.credentials)
+    return (await verify_access_claims(auth.credentials))['sub']
+
+
+async def claims_wrapper(auth: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Funcion utilizada para verificar las credenciales usadas para acceder a un endpoint y
+    obtener todo el contenido firmado del token.
+    :param auth: credenciales utilizadas para acceder a un endpoint.
+    :return: diccionario con el contenido del token.
+    """
+    return await verify_access_claims(auth.credentials)
+
+
+async def admin_wrapper(auth: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Funcion utilizada para verificar que las credenciales usadas para acceder a un endpoint
+    pertenezcan a un administrador, a partir del rol firmado en el token y sin consultar la base de datos.
+    :param auth: credenciales utilizadas para acceder a un endpoint.
+    :return: identificador del usuario administrador.
+    :raise Error 401: el token es invalido o el usuario no es administrador.
+    """
+    payload = await verify_access_claims(auth.credentials)
+    if payload.get('role') != ADMIN_ROLE:
+        raise HTTPException(status_code=401, detail='Unauthorized')
+    return payload['sub']
 
 
 def decode_access_token(data):
@@ -104,5 +417,7 @@ def decode_access_token(data):
     :param data: información del token.
     :return: información almacenada en el token.
     """
+    import jwt
+
     token_data = jwt.decode(data, secret_key, algorithms=algorithm)
     return token_data
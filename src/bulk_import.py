@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from src.change_log import record_changes
+from src.conditional import increment_collection_versions
+from src.models import ConservationArea as ModelConservationArea
+from src.models import TouristDestination as ModelTouristDestination
+from src.response_cache import response_cache
+from src.schema import ConservationArea as SchemaConservationArea
+from src.schema import TouristDestination as SchemaTouristDestination
+from src.settings import settings
+
+"""
+Se establece la importación masiva del catálogo desde archivos NDJSON o CSV. Cada fila se valida con
+el esquema de la colección y las filas válidas se escriben en lotes de IMPORT_BATCH_SIZE con una sola
+sentencia INSERT … ON CONFLICT por lote: las filas con un identificador mayor a cero se insertan o
+actualizan y las demás se insertan como registros nuevos. Cada lote se escribe en un punto de guardado,
+si falla se vuelve a escribir fila por fila para reportar únicamente las filas con errores; toda la
+importación se confirma en una sola transacción.
+
+Uso desde la línea de comandos:
+    python -m src.bulk_import tourist-destination destinos.ndjson
+    python -m src.bulk_import conservation-area areas.csv
+"""
+
+# Filas escritas en cada lote y cantidad máxima de errores incluidos en el reporte
+IMPORT_BATCH_SIZE = settings.import_batch_size
+IMPORT_MAX_ERRORS = settings.import_max_errors
+
+# Colecciones que se pueden importar: modelo, esquema y llaves foráneas que se verifican
+IMPORT_COLLECTIONS = {
+    'conservation-area': (ModelConservationArea, SchemaConservationArea, {}),
+    'tourist-destination': (ModelTouristDestination, SchemaTouristDestination,
+                            {'conservation_area_id': ModelConservationArea}),
+}
+
+# Formatos de archivo disponibles
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+# Parámetros máximos de una sentencia, asyncpg admite hasta 32767
+MAX_PARAMETERS = 30000
+
+
+def upsert_statement(dialect, model, rows):
+    """
+    Función para crear la sentencia que inserta o actualiza varias filas por su identificador.
+    :param dialect: nombre del dialecto de la base de datos, postgresql o sqlite.
+    :param model: modelo de la tabla.
+    :param rows: lista de diccionarios con los valores de cada fila, incluyendo el identificador.
+    :return: sentencia INSERT … ON CONFLICT (id) DO UPDATE.
+    """
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(model.__table__).values(rows)
+    return statement.on_conflict_do_update(index_elements=['id'],
+                                           set_={name: statement.excluded[name] for name in rows[0] if name != 'id'})
+
+
+def chunks(rows):
+    """
+    Generador que divide una lista de filas para no superar los parámetros máximos de una sentencia.
+    :param rows: lista de diccionarios con los valores de cada fila.
+    :return: generador de listas de filas.
+    """
+    if not rows:
+        return
+    size = max(MAX_PARAMETERS // len(rows[0]), 1)
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def parse_rows(lines, import_format):
+    """
+    Generador que lee las filas de un archivo NDJSON o CSV.
+    :param lines: archivo de texto o iterable de líneas.
+    :param import_format: formato del archivo, ndjson o csv.
+    :return: generador de tuplas con el número de línea y el diccionario de la fila, o None si la
+    línea no es JSON válido.
+    """
+    if import_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def validate_row(schema, row):
+    """
+    Función para validar una fila con el esquema de la colección, las filas sin identificador se
+    consideran registros nuevos.
+    :param schema: esquema de pydantic de la colección.
+    :param row: diccionario con los valores de la fila o None si no se pudo leer.
+    :return: tupla con el DTO y la lista de errores de la validación.
+    """
+    if row is None:
+        return None, [{'loc': [], 'msg': 'invalid JSON object', 'type': 'value_error.json'}]
+    if row.get('id') in (None, ''):
+        row = dict(row, id=0)
+    try:
+        return schema(**row), []
+    except ValidationError as error:
+        return None, error.errors()
+
+
+def read_rows(rows, schema, size):
+    """
+    Función para leer y validar las siguientes filas de un archivo.
+    :param rows: generador de parse_rows.
+    :param schema: esquema de pydantic de la colección.
+    :param size: cantidad máxima de filas.
+    :return: lista de tuplas con el número de línea, el DTO y los errores de cada fila, vacía al final del archivo.
+    """
+    return [(number, *validate_row(schema, row)) for number, row in islice(rows, size)]
+
+
+class BulkImport:
+    """
+    Clase que acumula las filas validadas de una importación, las escribe por lotes y lleva el
+    reporte de filas insertadas, actualizadas y con errores.
+    """
+
+    def __init__(self, session, collection):
+        self.session = session
+        self.model, self.schema, self.references = IMPORT_COLLECTIONS[collection]
+        self.dialect = session.sync_session.get_bind().dialect.name
+        self.batch = []
+        self.batch_ids = set()
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.tags = set()
+        # identificadores de las referencias que ya se verificaron en lotes anteriores
+        self.known = {column: set() for column in self.references}
+
+    def error(self, number, errors):
+        """
+        Función para registrar los errores de una fila.
+        :param number: número de línea de la fila en el archivo.
+        :param errors: lista de errores con el formato de pydantic.
+        """
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'line': number, 'errors': errors})
+
+    async def add(self, number, item, errors):
+        """
+        Función para agregar una fila validada al lote, el lote se escribe al completarse o si ya
+        contiene el mismo identificador.
+        :param number: número de línea de la fila en el archivo.
+        :param item: DTO de la fila, None si no es válida.
+        :param errors: lista de errores de la validación.
+        """
+        if errors:
+            self.error(number, errors)
+            return
+        if item.id > 0 and item.id in self.batch_ids:
+            await self.flush()
+        self.batch.append((number, item))
+        if item.id > 0:
+            self.batch_ids.add(item.id)
+        if len(self.batch) >= IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def existing_ids(self, model, ids):
+        # identificadores de la lista que ya se encuentran en la tabla
+        if not ids:
+            return set()
+        result = await self.session.execute(select(model.id).where(model.id.in_(ids)))
+        return set(result.scalars().all())
+
+    async def flush(self):
+        """
+        Función para escribir el lote actual en un punto de guardado, si la escritura falla se
+        escribe fila por fila y se reportan las filas que no se pudieron guardar.
+        """
+        batch, self.batch, self.batch_ids = self.batch, [], set()
+        if not batch:
+            return
+        # se descartan las filas que hacen referencia a registros que no existen
+        for column, reference in self.references.items():
+            found = self.known[column]
+            found.update(await self.existing_ids(reference, list({getattr(item, column) for _, item in batch} - found)))
+            for number, item in batch:
+                if getattr(item, column) not in found:
+                    self.error(number, [{'loc': [column], 'msg': f'{reference.__tablename__} not found',
+                                         'type': 'value_error.reference'}])
+            batch = [(number, item) for number, item in batch if getattr(item, column) in found]
+        if not batch:
+            return
+        existing = await self.existing_ids(self.model, [item.id for _, item in batch if item.id > 0])
+        try:
+            async with self.session.begin_nested():
+                await self.write(batch)
+        except DBAPIError:
+            for number, item in batch:
+                try:
+                    async with self.session.begin_nested():
+                        await self.write([(number, item)])
+                except DBAPIError as error:
+                    self.error(number, [{'loc': [], 'msg': str(error.orig), 'type': 'database_error'}])
+                else:
+                    self.count([item], existing)
+        else:
+            self.count([item for _, item in batch], existing)
+
+    async def write(self, batch):
+        """
+        Función para escribir un lote, primero las filas con identificador y después los registros nuevos,
+        y registrar los cambios para la sincronización incremental.
+        :param batch: lista de tuplas con el número de línea y el DTO de cada fila.
+        """
+        now = datetime.utcnow()
+        upserts = [dict(item.dict(), updated_at=now) for _, item in batch if item.id > 0]
+        new = [dict(item.dict(exclude={'id'}), updated_at=now) for _, item in batch if item.id <= 0]
+        for rows in chunks(upserts):
+            await self.session.execute(upsert_statement(self.dialect, self.model, rows))
+        if upserts:
+            if self.dialect == 'postgresql':
+                # la secuencia se actualiza para que los registros nuevos no utilicen identificadores importados
+                name = self.model.__tablename__
+                await self.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                                                f"GREATEST(MAX(id), 1)) FROM {name}"))
+        ids = [row['id'] for row in upserts]
+        table = self.model.__table__
+        for rows in chunks(new):
+            if self.dialect == 'postgresql':
+                result = await self.session.execute(insert(table).values(rows).returning(table.c.id))
+                ids.extend(result.scalars().all())
+            else:
+                # SQLite no admite RETURNING en SQLAlchemy 1.4, se inserta fila por fila para obtener cada identificador
+                for row in rows:
+                    result = await self.session.execute(insert(table).values(row))
+                    ids.append(result.inserted_primary_key[0])
+        # las inserciones masivas no pasan por los eventos de la sesión, los cambios se registran explícitamente
+        record_changes(self.session, table.name, ids)
+
+    def count(self, items, existing):
+        """
+        Función para contar las filas escritas y registrar las etiquetas de caché afectadas.
+        :param items: DTO escritos.
+        :param existing: identificadores que ya existían antes de escribir el lote.
+        """
+        for item in items:
+            if item.id in existing:
+                self.updated += 1
+            else:
+                self.inserted += 1
+            if self.model is ModelTouristDestination:
+                self.tags.add(f'area:{item.conservation_area_id}:destinations')
+                if item.id in existing:
+                    self.tags.add(f'destination:{item.id}')
+            elif item.id in existing:
+                self.tags.add(f'area:{item.id}')
+        if items:
+            self.tags.update(('destinations', 'season') if self.model is ModelTouristDestination else ('areas',))
+
+    async def finish(self):
+        """
+        Función para escribir el último lote, confirmar la transacción e invalidar las respuestas
+        afectadas.
+        :return: diccionario con el reporte de la importación.
+        """
+        await self.flush()
+        if self.inserted or self.updated:
+            await increment_collection_versions(self.session, self.model.__tablename__)
+        await self.session.commit()
+        if self.tags:
+            await response_cache.invalidate(*self.tags)
+        return {'inserted': self.inserted, 'updated': self.updated, 'failed': self.failed,
+                'errors': sorted(self.errors, key=lambda error: error['line'])}
+
+
+async def import_rows(session, collection, lines, import_format):
+    """
+    Función para importar las filas de un archivo a una colección del catálogo.
+    :param session: sesión de la base de datos principal.
+    :param collection: colección a importar: conservation-area o tourist-destination.
+    :param lines: archivo de texto o iterable de líneas.
+    :param import_format: formato del archivo, ndjson o csv.
+    :return: diccionario con las filas insertadas, actualizadas, con errores y los errores de cada fila.
+    """
+    bulk_import = BulkImport(session, collection)
+    rows = parse_rows(lines, import_format)
+    while True:
+        # la lectura del archivo y la validación se realizan en el conjunto de hilos, por lotes, para no
+        # bloquear el ciclo de eventos con archivos grandes
+        validated = await run_in_threadpool(read_rows, rows, bulk_import.schema, IMPORT_BATCH_SIZE)
+        if not validated:
+            break
+        for number, item, errors in validated:
+            await bulk_import.add(number, item, errors)
+    return await bulk_import.finish()
+
+
+async def import_file(collection, path, import_format):
+    """
+    Función para importar un archivo con una sesión nueva, utilizada por la línea de comandos.
+    :param collection: colección a importar.
+    :param path: ruta del archivo.
+    :param import_format: formato del archivo, ndjson o csv.
+    :return: diccionario con el reporte de la importación.
+    """
+    from src.database import dispose_engine, new_session
+
+    session = new_session()
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as lines:
+            return await import_rows(session, collection, lines, import_format)
+    finally:
+        await session.close()
+        await dispose_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa destinos turísticos o áreas de conservación.')
+    parser.add_argument('collection', choices=sorted(IMPORT_COLLECTIONS), help='colección a importar')
+    parser.add_argument('path', help='archivo NDJSON o CSV')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='formato del archivo, por defecto su extensión')
+    args = parser.parse_args()
+
+    import_format = args.format or args.path.rsplit('.', 1)[-1].lower()
+    if import_format not in IMPORT_FORMATS:
+        parser.error('no se reconoce el formato del archivo, se debe indicar --format')
+    report = asyncio.run(import_file(args.collection, args.path, import_format))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(1 if report['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+"""
+Se establece una caché en memoria con tiempo de vida (TTL) y política de reemplazo LRU, utilizada
+para evitar repetir operaciones costosas en cada solicitud, como la decodificación de tokens o la
+consulta del rol de un usuario en la base de datos.
+"""
+
+# Valor utilizado para identificar llaves que no se encuentran en la caché
+MISSING = object()
+
+# Cachés creadas en el proceso, utilizadas para exportar sus métricas
+caches = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Clase que almacena un número limitado de valores, cada uno con una fecha de expiración,
+    y que lleva el conteo de aciertos y fallos.
+    """
+
+    def __init__(self, name, max_size, ttl):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches.add(self)
+
+    def get(self, key, default=MISSING):
+        """
+        Función para obtener un valor de la caché.
+        :param key: llave del valor.
+        :param default: valor retornado si la llave no existe o ya expiró.
+        :return: valor almacenado o el valor por defecto.
+        """
+        with self.lock:
+            item = self.items.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > time.monotonic():
+                    self.items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.items[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Función para almacenar un valor en la caché.
+        :param key: llave del valor.
+        :param value: valor a almacenar.
+        :param ttl: segundos de vida del valor, si no se indica se utiliza el de la caché.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Función para eliminar un valor de la caché.
+        :param key: llave del valor a eliminar.
+        """
+        with self.lock:
+            self.items.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Función para eliminar todos los valores que cumplan con una condición.
+        :param predicate: función que recibe la llave y el valor, retorna verdadero si se debe eliminar.
+        """
+        with self.lock:
+            keys = [key for key, (value, _) in self.items.items() if predicate(key, value)]
+            for key in keys:
+                del self.items[key]
+
+    def clear(self):
+        """
+        Función para eliminar todos los valores de la caché.
+        """
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        """
+        Función para obtener las métricas de la caché.
+        :return: diccionario con el tamaño, aciertos, fallos y proporción de aciertos.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self.items),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
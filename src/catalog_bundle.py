@@ -0,0 +1,196 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from src.conditional import collection_validators
+from src.database import new_session
+from src.fast_json import dumps
+from src.models import ChangeLog, ConservationArea, Review, TouristDestination
+from src.settings import settings
+
+"""
+Se establece el paquete del catálogo para el primer inicio de la aplicación móvil y las zonas con poca
+conexión: un solo archivo JSON comprimido con gzip que contiene todas las áreas de conservación, los
+destinos turísticos con su imagen principal, el resumen de las calificaciones de cada destino y el
+cursor de la sincronización incremental. Un proceso en segundo plano compara cada CATALOG_BUNDLE_SECONDS
+las versiones de las colecciones y genera un nuevo paquete cuando cambian; el ETag del paquete es el de
+las versiones con las que se generó.
+"""
+
+logger = logging.getLogger(__name__)
+
+CATALOG_BUNDLE_DIR = settings.catalog_bundle_dir
+CATALOG_BUNDLE_SECONDS = settings.catalog_bundle_seconds
+
+# Colecciones incluidas en el paquete, su versión determina el ETag
+BUNDLE_COLLECTIONS = ('conservation_area', 'tourist_destination', 'review')
+
+# Filas leídas en cada lote y paquetes anteriores que se conservan mientras se descargan
+BUNDLE_BATCH_SIZE = 1000
+BUNDLE_KEEP = 3
+
+
+def thumbnail(photos_path):
+    # la primera fotografía de la lista se utiliza como imagen principal
+    return photos_path.split(',')[0] if photos_path else None
+
+
+async def write_rows(session, output, statement, convert=None):
+    """
+    Función para agregar al paquete las filas de una consulta como una lista JSON, leídas y
+    comprimidas por lotes.
+    :param session: sesión de la base de datos.
+    :param output: archivo gzip del paquete.
+    :param statement: consulta de las filas.
+    :param convert: función que modifica el diccionario de cada fila.
+    """
+    result = await session.stream(statement)
+    keys = list(result.keys())
+    separator = b'['
+    async for rows in result.partitions(BUNDLE_BATCH_SIZE):
+        items = [dict(zip(keys, row)) for row in rows]
+        if convert is not None:
+            items = [convert(item) for item in items]
+        chunk = separator + b','.join(dumps(item) for item in items)
+        separator = b','
+        await run_in_threadpool(output.write, chunk)
+    await run_in_threadpool(output.write, b'[]' if separator == b'[' else b']')
+
+
+def add_thumbnail(item):
+    item['thumbnail'] = thumbnail(item['photos_path'])
+    return item
+
+
+async def write_bundle(session, path, etag):
+    """
+    Función para generar el paquete del catálogo en un archivo comprimido.
+    :param session: sesión de la base de datos.
+    :param path: ruta del archivo.
+    :param etag: versión de las colecciones incluidas.
+    """
+    # el cursor se lee antes que los registros, los cambios posteriores se repiten en la sincronización
+    cursor = (await session.execute(select(func.max(ChangeLog.id)))).scalar() or 0
+    output = await run_in_threadpool(gzip.open, path, 'wb', 6)
+    try:
+        header = {'version': etag, 'cursor': cursor, 'generated_at': datetime.utcnow()}
+        await run_in_threadpool(output.write, dumps(header)[:-1] + b',"conservation_areas":')
+        await write_rows(session, output, select(*ConservationArea.__table__.columns).order_by(ConservationArea.id),
+                         add_thumbnail)
+        await run_in_threadpool(output.write, b',"tourist_destinations":')
+        await write_rows(session, output,
+                         select(*TouristDestination.__table__.columns).order_by(TouristDestination.id), add_thumbnail)
+        await run_in_threadpool(output.write, b',"ratings":')
+        await write_rows(session, output,
+                         select(Review.tourist_destination_id, func.count(Review.id).label('count'),
+                                func.avg(Review.calification).label('average')).
+                         group_by(Review.tourist_destination_id).order_by(Review.tourist_destination_id),
+                         lambda item: dict(item, average=round(float(item['average'] or 0), 2)))
+        await run_in_threadpool(output.write, b'}')
+    finally:
+        await run_in_threadpool(output.close)
+
+
+class CatalogBundle:
+    """
+    Clase que mantiene el paquete del catálogo actualizado, con el ETag, la fecha de modificación y
+    la ruta del último paquete generado.
+    """
+
+    def __init__(self, directory=CATALOG_BUNDLE_DIR, interval=CATALOG_BUNDLE_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self.current = None
+        self.task = None
+        self.lock = None
+        self.builds = 0
+
+    def path(self, etag):
+        # el nombre del archivo depende de la versión, los procesos comparten los paquetes generados
+        return os.path.join(self.directory, f'catalog-{hashlib.sha1(etag.encode()).hexdigest()[:16]}.json.gz')
+
+    async def refresh(self):
+        """
+        Función para generar el paquete si las versiones de las colecciones cambiaron desde el último.
+        :return: tupla con el ETag, la fecha de modificación y la ruta del paquete.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            session = new_session()
+            try:
+                validators = await collection_validators(session, *BUNDLE_COLLECTIONS)
+                etag, last_modified = validators or ('"catalog"', datetime.utcnow().replace(microsecond=0))
+                if self.current is not None and self.current[0] == etag:
+                    return self.current
+                path = self.path(etag)
+                if not os.path.exists(path):
+                    os.makedirs(self.directory, exist_ok=True)
+                    temporary = f'{path}.{os.getpid()}.tmp'
+                    await write_bundle(session, temporary, etag)
+                    os.replace(temporary, path)
+                    self.builds += 1
+                    self.clean(path)
+            finally:
+                await session.close()
+            self.current = (etag, last_modified, path)
+            return self.current
+
+    def clean(self, path):
+        """
+        Función para eliminar los paquetes anteriores, se conservan los BUNDLE_KEEP más recientes.
+        :param path: ruta del paquete actual.
+        """
+        bundles = sorted((os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                          if name.startswith('catalog-') and name.endswith('.json.gz')),
+                         key=os.path.getmtime, reverse=True)
+        for old in bundles[BUNDLE_KEEP:]:
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    async def get(self):
+        """
+        Función para obtener el paquete actual, se genera si aún no existe. Si el proceso en segundo
+        plano no está activo se verifican las versiones en cada llamada.
+        :return: tupla con el ETag, la fecha de modificación y la ruta del paquete.
+        """
+        if self.current is None or self.task is None:
+            return await self.refresh()
+        return self.current
+
+    async def _worker(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog bundle could not be generated")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Función para iniciar el proceso que regenera el paquete, debe llamarse con un ciclo de eventos activo.
+        """
+        if self.interval > 0 and (self.task is None or self.task.done()):
+            self.task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self):
+        """
+        Función para detener el proceso que regenera el paquete.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+catalog_bundle = CatalogBundle()
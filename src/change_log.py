@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from sqlalchemy import delete, event, insert, text
+from sqlalchemy.orm import Session
+
+from src.models import ChangeLog, ConservationArea, Review, TouristDestination
+
+"""
+Se establece el registro de cambios del catálogo utilizado por la sincronización incremental. Cada
+escritura de un área, destino u opinión agrega una fila con la colección, el registro y la operación
+(upsert o delete) en la misma transacción; el identificador de la fila es el cursor de los clientes.
+Se conserva únicamente el cambio más reciente de cada registro, por lo que el tamaño del registro es
+proporcional al del catálogo más los registros eliminados. Las fotografías se incluyen como cambios
+de photos_path y region_path.
+
+Los cambios de la transacción se acumulan en la sesión y las filas se escriben al confirmarla. En
+PostgreSQL se toma en ese momento un bloqueo hasta el final de la transacción para que los cursores
+se confirmen en orden y un cliente no omita un cambio confirmado después de uno con mayor cursor. El
+orden de los bloqueos es siempre el mismo: primero las filas del catálogo y de collection_version,
+durante las escrituras de la transacción, y al final el bloqueo del registro de cambios, después del
+cual solo se modifican filas de change_log. Ninguna transacción espera una fila del catálogo mientras
+tiene el bloqueo, por lo que no se forman ciclos de espera y el bloqueo dura únicamente el commit.
+"""
+
+# Modelos cuyos cambios se registran, por nombre de la colección
+CHANGE_LOG_MODELS = {model.__tablename__: model for model in (ConservationArea, TouristDestination, Review)}
+
+# Llave del bloqueo de PostgreSQL que ordena las escrituras del registro de cambios
+CHANGE_LOG_LOCK = 46046
+
+# Llaves de session.info con los cambios pendientes y su copia al iniciar cada punto de guardado
+PENDING_CHANGES = 'change_log'
+SAVEPOINT_CHANGES = 'change_log_savepoints'
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+
+def change_statements(collection, ids, operation):
+    """
+    Función para crear las sentencias que registran los cambios de varios registros de una colección.
+    :param collection: nombre de la tabla de la colección.
+    :param ids: identificadores de los registros.
+    :param operation: upsert o delete.
+    :return: lista de sentencias.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return []
+    now = datetime.utcnow()
+    return [delete(ChangeLog).where(ChangeLog.collection == collection, ChangeLog.entity_id.in_(ids)),
+            insert(ChangeLog).values([{'collection': collection, 'entity_id': entity_id, 'operation': operation,
+                                       'changed_at': now} for entity_id in ids])]
+
+
+def add_changes(session, collection, ids, operation):
+    """
+    Función para acumular cambios de la transacción, se escriben al confirmarla.
+    :param session: sesión síncrona de la base de datos.
+    :param collection: nombre de la tabla de la colección.
+    :param ids: identificadores de los registros.
+    :param operation: upsert o delete.
+    """
+    changes = session.info.setdefault(PENDING_CHANGES, {})
+    for entity_id in ids:
+        # se conserva la última operación de cada registro
+        changes[(collection, entity_id)] = operation
+
+
+def record_changes(session, collection, ids, operation=UPSERT):
+    """
+    Función para registrar cambios realizados sin objetos del ORM, por ejemplo con inserciones masivas.
+    :param session: sesión de la base de datos.
+    :param collection: nombre de la tabla de la colección.
+    :param ids: identificadores de los registros.
+    :param operation: upsert o delete.
+    """
+    add_changes(session.sync_session, collection, ids, operation)
+
+
+@event.listens_for(Session, 'after_flush')
+def log_changes(session, flush_context):
+    # se acumulan los registros del catálogo nuevos, modificados o eliminados en la transacción
+    for instance in session.new:
+        if instance.__tablename__ in CHANGE_LOG_MODELS:
+            add_changes(session, instance.__tablename__, [instance.id], UPSERT)
+    for instance in session.dirty:
+        if instance.__tablename__ in CHANGE_LOG_MODELS and session.is_modified(instance):
+            add_changes(session, instance.__tablename__, [instance.id], UPSERT)
+    for instance in session.deleted:
+        if instance.__tablename__ in CHANGE_LOG_MODELS:
+            add_changes(session, instance.__tablename__, [instance.id], DELETE)
+
+
+@event.listens_for(Session, 'after_transaction_create')
+def save_changes(session, transaction):
+    # un punto de guardado revertido descarta únicamente los cambios acumulados dentro de él
+    if transaction.nested:
+        session.info.setdefault(SAVEPOINT_CHANGES, {})[transaction] = dict(session.info.get(PENDING_CHANGES, {}))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_changes(session, previous_transaction):
+    if previous_transaction.nested:
+        changes = session.info.get(SAVEPOINT_CHANGES, {}).pop(previous_transaction, None)
+        if changes is not None:
+            session.info[PENDING_CHANGES] = changes
+    elif previous_transaction.parent is None:
+        session.info.pop(PENDING_CHANGES, None)
+        session.info.pop(SAVEPOINT_CHANGES, None)
+
+
+@event.listens_for(Session, 'before_commit')
+def write_changes(session):
+    # al liberar un punto de guardado sus cambios quedan en la transacción principal
+    if session.in_nested_transaction():
+        session.info.get(SAVEPOINT_CHANGES, {}).pop(session.get_nested_transaction(), None)
+        return
+    # se escriben las modificaciones pendientes para acumular todos los cambios antes del bloqueo
+    session.flush()
+    session.info.pop(SAVEPOINT_CHANGES, None)
+    changes = session.info.pop(PENDING_CHANGES, None)
+    if not changes:
+        return
+    operations = {}
+    for (collection, entity_id), operation in changes.items():
+        operations.setdefault((collection, operation), []).append(entity_id)
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f'SELECT pg_advisory_xact_lock({CHANGE_LOG_LOCK})'))
+    for (collection, operation), ids in sorted(operations.items()):
+        for statement in change_statements(collection, ids, operation):
+            connection.execute(statement)
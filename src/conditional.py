@@ -0,0 +1,180 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Response
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+
+from src.response_cache import encode_response
+from src.models import CollectionVersion, ConservationArea, Profile, Review, TouristDestination
+
+"""
+Se establecen las solicitudes condicionales. Cada colección de recursos tiene un número de versión
+que se incrementa en la misma transacción de cualquier escritura, las respuestas incluyen los
+encabezados ETag y Last-Modified a partir de esa versión y se responde 304 a las solicitudes con
+If-None-Match o If-Modified-Since vigentes sin consultar los registros. Las respuestas propias de
+un usuario, como su perfil, se validan con el identificador y la fecha de modificación del registro
+y se marcan como privadas y dependientes del encabezado Authorization.
+"""
+
+# Modelos cuyas modificaciones incrementan la versión de su colección
+VERSIONED_MODELS = (ConservationArea, TouristDestination, Review, Profile)
+
+
+@event.listens_for(Session, 'before_flush')
+def increment_versions(session, flush_context, instances):
+    # se incrementa la versión de las colecciones con registros nuevos, modificados o eliminados
+    names = {instance.__tablename__ for instance in session.new if isinstance(instance, VERSIONED_MODELS)}
+    names.update(instance.__tablename__ for instance in session.deleted if isinstance(instance, VERSIONED_MODELS))
+    names.update(instance.__tablename__ for instance in session.dirty
+                 if isinstance(instance, VERSIONED_MODELS) and session.is_modified(instance))
+    if not names:
+        return
+    connection = session.connection()
+    now = datetime.utcnow()
+    for name in sorted(names):
+        result = connection.execute(update(CollectionVersion).where(CollectionVersion.name == name).
+                                    values(version=CollectionVersion.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            connection.execute(insert(CollectionVersion).values(name=name, version=1, updated_at=now))
+
+
+async def increment_collection_versions(session, *names):
+    """
+    Función para incrementar la versión de colecciones modificadas sin objetos del ORM, por ejemplo
+    con inserciones masivas, en la transacción de la sesión.
+    :param session: sesión de la base de datos.
+    :param names: nombres de las tablas de las colecciones.
+    """
+    now = datetime.utcnow()
+    for name in sorted(set(names)):
+        result = await session.execute(update(CollectionVersion).where(CollectionVersion.name == name).
+                                       values(version=CollectionVersion.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            await session.execute(insert(CollectionVersion).values(name=name, version=1, updated_at=now))
+
+
+async def collection_validators(session, *names):
+    """
+    Función para obtener los validadores de una respuesta a partir de las versiones de sus colecciones.
+    :param session: sesión de la base de datos.
+    :param names: nombres de las colecciones incluidas en la respuesta.
+    :return: tupla con el ETag y la fecha de modificación, o None si alguna colección no tiene versión.
+    """
+    result = await session.execute(select(CollectionVersion.name, CollectionVersion.version,
+                                          CollectionVersion.updated_at).where(CollectionVersion.name.in_(names)))
+    versions = {row.name: row for row in result}
+    if len(versions) != len(set(names)):
+        return None
+    etag = '"' + '.'.join(f'{name}-{versions[name].version}' for name in names) + '"'
+    last_modified = max(row.updated_at for row in versions.values()).replace(microsecond=0, tzinfo=timezone.utc)
+    return etag, last_modified
+
+
+async def record_validators(session, model, record_id):
+    """
+    Función para obtener los validadores de una respuesta con un solo registro a partir de su
+    identificador y fecha de modificación.
+    :param session: sesión de la base de datos.
+    :param model: modelo del registro, debe tener la columna updated_at.
+    :param record_id: identificador del registro.
+    :return: tupla con el ETag y la fecha de modificación, o None si el registro no existe.
+    """
+    result = await session.execute(select(model.updated_at).where(model.id == record_id))
+    updated_at = result.scalar()
+    if updated_at is None:
+        return None
+    etag = f'"{model.__tablename__}-{record_id}-{updated_at.strftime("%Y%m%d%H%M%S%f")}"'
+    return etag, updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Función para verificar si la copia del cliente sigue vigente, If-None-Match tiene prioridad
+    sobre If-Modified-Since.
+    :param request: solicitud recibida.
+    :param etag: ETag actual del recurso.
+    :param last_modified: fecha de la última modificación del recurso.
+    :return: verdadero si se puede responder 304.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def add_validators(response, etag, last_modified, private=False):
+    """
+    Función para agregar los encabezados de validación a una respuesta.
+    :param response: respuesta de la ruta.
+    :param etag: ETag actual del recurso.
+    :param last_modified: fecha de la última modificación del recurso.
+    :param private: verdadero si la respuesta pertenece al usuario del token, no se comparte entre usuarios.
+    :return: la misma respuesta.
+    """
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    if private:
+        response.headers['Vary'] = 'Authorization'
+    return response
+
+
+async def validated_response(request, validators, respond, *args, model=None, private=False):
+    """
+    Función para responder una solicitud condicional con los validadores indicados, si la copia del
+    cliente sigue vigente se responde 304, en caso contrario se obtiene la respuesta completa.
+    :param request: solicitud recibida.
+    :param validators: tupla con el ETag y la fecha de modificación, o None si no se conocen.
+    :param respond: corrutina que retorna la respuesta completa o los datos a codificar.
+    :param args: argumentos de la corrutina.
+    :param model: esquema de pydantic utilizado para codificar los datos.
+    :param private: verdadero si la respuesta pertenece al usuario del token.
+    :return: respuesta 304 o la respuesta completa con los encabezados de validación.
+    """
+    if validators is not None and is_not_modified(request, *validators):
+        return add_validators(Response(status_code=304), *validators, private=private)
+    response = await respond(*args)
+    if not isinstance(response, Response):
+        response = Response(content=encode_response(response, model), media_type="application/json")
+    return add_validators(response, *validators, private=private) if validators is not None else response
+
+
+async def conditional_response(request, session, collections, respond, *args, model=None):
+    """
+    Función para responder una solicitud condicional, si la copia del cliente sigue vigente se
+    responde 304 sin consultar los registros, en caso contrario se obtiene la respuesta completa.
+    :param request: solicitud recibida.
+    :param session: sesión de la base de datos.
+    :param collections: colecciones de las que depende la respuesta.
+    :param respond: corrutina que retorna la respuesta completa o los datos a codificar.
+    :param args: argumentos de la corrutina.
+    :param model: esquema de pydantic utilizado para codificar los datos.
+    :return: respuesta 304 o la respuesta completa con los encabezados de validación.
+    """
+    validators = await collection_validators(session, *collections)
+    return await validated_response(request, validators, respond, *args, model=model)
+
+
+async def record_response(request, session, record_model, record_id, respond, *args, model=None):
+    """
+    Función para responder una solicitud condicional de un registro propio del usuario del token, los
+    validadores dependen únicamente del registro y la respuesta es privada.
+    :param request: solicitud recibida.
+    :param session: sesión de la base de datos.
+    :param record_model: modelo del registro.
+    :param record_id: identificador del registro.
+    :param respond: corrutina que retorna la respuesta completa o los datos a codificar.
+    :param args: argumentos de la corrutina.
+    :param model: esquema de pydantic utilizado para codificar los datos.
+    :return: respuesta 304 o la respuesta completa con los encabezados de validación.
+    """
+    validators = await record_validators(session, record_model, record_id)
+    return await validated_response(request, validators, respond, *args, model=model, private=True)
@@ -0,0 +1,587 @@
+import asyncio
+import importlib
+import logging
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from src.cache import TTLCache
+from src.metrics import DB_CHECKOUT_SECONDS, register_collector
+from src.settings import settings
+
+"""
+Se establece la conexión con la base de datos. Por defecto se utiliza un motor asíncrono de SQLAlchemy
+(asyncpg para PostgreSQL) con un conjunto de conexiones configurable, de forma que la concurrencia
+quede limitada por la base de datos y no por los hilos de Starlette. Si el controlador asíncrono no
+está disponible, o DATABASE_ASYNC es falso, se utiliza un motor síncrono cuyas operaciones se ejecutan
+en hilos, expuesto con la misma interfaz que la sesión asíncrona. Las rutas de solo lectura pueden
+utilizar réplicas de la base de datos indicadas en DATABASE_REPLICA_URLS.
+"""
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = settings.database_url
+
+DATABASE_ASYNC = settings.database_async
+
+# Configuración del conjunto de conexiones
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_POOL_PRE_PING = settings.db_pool_pre_ping
+
+# Conexiones adicionales que pueden utilizar a la vez las consultas concurrentes de todas las solicitudes
+DB_READ_FANOUT = settings.db_read_fanout
+
+# Réplicas de lectura separadas por comas, retraso máximo permitido y segundos entre cada medición
+DATABASE_REPLICA_URLS = [url.strip() for url in settings.database_replica_urls.split(",") if url.strip()]
+REPLICA_MAX_LAG = settings.replica_max_lag
+REPLICA_CHECK_SECONDS = settings.replica_check_seconds
+
+# Segundos durante los que las lecturas de un usuario van a la base de datos principal después de escribir
+REPLICA_STICKY_SECONDS = settings.replica_sticky_seconds
+
+# Las escrituras recientes se comparten entre procesos en Redis con este prefijo
+REDIS_URL = settings.redis_url
+STICKY_PREFIX = "replica-sticky:"
+
+# Segundos de espera antes de volver a intentar conectarse a Redis después de una falla
+REDIS_RETRY_SECONDS = 5
+
+# Retraso en segundos de una réplica de PostgreSQL, cero si ya aplicó todos los cambios recibidos
+LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Controladores asíncronos para cada tipo de base de datos: (esquema, módulo del controlador)
+ASYNC_DRIVERS = {
+    'postgres': ('postgresql+asyncpg', 'asyncpg'),
+    'postgresql': ('postgresql+asyncpg', 'asyncpg'),
+    'sqlite': ('sqlite+aiosqlite', 'aiosqlite'),
+}
+
+
+def async_url(url):
+    """
+    Función para obtener la dirección de la base de datos con el controlador asíncrono.
+    :param url: dirección de la base de datos.
+    :return: dirección con el controlador asíncrono o None si no hay uno disponible.
+    """
+    scheme, _, rest = url.partition('://')
+    driver = ASYNC_DRIVERS.get(scheme.split('+')[0])
+    if driver is None:
+        return None
+    try:
+        importlib.import_module(driver[1])
+    except ImportError:
+        logger.warning("Async driver %s is not installed, using the sync database engine", driver[1])
+        return None
+    return f'{driver[0]}://{rest}'
+
+
+def timed_pool(pool_class, name):
+    """
+    Función para crear una clase de conjunto de conexiones que mide la espera al obtener una conexión.
+    :param pool_class: clase del conjunto de conexiones de SQLAlchemy.
+    :param name: nombre del conjunto en las métricas.
+    :return: clase derivada de pool_class.
+    """
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                DB_CHECKOUT_SECONDS.observe(time.perf_counter() - started, name)
+
+    return TimedPool
+
+
+def engine_options(url, pool_class=QueuePool, name='primary'):
+    """
+    Función para obtener los parámetros del motor, SQLite no utiliza un conjunto de conexiones.
+    :param url: dirección de la base de datos.
+    :param pool_class: clase del conjunto de conexiones del motor.
+    :param name: nombre del conjunto en las métricas.
+    :return: diccionario con los parámetros del motor.
+    """
+    if url.startswith('sqlite'):
+        return {'connect_args': {'check_same_thread': False}}
+    return {
+        'poolclass': timed_pool(pool_class, name),
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+
+class SyncStreamResult:
+    """
+    Clase que expone un resultado síncrono con cursor del servidor con la misma interfaz que AsyncResult,
+    cada lote de filas se obtiene en el conjunto de hilos de Starlette.
+    """
+
+    def __init__(self, result):
+        self.result = result
+
+    def keys(self):
+        return self.result.keys()
+
+    async def partitions(self, size=None):
+        """
+        Función para recorrer las filas del resultado en lotes.
+        :param size: cantidad de filas de cada lote.
+        :return: generador asíncrono de listas de filas.
+        """
+        partitions = self.result.partitions(size)
+        while True:
+            partition = await run_in_threadpool(next, partitions, None)
+            if partition is None:
+                return
+            yield partition
+
+
+class SyncNestedTransaction:
+    """
+    Clase que expone un punto de guardado (SAVEPOINT) de una sesión síncrona como administrador de
+    contexto asíncrono, igual que AsyncSession.begin_nested. Si ocurre un error dentro del bloque se
+    revierten únicamente los cambios posteriores al punto de guardado.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+        self.transaction = None
+
+    async def __aenter__(self):
+        self.transaction = await run_in_threadpool(self.sync_session.begin_nested)
+        return self
+
+    async def __aexit__(self, error_type, error, traceback):
+        if error_type is None:
+            await run_in_threadpool(self.transaction.commit)
+        else:
+            await run_in_threadpool(self.transaction.rollback)
+
+
+class SyncSessionAdapter:
+    """
+    Clase que expone una sesión síncrona con la misma interfaz que AsyncSession, cada operación
+    que accede a la base de datos se ejecuta en el conjunto de hilos de Starlette.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def _execute(self, statement, params=None, **kwargs):
+        result = self.sync_session.execute(statement, params, **kwargs)
+        # se cargan todas las filas en el hilo, el resultado se consume fuera de él
+        return result.freeze() if getattr(result, 'returns_rows', True) else result
+
+    async def execute(self, statement, params=None, **kwargs):
+        result = await run_in_threadpool(self._execute, statement, params, **kwargs)
+        return result() if callable(result) else result
+
+    def _stream(self, statement, params=None, **kwargs):
+        return self.sync_session.execute(statement.execution_options(stream_results=True), params, **kwargs)
+
+    async def stream(self, statement, params=None, **kwargs):
+        return SyncStreamResult(await run_in_threadpool(self._stream, statement, params, **kwargs))
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None):
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    def begin_nested(self):
+        return SyncNestedTransaction(self.sync_session)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+        await share_write(self.sync_session)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+def create_database_engine(url, name='primary'):
+    """
+    Función para crear el motor y la fábrica de sesiones de una base de datos, asíncronos si el
+    controlador está disponible o síncronos con la sesión adaptada en caso contrario.
+    :param url: dirección de la base de datos.
+    :param name: nombre del conjunto de conexiones en las métricas.
+    :return: tupla con el motor, la fábrica de sesiones y verdadero si el motor es asíncrono.
+    """
+    database_url = async_url(url) if DATABASE_ASYNC else None
+    if database_url:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        class SharedWriteSession(AsyncSession):
+            async def commit(self):
+                await super().commit()
+                await share_write(self.sync_session)
+
+        database_engine = create_async_engine(database_url, **engine_options(database_url, AsyncAdaptedQueuePool, name))
+        return database_engine, sessionmaker(database_engine, class_=SharedWriteSession, expire_on_commit=False), True
+    database_engine = create_engine(url, **engine_options(url, QueuePool, name))
+    factory = sessionmaker(database_engine, expire_on_commit=False)
+    return database_engine, lambda: SyncSessionAdapter(factory()), False
+
+
+engine, SessionLocal, ASYNC_ENGINE = create_database_engine(DATABASE_URL)
+
+
+class Replica:
+    """
+    Clase que representa una réplica de lectura, con su motor y el último retraso medido.
+    """
+
+    def __init__(self, url, name):
+        self.url = url
+        self.name = name
+        self.engine, self.factory, self.is_async = create_database_engine(url, name)
+        self.lag = 0.0
+        self.healthy = True
+        self.checked = 0.0
+
+
+class ReplicaRouter:
+    """
+    Clase que distribuye las lecturas entre las réplicas. Se descartan las réplicas con un retraso
+    mayor a REPLICA_MAX_LAG o que no responden, y se utiliza la base de datos principal para los
+    usuarios que realizaron una escritura en los últimos REPLICA_STICKY_SECONDS. Las escrituras se
+    registran en memoria y en Redis, de forma que la siguiente lectura del usuario vaya a la base de
+    datos principal aunque la atienda otro proceso; si Redis no está disponible solo se considera la
+    memoria del proceso.
+    """
+
+    def __init__(self, urls, max_lag, check_seconds, sticky_seconds, client=None):
+        self.replicas = [Replica(url, f'replica{index}') for index, url in enumerate(urls)]
+        self.max_lag = max_lag
+        self.check_seconds = check_seconds
+        self.sticky_seconds = sticky_seconds
+        self.writes = TTLCache("replica_sticky", 100000, sticky_seconds)
+        self._client = client
+        self.unavailable_until = 0.0
+        self.next = 0
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self.sticky_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def client(self):
+        """
+        Cliente asíncrono de Redis, se crea únicamente cuando se utiliza por primera vez.
+        """
+        if self._client is None:
+            import aioredis
+            self._client = aioredis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+        self.unavailable_until = 0.0
+
+    def _redis_available(self):
+        return time.monotonic() >= self.unavailable_until
+
+    def _redis_failed(self, error):
+        # se utilizan únicamente las escrituras registradas en el proceso hasta el siguiente intento
+        logger.warning("Replica stickiness is using the in-process fallback: %s", error)
+        self.unavailable_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def mark_write(self, key):
+        """
+        Función para registrar la escritura de un usuario, sus lecturas se envían a la base de datos principal.
+        :param key: llave que identifica al usuario.
+        """
+        self.writes.set(key, True)
+
+    async def share_write(self, key):
+        """
+        Función para registrar en Redis la escritura de un usuario, para los demás procesos.
+        :param key: llave que identifica al usuario.
+        """
+        if not self.replicas or not self._redis_available():
+            return
+        try:
+            await self.client.set(STICKY_PREFIX + key, 1, px=int(self.sticky_seconds * 1000))
+        except Exception as error:
+            self._redis_failed(error)
+
+    async def is_sticky(self, key):
+        """
+        Función para verificar si un usuario escribió recientemente, en este o en otro proceso.
+        :param key: llave que identifica al usuario.
+        :return: verdadero si sus lecturas deben ir a la base de datos principal.
+        """
+        if key is None:
+            return False
+        if self.writes.get(key, None) is not None:
+            return True
+        if self._redis_available():
+            try:
+                return bool(await self.client.exists(STICKY_PREFIX + key))
+            except Exception as error:
+                self._redis_failed(error)
+        return False
+
+    @staticmethod
+    def _sync_lag(replica, query):
+        with replica.engine.connect() as connection:
+            return connection.execute(query).scalar()
+
+    async def _check(self, replica):
+        """
+        Función para medir el retraso de una réplica, en PostgreSQL se compara la hora de la última
+        transacción aplicada, en otras bases de datos solo se verifica que responda.
+        :param replica: réplica a verificar.
+        """
+        query = text(LAG_QUERY if replica.engine.dialect.name == 'postgresql' else 'SELECT 0')
+        try:
+            if replica.is_async:
+                async with replica.engine.connect() as connection:
+                    lag = (await connection.execute(query)).scalar()
+            else:
+                lag = await run_in_threadpool(self._sync_lag, replica, query)
+            replica.lag = float(lag or 0)
+            replica.healthy = True
+        except Exception as error:
+            logger.warning("Read replica %s is unavailable: %s", replica.engine.url, error)
+            replica.healthy = False
+        replica.checked = time.monotonic()
+
+    async def choose(self):
+        """
+        Función para seleccionar la siguiente réplica disponible en orden circular.
+        :return: réplica seleccionada o None si ninguna cumple con el retraso máximo.
+        """
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self.next % len(self.replicas)]
+            self.next += 1
+            if time.monotonic() - replica.checked >= self.check_seconds:
+                await self._check(replica)
+            if replica.healthy and replica.lag <= self.max_lag:
+                return replica
+        if self.replicas:
+            self.fallbacks += 1
+        return None
+
+    def stats(self):
+        """
+        Función para obtener las métricas del enrutamiento de lecturas.
+        :return: diccionario con las lecturas por destino y el estado de cada réplica.
+        """
+        return {
+            'primary_reads': self.primary_reads,
+            'replica_reads': self.replica_reads,
+            'sticky_reads': self.sticky_reads,
+            'fallbacks': self.fallbacks,
+            'replicas': [{'url': replica.engine.url.render_as_string(hide_password=True),
+                          'healthy': replica.healthy, 'lag': replica.lag} for replica in self.replicas],
+        }
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS, REPLICA_MAX_LAG, REPLICA_CHECK_SECONDS, REPLICA_STICKY_SECONDS)
+
+
+@register_collector
+def pool_metrics():
+    # estado de los conjuntos de conexiones de la base de datos principal y de las réplicas
+    pools = [('primary', engine, ASYNC_ENGINE)]
+    pools.extend((replica.name, replica.engine, replica.is_async) for replica in replica_router.replicas)
+    size, checked_out, overflow = [], [], []
+    for name, database_engine, is_async in pools:
+        pool = database_engine.sync_engine.pool if is_async else database_engine.pool
+        if isinstance(pool, QueuePool):
+            size.append(({'pool': name}, pool.size()))
+            checked_out.append(({'pool': name}, pool.checkedout()))
+            overflow.append(({'pool': name}, max(pool.overflow(), 0)))
+    return [
+        ('sinac_db_pool_size', 'gauge', 'Conexiones permanentes del conjunto de conexiones.', size),
+        ('sinac_db_pool_checked_out', 'gauge', 'Conexiones en uso del conjunto de conexiones.', checked_out),
+        ('sinac_db_pool_overflow', 'gauge', 'Conexiones adicionales abiertas sobre el tamaño del conjunto.', overflow),
+    ]
+
+
+def request_key(request):
+    """
+    Función para identificar al autor de una solicitud, el usuario del token o la dirección del cliente.
+    :param request: solicitud recibida.
+    :return: llave del usuario.
+    """
+    authorization = request.headers.get('authorization', '')
+    if authorization.lower().startswith('bearer '):
+        from src.authentication import decode_claims
+        try:
+            return f"user:{decode_claims(authorization[7:])['sub']}"
+        except Exception:
+            pass
+    return f"client:{request.client.host}" if request.client else None
+
+
+@event.listens_for(Session, 'after_flush')
+def mark_flush(session, flush_context):
+    # se registra que la transacción modificó datos
+    session.info['flushed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def mark_commit(session):
+    # las lecturas siguientes del mismo usuario se envían a la base de datos principal
+    if session.info.pop('flushed', False) and session.info.get('write_key'):
+        replica_router.mark_write(session.info['write_key'])
+        session.info['shared_write'] = session.info['write_key']
+
+
+async def share_write(session):
+    """
+    Función para compartir con los demás procesos la escritura confirmada por una sesión, se llama
+    al finalizar el commit de la sesión para que la marca exista antes de responder la solicitud.
+    :param session: sesión síncrona de la base de datos.
+    """
+    key = session.info.pop('shared_write', None)
+    if key is not None:
+        await replica_router.share_write(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def clear_flush(session):
+    session.info.pop('flushed', None)
+
+
+def new_session(factory=None):
+    """
+    Función para crear una nueva sesión de la base de datos, asíncrona o adaptada según el motor.
+    :param factory: fábrica de sesiones, por defecto la de la base de datos principal.
+    :return: sesión de la base de datos.
+    """
+    return (factory or SessionLocal)()
+
+
+async def get_session(request: Request):
+    """
+    Dependencia utilizada por las rutas para obtener una sesión de la base de datos principal, la
+    sesión se cierra una vez finalizada la solicitud.
+    :param request: solicitud recibida, identifica al usuario que realiza escrituras.
+    :return: sesión de la base de datos.
+    """
+    session = new_session()
+    session.sync_session.info['write_key'] = request_key(request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_read_session(request: Request):
+    """
+    Dependencia utilizada por las rutas de solo lectura, obtiene una sesión de una réplica o de la
+    base de datos principal si no hay réplicas disponibles o el usuario escribió recientemente.
+    :param request: solicitud recibida.
+    :return: sesión de la base de datos.
+    """
+    replica = None
+    if replica_router.replicas:
+        if await replica_router.is_sticky(request_key(request)):
+            replica_router.sticky_reads += 1
+        else:
+            replica = await replica_router.choose()
+    if replica:
+        replica_router.replica_reads += 1
+    else:
+        replica_router.primary_reads += 1
+    session = new_session(replica.factory if replica else None)
+    session.sync_session.info['factory'] = replica.factory if replica else None
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+# Semáforo de las conexiones adicionales de concurrent_reads, se crea con el ciclo de eventos en ejecución
+read_fanout = None
+
+
+async def concurrent_reads(session, *functions):
+    """
+    Función para ejecutar varias consultas de solo lectura de forma concurrente. Una sesión no admite
+    consultas simultáneas, por lo que la primera función utiliza la sesión recibida y cada una de las
+    demás una sesión nueva de la misma base de datos, con su propia conexión del conjunto. Entre todas
+    las solicitudes se utilizan como máximo DB_READ_FANOUT conexiones adicionales; si no hay una libre,
+    las funciones restantes se ejecutan en orden con la sesión recibida, sin esperar conexiones.
+    :param session: sesión de la base de datos, la réplica elegida por get_read_session se mantiene.
+    :param functions: funciones asíncronas que reciben una sesión y realizan las consultas.
+    :return: lista con el resultado de cada función, en el mismo orden.
+    :raise: el primer error de las funciones, una vez finalizadas todas.
+    """
+    global read_fanout
+    if read_fanout is None:
+        read_fanout = asyncio.Semaphore(DB_READ_FANOUT)
+    factory = session.sync_session.info.get('factory')
+    sessions = []
+    for _ in functions[1:]:
+        if read_fanout.locked():
+            break
+        await read_fanout.acquire()
+        sessions.append(new_session(factory))
+    concurrent, sequential = functions[1:len(sessions) + 1], (functions[0],) + functions[len(sessions) + 1:]
+
+    async def in_order():
+        return [await function(session) for function in sequential]
+
+    try:
+        results = await asyncio.gather(in_order(), *(function(item) for function, item in zip(concurrent, sessions)),
+                                       return_exceptions=True)
+    finally:
+        for item in sessions:
+            try:
+                await item.close()
+            finally:
+                read_fanout.release()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results[0][:1] + results[1:] + results[0][1:]
+
+
+async def dispose_engine():
+    """
+    Función para cerrar todas las conexiones de los motores al finalizar la aplicación.
+    """
+    for database_engine, is_async in [(engine, ASYNC_ENGINE)] + [(replica.engine, replica.is_async)
+                                                              for replica in replica_router.replicas]:
+        if is_async:
+            await database_engine.dispose()
+        else:
+            await run_in_threadpool(database_engine.dispose)
@@ -0,0 +1,109 @@
+import json
+import logging
+from datetime import date, datetime
+
+from src.settings import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+Se establece la codificación rápida de las listas del catálogo. En lugar de cargar objetos del ORM
+(con su mapa de identidad) y convertir cada uno con pydantic y jsonable_encoder, se seleccionan
+únicamente las columnas de la tabla como tuplas y se codifican directamente con orjson. El contenido
+es el mismo que el de la ruta con objetos del ORM. Se habilita con FAST_JSON=true.
+"""
+
+logger = logging.getLogger(__name__)
+
+FAST_JSON = settings.fast_json
+
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON is enabled but orjson is not installed, using the standard json encoder")
+
+
+class ColumnRows(list):
+    """
+    Clase que representa una lista de filas seleccionadas por columnas, junto con los nombres de las
+    columnas y las conversiones que se aplican a algunos valores antes de codificarlos.
+    """
+
+    def __init__(self, keys, rows, converters=None):
+        super().__init__(rows)
+        self.keys = keys
+        self.converters = converters or {}
+
+    def subset(self, rows):
+        """
+        Función para obtener una lista con las mismas columnas y únicamente las filas indicadas.
+        :param rows: filas que se conservan.
+        :return: nueva lista de filas.
+        """
+        return ColumnRows(self.keys, rows, self.converters)
+
+    def items(self):
+        """
+        Función para obtener las filas como diccionarios, con las conversiones aplicadas.
+        :return: lista de diccionarios con el nombre de cada columna y su valor.
+        """
+        keys = self.keys
+        if not self.converters:
+            return [dict(zip(keys, row)) for row in self]
+        converters = [(index, key, self.converters[key]) for index, key in enumerate(keys) if key in self.converters]
+        items = []
+        for row in self:
+            item = dict(zip(keys, row))
+            for index, key, convert in converters:
+                item[key] = convert(row[index])
+            items.append(item)
+        return items
+
+    def encode(self):
+        """
+        Función para codificar las filas en JSON, con el mismo formato que jsonable_encoder.
+        :return: bytes con el contenido JSON.
+        """
+        return dumps(self.items())
+
+
+def encode_value(value):
+    # fechas en formato ISO 8601, igual que jsonable_encoder
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """
+    Función para codificar datos en JSON con orjson, o con json si no está instalado.
+    :param data: listas, diccionarios y valores simples, incluyendo fechas.
+    :return: bytes con el contenido JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=encode_value, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+async def select_list(session, statement, fast=FAST_JSON, **converters):
+    """
+    Función para obtener los registros de una consulta de una lista, como filas de columnas si la
+    codificación rápida está habilitada o como objetos del ORM en caso contrario.
+    :param session: sesión de la base de datos.
+    :param statement: consulta de un modelo, por ejemplo select(Model).where(...).
+    :param fast: verdadero para seleccionar las columnas en lugar de objetos del ORM.
+    :param converters: funciones que se aplican al valor de una columna, por nombre de la columna.
+    :return: lista de filas o de DAO.
+    """
+    if fast:
+        model = statement.column_descriptions[0]['entity']
+        result = await session.execute(statement.with_only_columns(*model.__table__.columns))
+        return ColumnRows(list(result.keys()), result.all(), converters)
+    result = await session.execute(statement)
+    items = result.scalars().all()
+    for item in items:
+        for name, convert in converters.items():
+            setattr(item, name, convert(getattr(item, name)))
+    return items
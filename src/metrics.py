@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from starlette.routing import Match
+
+from src.cache import TTLCache, caches
+
+"""
+Se establecen las métricas de la aplicación en el formato de texto de Prometheus. Los histogramas
+se actualizan en el momento de cada operación con un costo mínimo (una búsqueda binaria y una suma),
+las demás métricas se obtienen de las estadísticas de cada componente únicamente al consultar /metrics.
+"""
+
+# Tipo de contenido del formato de texto de Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites en segundos de los histogramas de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Ruta asignada a las solicitudes que no corresponden a ninguna ruta, evita crear una serie por dirección
+UNMATCHED_ROUTE = "unmatched"
+
+# Histogramas y funciones que generan métricas al momento de la consulta
+histograms = []
+collectors = []
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    values = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                      for name, value in labels.items())
+    return '{' + values + '}'
+
+
+class Histogram:
+    """
+    Clase que acumula la distribución de una medición por cada combinación de etiquetas.
+    """
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+        histograms.append(self)
+
+    def observe(self, value, *label_values):
+        """
+        Función para registrar una medición.
+        :param value: valor medido.
+        :param label_values: valores de las etiquetas en el orden de su declaración.
+        """
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """
+        Función para medir la duración de un bloque de código.
+        :param label_values: valores de las etiquetas en el orden de su declaración.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def collect(self):
+        """
+        Función para obtener las muestras acumuladas del histograma.
+        :return: lista de tuplas con el sufijo, las etiquetas y el valor de cada muestra.
+        """
+        with self.lock:
+            series = [(label_values, list(counts), total) for label_values, (counts, total) in self.series.items()]
+        samples = []
+        for label_values, counts, total in series:
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': '+Inf' if bound == float('inf') else repr(bound)},
+                                cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return samples
+
+
+def register_collector(collector):
+    """
+    Función para registrar una función que genera métricas al momento de la consulta. La función
+    retorna una lista de tuplas (nombre, tipo, descripción, lista de (etiquetas, valor)).
+    :param collector: función a registrar.
+    :return: la misma función, para utilizarla como decorador.
+    """
+    collectors.append(collector)
+    return collector
+
+
+def render_metrics():
+    """
+    Función para generar el contenido de la ruta /metrics.
+    :return: texto en el formato de Prometheus.
+    """
+    lines = []
+    for histogram in histograms:
+        lines.append(f'# HELP {histogram.name} {histogram.description}')
+        lines.append(f'# TYPE {histogram.name} histogram')
+        lines.extend(f'{histogram.name}{suffix}{format_labels(labels)} {value}'
+                     for suffix, labels, value in histogram.collect())
+    # las métricas con el mismo nombre de distintos componentes se agrupan en una sola familia
+    families = {}
+    for collector in collectors:
+        for name, kind, description, samples in collector():
+            families.setdefault(name, (kind, description, []))[2].extend(samples)
+    for name, (kind, description, samples) in families.items():
+        if samples:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{format_labels(labels)} {value}' for labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram('sinac_request_duration_seconds', 'Duración de las solicitudes por ruta.',
+                            ('method', 'route', 'status'))
+IMAGE_SECONDS = Histogram('sinac_image_processing_seconds', 'Duración de la reducción de imágenes.',
+                          ('operation',))
+EMAIL_SECONDS = Histogram('sinac_email_send_seconds', 'Duración del envío de correos por SMTP.', ('result',))
+PASSWORD_SECONDS = Histogram('sinac_password_hash_seconds', 'Duración del cálculo de hashes de contraseñas.',
+                             ('operation',))
+DB_CHECKOUT_SECONDS = Histogram('sinac_db_pool_checkout_seconds',
+                                'Espera para obtener una conexión del conjunto de conexiones.', ('pool',))
+
+# Solicitudes en curso por ruta
+in_flight = {}
+
+# Ruta correspondiente a cada método y dirección ya resuelta
+route_templates = TTLCache("metrics_routes", 10000, 3600)
+
+
+def route_template(scope):
+    """
+    Función para obtener la ruta declarada que corresponde a una solicitud, por ejemplo
+    /tourist-destination/{tourist_destination_id}.
+    :param scope: datos de la solicitud.
+    :return: ruta declarada o UNMATCHED_ROUTE.
+    """
+    key = (scope['method'], scope['path'])
+    template = route_templates.get(key, None)
+    if template is None:
+        template = UNMATCHED_ROUTE
+        for route in scope['app'].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                template = route.path
+                break
+        route_templates.set(key, template)
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Middleware de ASGI que mide la duración de las solicitudes y la cantidad de solicitudes en curso por ruta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope)
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        in_flight[route] = in_flight.get(route, 0) + 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight[route] -= 1
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope['method'], route, status[0])
+
+
+@register_collector
+def request_metrics():
+    return [('sinac_requests_in_flight', 'gauge', 'Solicitudes en curso por ruta.',
+             [({'route': route}, count) for route, count in in_flight.items()])]
+
+
+@register_collector
+def cache_metrics():
+    # cachés en memoria de la aplicación (tokens, respuestas, réplicas, rutas)
+    stats = [cache.stats() for cache in list(caches)]
+    return [
+        ('sinac_cache_hits_total', 'counter', 'Aciertos de las cachés en memoria.',
+         [({'cache': item['name']}, item['hits']) for item in stats]),
+        ('sinac_cache_misses_total', 'counter', 'Fallos de las cachés en memoria.',
+         [({'cache': item['name']}, item['misses']) for item in stats]),
+        ('sinac_cache_hit_ratio', 'gauge', 'Proporción de aciertos de las cachés en memoria.',
+         [({'cache': item['name']}, item['hit_ratio']) for item in stats]),
+        ('sinac_cache_size', 'gauge', 'Cantidad de valores en las cachés en memoria.',
+         [({'cache': item['name']}, item['size']) for item in stats]),
+    ]
+
+
+@register_collector
+def threadpool_metrics():
+    # conjunto de hilos por defecto del ciclo de eventos, utilizado por run_in_threadpool de Starlette
+    executor = getattr(asyncio.get_running_loop(), '_default_executor', None)
+    if executor is None:
+        return []
+    return [
+        ('sinac_threadpool_max_workers', 'gauge', 'Hilos máximos de cada conjunto de hilos.',
+         [({'pool': 'starlette'}, executor._max_workers)]),
+        ('sinac_threadpool_workers', 'gauge', 'Hilos creados en cada conjunto de hilos.',
+         [({'pool': 'starlette'}, len(executor._threads))]),
+        ('sinac_threadpool_queued', 'gauge', 'Tareas en espera de un hilo en cada conjunto de hilos.',
+         [({'pool': 'starlette'}, executor._work_queue.qsize())]),
+    ]
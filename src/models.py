@@ -1,6 +1,9 @@
-from sqlalchemy import Integer, String, Column, Float, ForeignKey, Boolean, DateTime
+from datetime import datetime
+
+from sqlalchemy import (DDL, Integer, String, Column, Float, ForeignKey, Boolean, DateTime, Index, Text,
+                        UniqueConstraint, event, func)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 
 
 """
@@ -23,6 +26,10 @@ class User(Base):
     password = Column(String)
     admin = Column(Boolean)
 
+    # búsqueda por prefijo del correo en la administración, en PostgreSQL LIKE utiliza el índice con text_pattern_ops
+    __table_args__ = (Index('ix_user_email_pattern', func.lower(email).label('email_lower'),
+                            postgresql_ops={'email_lower': 'text_pattern_ops'}),)
+
 
 class Profile(Base):
     """
@@ -35,10 +42,21 @@ class Profile(Base):
     phone = Column(String)
     profile_photo_path = Column(String)
     cover_photo_path = Column(String)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=func.now())
 
-    user_id = Column(Integer, ForeignKey("user.id"))
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
     user = relationship(User)
 
+    # búsqueda por parte del nombre en la administración, en PostgreSQL ILIKE utiliza el índice de trigramas
+    __table_args__ = (Index('ix_profile_name_trgm', name, postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'}),)
+
+
+# el índice de trigramas requiere la extensión pg_trgm
+event.listen(Profile.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 
 class ConservationArea(Base):
     """
@@ -52,6 +70,8 @@ class ConservationArea(Base):
     description = Column(String)
     photos_path = Column(String)
     region_path = Column(String)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=func.now())
 
 
 class TouristDestination(Base):
@@ -79,10 +99,12 @@ class TouristDestination(Base):
     is_mountain = Column(Boolean)
     start_season = Column(Integer)
     end_season = Column(Integer)
-    conservation_area_id = Column(Integer, ForeignKey("conservation_area.id"))
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=func.now())
+    conservation_area_id = Column(Integer, ForeignKey("conservation_area.id"), index=True)
 
     conservation_area = relationship(
-        ConservationArea, backref="tourist_destinations")
+        ConservationArea, backref=backref("tourist_destinations", order_by=id))
 
 
 class FavoriteArea(Base):
@@ -93,7 +115,7 @@ class FavoriteArea(Base):
     __tablename__ = "favorite_area"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
     conservation_area_id = Column(
         Integer, ForeignKey("conservation_area.id"))
 
@@ -107,6 +129,8 @@ class FavoriteDestination(Base):
         de los destinos favoritos.
     """
     __tablename__ = "favorite_destination"
+    __table_args__ = (Index('ix_favorite_destination_user_id_tourist_destination_id', 'user_id',
+                            'tourist_destination_id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"))
@@ -124,6 +148,8 @@ class VisitedDestination(Base):
         de los destinos visitados.
     """
     __tablename__ = "visited_destination"
+    __table_args__ = (Index('ix_visited_destination_user_id_tourist_destination_id', 'user_id',
+                            'tourist_destination_id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"))
@@ -141,12 +167,17 @@ class Review(Base):
         de las opiniones.
     """
     __tablename__ = "review"
+    # opiniones de un destino ordenadas por fecha y opinión de un usuario sobre un destino
+    __table_args__ = (Index('ix_review_tourist_destination_id_date', 'tourist_destination_id', 'date'),
+                      Index('ix_review_user_id_tourist_destination_id', 'user_id', 'tourist_destination_id'))
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     text = Column(String)
     date = Column(DateTime)
     calification = Column(Integer)
     image_path = Column(String)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=func.now())
     user_id = Column(Integer, ForeignKey("user.id"))
     tourist_destination_id = Column(
         Integer, ForeignKey("tourist_destination.id"))
@@ -164,6 +195,49 @@ class Gallery(Base):
     id = Column(Integer, primary_key=True, index=True)
     photos_path = Column(String)
     
-    profile_id = Column(Integer, ForeignKey("profile.id"))
+    profile_id = Column(Integer, ForeignKey("profile.id"), index=True)
     profile = relationship(Profile)
 
+
+class CollectionVersion(Base):
+    """
+        Clase que hereda de Base y hace referencía a un DAO del número de versión
+        y la fecha de la última modificación de cada colección de recursos.
+    """
+    __tablename__ = "collection_version"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SyncOperation(Base):
+    """
+        Clase que hereda de Base y hace referencía a un DAO de las operaciones sincronizadas
+        por la aplicación móvil, con el resultado de cada una para responder los reintentos.
+    """
+    __tablename__ = "sync_operation"
+    __table_args__ = (UniqueConstraint('user_id', 'op_id'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    op_id = Column(String, nullable=False)
+    status = Column(Integer, nullable=False)
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ChangeLog(Base):
+    """
+        Clase que hereda de Base y hace referencía a un DAO del registro de cambios del catálogo,
+        el identificador es el cursor de la sincronización incremental.
+    """
+    __tablename__ = "change_log"
+    # en SQLite se utiliza AUTOINCREMENT para que los identificadores de los cambios eliminados no se reutilicen
+    __table_args__ = (Index('ix_change_log_collection_entity_id', 'collection', 'entity_id'),
+                      {'sqlite_autoincrement': True})
+
+    id = Column(Integer, primary_key=True)
+    collection = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
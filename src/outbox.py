@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+
+from fastapi import HTTPException
+
+from src.metrics import EMAIL_SECONDS
+
+"""
+Se establece la bandeja de salida de correos electrónicos. Los mensajes se encolan y un proceso en
+segundo plano los envía en lotes reutilizando una misma conexión SMTP, de forma que las rutas no
+esperan por el servidor de correo. Los envíos fallidos se reintentan con espera exponencial.
+Un correo se puede reservar antes de confirmar la transacción que lo origina y liberarse para su
+envío después de confirmarla, de forma que si la bandeja está llena se rechaza la solicitud sin
+modificar los datos. La bandeja se mantiene en memoria: los correos pendientes se pierden si el
+proceso termina de forma inesperada.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutbox:
+    """
+    Clase que administra la cola de correos pendientes y la conexión SMTP reutilizada para enviarlos.
+    """
+
+    def __init__(self, hostname, port, username=None, password=None, sender=None, sender_name=None,
+                 start_tls=True, use_tls=False, use_credentials=True, template_folder='./assets/email',
+                 batch_size=20, max_retries=5, retry_delay=1.0, idle_timeout=30.0, max_queue=10000):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.sender_name = sender_name
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.use_credentials = use_credentials
+        self.template_folder = template_folder
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self.queue = None
+        self.task = None
+        self.held = set()
+        self.retries = set()
+        self.smtp = None
+        self.templates = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections = 0
+        self.total_send_time = 0.0
+
+    def render(self, template_name, body):
+        """
+        Función para generar el contenido HTML de un correo a partir de una plantilla.
+        :param template_name: nombre del archivo de la plantilla.
+        :param body: diccionario con los valores de la plantilla.
+        :return: contenido HTML.
+        """
+        if self.templates is None:
+            from jinja2 import Environment, FileSystemLoader
+            self.templates = Environment(loader=FileSystemLoader(self.template_folder), autoescape=True)
+        return self.templates.get_template(template_name).render(**body)
+
+    def start(self):
+        """
+        Función para iniciar el proceso que envía los correos encolados, debe llamarse con un ciclo de eventos activo.
+        """
+        if self.task is None or self.task.done():
+            # el límite de la cola se verifica al encolar, de forma que los correos reservados y los
+            # reintentos siempre se puedan agregar
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._worker())
+
+    async def stop(self, timeout=10.0):
+        """
+        Función para detener el proceso de envío, espera a que se envíen los correos pendientes.
+        :param timeout: segundos máximos de espera.
+        """
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Email outbox stopped with %s pending messages", self.queue.qsize())
+        for task in self.retries:
+            task.cancel()
+        if self.retries:
+            logger.warning("Email outbox stopped with %s messages waiting to be retried", len(self.retries))
+        self.retries.clear()
+        self.task.cancel()
+        self.task = None
+        await self._disconnect()
+
+    def pending(self):
+        """
+        Función para obtener la cantidad de correos en la cola, reservados o en espera de un reintento.
+        :return: cantidad de correos pendientes.
+        """
+        return (self.queue.qsize() if self.queue else 0) + len(self.held) + len(self.retries)
+
+    async def enqueue(self, recipient, subject, template_name, body, hold=False):
+        """
+        Función para encolar un correo electrónico, retorna sin esperar el envío.
+        :param recipient: correo electrónico del destinatario.
+        :param subject: asunto del correo.
+        :param template_name: nombre de la plantilla del contenido.
+        :param body: diccionario con los valores de la plantilla.
+        :param hold: verdadero para reservar el correo sin enviarlo hasta llamar a release.
+        :return: correo encolado o reservado.
+        :raise Error 503: la bandeja de salida se encuentra llena.
+        """
+        if self.pending() >= self.max_queue:
+            raise HTTPException(status_code=503, detail='Email service busy, try again later')
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = f'{self.sender_name} <{self.sender}>' if self.sender_name else self.sender
+        message['To'] = recipient
+        message.set_content(self.render(template_name, body), subtype='html')
+        self.start()
+        if hold:
+            self.held.add(message)
+        else:
+            self.queue.put_nowait((message, 0))
+        return message
+
+    def release(self, message):
+        """
+        Función para enviar un correo reservado, se llama después de confirmar la transacción.
+        :param message: correo reservado con enqueue.
+        """
+        self.held.discard(message)
+        self.start()
+        self.queue.put_nowait((message, 0))
+
+    def discard(self, message):
+        """
+        Función para descartar un correo reservado, se llama si la transacción no se confirma.
+        :param message: correo reservado con enqueue.
+        """
+        self.held.discard(message)
+
+    async def _connect(self):
+        """
+        Función para abrir la conexión SMTP si no se encuentra abierta.
+        """
+        if self.smtp is not None and self.smtp.is_connected:
+            return
+        import aiosmtplib
+        self.smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, use_tls=self.use_tls)
+        await self.smtp.connect()
+        if self.start_tls and not self.use_tls:
+            await self.smtp.starttls()
+        if self.use_credentials:
+            await self.smtp.login(self.username, self.password)
+        self.connections += 1
+
+    async def _disconnect(self):
+        """
+        Función para cerrar la conexión SMTP.
+        """
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except Exception:
+                self.smtp.close()
+        self.smtp = None
+
+    async def _retry(self, message, attempts):
+        """
+        Función para volver a encolar un correo fallido después de una espera exponencial.
+        :param message: correo a reenviar.
+        :param attempts: número de intentos realizados.
+        """
+        await asyncio.sleep(self.retry_delay * 2 ** (attempts - 1))
+        self.queue.put_nowait((message, attempts))
+
+    async def _send_batch(self, batch):
+        """
+        Función para enviar un lote de correos con la misma conexión.
+        :param batch: lista de tuplas (correo, intentos).
+        """
+        for message, attempts in batch:
+            started = time.perf_counter()
+            try:
+                await self._connect()
+                await self.smtp.send_message(message)
+                self.sent += 1
+                self.total_send_time += time.perf_counter() - started
+                EMAIL_SECONDS.observe(time.perf_counter() - started, 'sent')
+            except Exception as error:
+                EMAIL_SECONDS.observe(time.perf_counter() - started, 'failed')
+                await self._disconnect()
+                attempts += 1
+                if attempts > self.max_retries:
+                    self.failed += 1
+                    logger.error("Email to %s discarded after %s attempts: %s", message['To'], attempts, error)
+                else:
+                    self.retried += 1
+                    logger.warning("Email to %s failed, retrying: %s", message['To'], error)
+                    # se conserva la referencia de la tarea para poder cancelarla al detener la bandeja
+                    task = asyncio.get_running_loop().create_task(self._retry(message, attempts))
+                    self.retries.add(task)
+                    task.add_done_callback(self.retries.discard)
+
+    async def _worker(self):
+        """
+        Proceso en segundo plano que toma los correos de la cola en lotes y los envía. La conexión
+        se mantiene abierta entre lotes y se cierra tras idle_timeout segundos sin correos.
+        """
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                await self._disconnect()
+                continue
+            batch = [item]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self):
+        """
+        Función para obtener las métricas de la bandeja de salida.
+        :return: diccionario con los correos pendientes, enviados, reintentados y fallidos.
+        """
+        return {
+            'pending': self.pending(),
+            'sent': self.sent,
+            'retried': self.retried,
+            'failed': self.failed,
+            'connections': self.connections,
+            'average_send_time': self.total_send_time / self.sent if self.sent else 0.0,
+        }
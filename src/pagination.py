@@ -0,0 +1,91 @@
+from sqlalchemy import func, literal, select, text
+
+from src.fast_json import ColumnRows
+from src.settings import settings
+
+"""
+Se establece la paginación por llave (keyset) de los listados de la administración. Cada página se
+obtiene con los registros cuyo identificador es mayor al último de la página anterior, por lo que el
+costo de una página no depende de su posición y no se leen todos los registros de la tabla. El total
+es aproximado: en PostgreSQL, sin filtros, se utiliza la estimación de las estadísticas de la tabla y
+en los demás casos se cuentan como máximo ADMIN_COUNT_LIMIT registros.
+"""
+
+ADMIN_PAGE_LIMIT = settings.admin_page_limit
+ADMIN_COUNT_LIMIT = settings.admin_count_limit
+
+# Máximo de registros por página
+ADMIN_PAGE_MAX_LIMIT = 1000
+
+
+def like_pattern(value, contains=False):
+    """
+    Función para crear el patrón de LIKE de una búsqueda, los comodines del texto se escapan.
+    :param value: texto buscado.
+    :param contains: verdadero para buscar el texto en cualquier posición, falso para buscar por prefijo.
+    :return: patrón de la búsqueda, se utiliza con escape='\\'.
+    """
+    value = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{value}%' if contains else f'{value}%'
+
+
+def page_statement(statement, column, after, limit):
+    """
+    Función para obtener la consulta de una página de un listado ordenado por identificador.
+    :param statement: consulta con los filtros del listado.
+    :param column: columna del identificador.
+    :param after: identificador del último registro de la página anterior, cero para la primera.
+    :param limit: cantidad de registros de la página.
+    :return: consulta de la página, con un registro adicional para saber si hay una página siguiente.
+    """
+    return statement.where(column > after).order_by(column).limit(limit + 1)
+
+
+def split_page(items, limit):
+    """
+    Función para separar los registros de la página del registro adicional.
+    :param items: registros obtenidos con la consulta de page_statement.
+    :param limit: cantidad de registros de la página.
+    :return: tupla con los registros de la página y el identificador para solicitar la página
+    siguiente, None si es la última.
+    """
+    if len(items) <= limit:
+        return items, None
+    page = items[:limit]
+    return items.subset(page) if isinstance(items, ColumnRows) else page, page[-1].id
+
+
+async def approximate_count(session, statement, table, filtered):
+    """
+    Función para obtener el total aproximado de registros de un listado.
+    :param session: sesión de la base de datos.
+    :param statement: consulta con los filtros del listado.
+    :param table: tabla del listado.
+    :param filtered: verdadero si el listado tiene filtros.
+    :return: tupla con el total y verdadero si el total es exacto.
+    """
+    if not filtered and session.sync_session.get_bind().dialect.name == 'postgresql':
+        result = await session.execute(text("SELECT reltuples FROM pg_class WHERE oid = CAST(:name AS regclass)"),
+                                       {'name': f'"{table.name}"'})
+        estimate = result.scalar()
+        # reltuples es negativo si la tabla aún no tiene estadísticas
+        if estimate is not None and estimate >= 0:
+            return int(estimate), False
+    limited = statement.with_only_columns(literal(1)).select_from(table).order_by(None).limit(ADMIN_COUNT_LIMIT)
+    total = (await session.execute(select(func.count()).select_from(limited.subquery()))).scalar()
+    return total, total < ADMIN_COUNT_LIMIT
+
+
+def page_headers(response, next_after, total, exact):
+    """
+    Función para agregar a la respuesta los encabezados de la paginación.
+    :param response: respuesta HTTP.
+    :param next_after: identificador para solicitar la página siguiente, None si es la última.
+    :param total: total aproximado de registros, None si no se calculó.
+    :param exact: verdadero si el total es exacto.
+    """
+    if next_after is not None:
+        response.headers['X-Next-After'] = str(next_after)
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Total-Count-Exact'] = 'true' if exact else 'false'
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from src.settings import settings
+
+"""
+Se establece el perfilado de solicitudes individuales. Un administrador agrega el encabezado
+X-Profile: 1 o el parámetro ?profile=1 y la solicitud se ejecuta bajo un perfilador por muestreo:
+un hilo toma la pila del ciclo de eventos cada PROFILE_INTERVAL segundos mientras la tarea de la
+solicitud se encuentra en ejecución. Las pilas se guardan en formato "folded" (compatible con
+flamegraph.pl y speedscope) en un directorio que conserva únicamente los PROFILE_LIMIT más recientes.
+Las solicitudes sin el indicador no tienen ningún costo adicional más allá de buscarlo.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Directorio de los perfiles, no debe estar dentro de data_repository porque este es público
+PROFILE_DIR = settings.profile_dir
+
+# Cantidad máxima de perfiles almacenados y segundos entre cada muestra
+PROFILE_LIMIT = settings.profile_limit
+PROFILE_INTERVAL = settings.profile_interval
+
+# Extensión de los archivos de perfiles
+PROFILE_EXTENSION = ".folded"
+
+# Nombres válidos de los archivos de perfiles, evita acceder a otros archivos del sistema
+PROFILE_NAME = re.compile(r'^[\w.-]+\.folded$')
+
+
+def profile_requested(scope):
+    """
+    Función para verificar si una solicitud pide ser perfilada.
+    :param scope: datos de la solicitud.
+    :return: verdadero si incluye el encabezado o el parámetro del perfilador.
+    """
+    if b'profile=' in scope.get('query_string', b''):
+        values = parse_qs(scope['query_string'].decode('latin-1')).get('profile', [])
+        if values and values[0] not in ('0', 'false'):
+            return True
+    return any(name == b'x-profile' and value not in (b'0', b'false') for name, value in scope['headers'])
+
+
+def is_admin(scope):
+    """
+    Función para verificar que la solicitud pertenezca a un administrador a partir de su token.
+    :param scope: datos de la solicitud.
+    :return: verdadero si el token es válido y tiene el rol de administrador.
+    """
+    from fastapi import HTTPException
+    from src.authentication import ADMIN_ROLE, access_claims
+
+    authorization = dict(scope['headers']).get(b'authorization', b'').decode('latin-1')
+    if not authorization.lower().startswith('bearer '):
+        return False
+    try:
+        return access_claims(authorization[7:]).get('role') == ADMIN_ROLE
+    except HTTPException:
+        return False
+
+
+class Sampler(threading.Thread):
+    """
+    Hilo que toma muestras de la pila del ciclo de eventos mientras la tarea indicada está en ejecución.
+    """
+
+    def __init__(self, loop, task, interval=PROFILE_INTERVAL):
+        super().__init__(name="profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.finished = threading.Event()
+
+    def run(self):
+        # tareas en ejecución de cada ciclo de eventos, si la versión de Python no lo expone se
+        # cuentan todas las muestras del ciclo
+        current_tasks = getattr(asyncio.tasks, '_current_tasks', None)
+        if not isinstance(current_tasks, dict):
+            current_tasks = None
+        while not self.finished.wait(self.interval):
+            # solo se cuentan las muestras en las que el ciclo ejecuta la tarea de esta solicitud
+            if current_tasks is not None and current_tasks.get(self.loop) is not self.task:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def profile_name(scope):
+    """
+    Función para generar el nombre del perfil de una solicitud, ordenable por fecha.
+    :param scope: datos de la solicitud perfilada.
+    :return: nombre del archivo del perfil.
+    """
+    path = re.sub(r'[^\w-]+', '_', scope['path']).strip('_') or 'root'
+    return f"{int(time.time() * 1000)}-{scope['method']}-{path}{PROFILE_EXTENSION}"
+
+
+def save_profile(name, sampler):
+    """
+    Función para guardar un perfil y eliminar los más antiguos que superan PROFILE_LIMIT.
+    :param name: nombre del archivo del perfil.
+    :param sampler: hilo con las muestras tomadas.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), 'w') as file:
+        file.writelines(f'{stack} {count}\n' for stack, count in sampler.stacks.most_common())
+    for old in list_profiles()[PROFILE_LIMIT:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old['name']))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """
+    Función para obtener los perfiles almacenados, del más reciente al más antiguo.
+    :return: lista de diccionarios con el nombre, tamaño y fecha de cada perfil.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if PROFILE_NAME.match(name):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            profiles.append({'name': name, 'size': stat.st_size, 'created': stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile['name'], reverse=True)
+
+
+def profile_path(name):
+    """
+    Función para obtener la ruta de un perfil almacenado.
+    :param name: nombre del perfil.
+    :return: ruta del archivo o None si el perfil no existe.
+    """
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilerMiddleware:
+    """
+    Middleware de ASGI que perfila las solicitudes de administradores que lo solicitan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not profile_requested(scope) or not is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = Sampler(asyncio.get_running_loop(), asyncio.current_task())
+        name = profile_name(scope)
+
+        async def send_with_profile(message):
+            # el perfil se guarda al finalizar la solicitud, su nombre se indica en la respuesta
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', name.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            sampler.stop()
+            save_profile(name, sampler)
+            logger.info("Profiled %s %s in %.1f ms with %s samples: %s", scope['method'], scope['path'],
+                        (time.perf_counter() - started) * 1000, sampler.samples, name)
@@ -0,0 +1,172 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.settings import settings
+
+"""
+Se establece el conteo de consultas SQL por solicitud. Los eventos de los motores de SQLAlchemy
+registran la cantidad de consultas, el tiempo total en la base de datos y la consulta más lenta de
+la solicitud en curso; las consultas repetidas con distintos parámetros se reportan como posibles
+problemas N+1.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Se agregan las métricas como encabezados de la respuesta
+QUERY_DEBUG = settings.query_debug
+
+# Límites de consultas y de milisegundos en la base de datos a partir de los cuales se registra la solicitud
+QUERY_COUNT_THRESHOLD = settings.query_count_threshold
+QUERY_TIME_THRESHOLD = settings.query_time_threshold
+
+# Repeticiones de una misma consulta a partir de las cuales se considera un problema N+1
+N_PLUS_ONE_THRESHOLD = settings.n_plus_one_threshold
+
+# Caracteres de la consulta incluidos en los encabezados y registros
+STATEMENT_LENGTH = 200
+
+# Literales que se eliminan para agrupar consultas iguales con distintos parámetros
+LITERALS = re.compile(r"'[^']*'|\b\d+\b")
+
+
+class QueryStats:
+    """
+    Clase que acumula las métricas de las consultas de una solicitud.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = None
+        self.slowest_time = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        """
+        Función para registrar una consulta ejecutada.
+        :param statement: texto de la consulta.
+        :param elapsed: segundos de ejecución.
+        """
+        self.count += 1
+        self.total += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest, self.slowest_time = statement, elapsed
+        self.statements[LITERALS.sub('?', statement)] += 1
+
+    def repeated(self):
+        """
+        Función para obtener las consultas repetidas dentro de la solicitud.
+        :return: lista de tuplas con la consulta y la cantidad de repeticiones.
+        """
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= N_PLUS_ONE_THRESHOLD]
+
+    def headers(self):
+        """
+        Función para obtener los encabezados de depuración.
+        :return: lista de encabezados en el formato de ASGI.
+        """
+        headers = [(b'x-query-count', str(self.count).encode()),
+                   (b'x-query-time', f'{self.total * 1000:.1f}'.encode())]
+        if self.slowest is not None:
+            slowest = ' '.join(self.slowest.split())[:STATEMENT_LENGTH]
+            headers.append((b'x-query-slowest', f'{self.slowest_time * 1000:.1f}ms {slowest}'.encode('latin-1',
+                                                                                                         'replace')))
+        return headers
+
+
+# Métricas de la solicitud en curso
+current_stats = ContextVar('query_stats', default=None)
+
+# Presupuestos activos de query_budget, se cuentan todas las consultas del proceso
+active_budgets = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_query(connection, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - connection.info['query_start'].pop()
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for budget in active_budgets:
+        budget.record(statement, elapsed)
+
+
+class QueryCounterMiddleware:
+    """
+    Middleware de ASGI que cuenta las consultas de cada solicitud, las agrega como encabezados en modo
+    de depuración y registra las solicitudes que superan los límites.
+    """
+
+    def __init__(self, app, debug=QUERY_DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if self.debug and message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + stats.headers()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_stats.reset(token)
+            self.report(scope, stats)
+
+    @staticmethod
+    def report(scope, stats):
+        """
+        Función para registrar las solicitudes que superan los límites de consultas.
+        :param scope: datos de la solicitud.
+        :param stats: métricas de las consultas de la solicitud.
+        """
+        path = f"{scope['method']} {scope['path']}"
+        if stats.count > QUERY_COUNT_THRESHOLD or stats.total * 1000 > QUERY_TIME_THRESHOLD:
+            logger.warning("%s issued %s queries in %.1f ms, slowest %.1f ms: %s", path, stats.count,
+                           stats.total * 1000, stats.slowest_time * 1000,
+                           ' '.join((stats.slowest or '').split())[:STATEMENT_LENGTH])
+        for statement, count in stats.repeated():
+            logger.warning("%s repeated a query %s times (possible N+1): %s", path, count,
+                           ' '.join(statement.split())[:STATEMENT_LENGTH])
+
+
+@contextmanager
+def query_budget(max_queries):
+    """
+    Función para verificar que un bloque de código no supere una cantidad de consultas, se utiliza
+    en los scripts de pruebas, por ejemplo:
+        with query_budget(3):
+            client.get('/profile/recommendation/', headers=headers)
+    :param max_queries: cantidad máxima de consultas permitidas.
+    :return: métricas de las consultas del bloque.
+    :raise AssertionError: si se supera la cantidad de consultas.
+    """
+    stats = QueryStats()
+    active_budgets.append(stats)
+    try:
+        yield stats
+    finally:
+        active_budgets.remove(stats)
+    if stats.count > max_queries:
+        statements = '\n'.join(f'{count}x {statement}' for statement, count in stats.statements.most_common())
+        raise AssertionError(f'{stats.count} queries issued, budget is {max_queries}:\n{statements}')
@@ -1,9 +1,10 @@
 import os
 import secrets
 
-from PIL import Image
 from fastapi import HTTPException
 
+from src.metrics import IMAGE_SECONDS
+
 # Extenciones validas para las imagenes disponibles a cargar
 EXTENSIONS = ["png", "jpg", "jpeg"]
 
@@ -13,9 +14,13 @@ async def reduce_image_size(image_path):
     Función utilizada para reducir la resolución de las imagenes registradas.
         :param image_path -> Ruta de la imagen.
     """
+    # Pillow se importa en el primer uso para no retrasar el inicio de la aplicación
+    from PIL import Image
+
     image_path = os.getcwd() + image_path
-    image = Image.open(image_path)
-    image.save(image_path, optimize=True, quality=70)
+    with IMAGE_SECONDS.time('reduce_image_size'):
+        image = Image.open(image_path)
+        image.save(image_path, optimize=True, quality=70)
 
 
 async def remove_image(path):
@@ -1,7 +1,8 @@
 import random
-import os
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from dotenv import load_dotenv
+
+from src.metrics import register_collector
+from src.outbox import EmailOutbox
+from src.settings import settings
 
 """
 Largo de las contraseñas que se generan
@@ -48,44 +49,68 @@ def new_password_generator():
 """
 Variables de entorno para el envío de correo electronico
 """
-load_dotenv('.env')
 
 
 class Envs:
-    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
-    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
-    MAIL_FROM = os.getenv('MAIL_FROM')
-    MAIL_PORT = int(os.getenv('MAIL_PORT'))
-    MAIL_SERVER = os.getenv('MAIL_SERVER')
-    MAIL_FROM_NAME = os.getenv('MAIN_FROM_NAME')
+    MAIL_USERNAME = settings.mail_username
+    MAIL_PASSWORD = settings.mail_password
+    MAIL_FROM = settings.mail_from
+    MAIL_PORT = settings.mail_port
+    MAIL_SERVER = settings.mail_server
+    MAIL_FROM_NAME = settings.mail_from_name
+    MAIL_TLS = settings.mail_tls
+    MAIL_SSL = settings.mail_ssl
+    USE_CREDENTIALS = settings.mail_use_credentials
+    MAIL_BATCH_SIZE = settings.mail_batch_size
+    MAIL_MAX_RETRIES = settings.mail_max_retries
+
+
+# bandeja de salida con la conexión SMTP compartida por todos los envíos
+outbox = EmailOutbox(
+    hostname=Envs.MAIL_SERVER,
+    port=Envs.MAIL_PORT,
+    username=Envs.MAIL_USERNAME,
+    password=Envs.MAIL_PASSWORD,
+    sender=Envs.MAIL_FROM,
+    sender_name=Envs.MAIL_FROM_NAME,
+    start_tls=Envs.MAIL_TLS,
+    use_tls=Envs.MAIL_SSL,
+    use_credentials=Envs.USE_CREDENTIALS,
+    template_folder='./assets/email',
+    batch_size=Envs.MAIL_BATCH_SIZE,
+    max_retries=Envs.MAIL_MAX_RETRIES
+)
+
+
+@register_collector
+def outbox_metrics():
+    return [
+        ('sinac_email_queued', 'gauge', 'Correos en la bandeja de salida.',
+         [({}, outbox.pending())]),
+        ('sinac_email_sent_total', 'counter', 'Correos enviados.', [({}, outbox.sent)]),
+        ('sinac_email_failed_total', 'counter', 'Correos descartados después de los reintentos.',
+         [({}, outbox.failed)]),
+        ('sinac_email_retried_total', 'counter', 'Reintentos de envío de correos.', [({}, outbox.retried)]),
+    ]
+
+
+# Asunto del correo con la nueva contraseña
+RESET_PASSWORD_SUBJECT = "Nueva contraseña - SINAC turismo"
 
 
 async def send_email(recipient: str, body: dict):
     """
-    Método utilizado para envíar un correo electronico a una o varias direcciones de correo electronico.
+    Método utilizado para envíar un correo electronico, el correo se agrega a la bandeja de salida
+    y se envía en segundo plano, por lo que no se espera la respuesta del servidor de correo.
+    """
+    await outbox.enqueue(recipient, RESET_PASSWORD_SUBJECT, 'reset_password.html', body)
+    return {"status_code": "200", "message": "Email has been queued"}
+
+
+async def hold_email(recipient: str, body: dict):
+    """
+    Método utilizado para reservar el correo con la nueva contraseña antes de guardarla, el correo
+    se envía con outbox.release después de confirmar la transacción o se descarta con outbox.discard.
+    :raise Error 503: la bandeja de salida se encuentra llena.
     """
-    # configuración de los datos del correo
-    conf = ConnectionConfig(
-        MAIL_USERNAME=Envs.MAIL_USERNAME,
-        MAIL_PASSWORD=Envs.MAIL_PASSWORD,
-        MAIL_FROM=Envs.MAIL_FROM,
-        MAIL_PORT=Envs.MAIL_PORT,
-        MAIL_SERVER=Envs.MAIL_SERVER,
-        MAIL_FROM_NAME=Envs.MAIL_FROM_NAME,
-        MAIL_TLS=True,
-        MAIL_SSL=False,
-        USE_CREDENTIALS=True,
-        TEMPLATE_FOLDER='./assets/email'
-    )
-    # mensaje del correo
-    message = MessageSchema(
-        subject="Nueva contraseña - SINAC turismo",
-        recipients=[recipient],
-        template_body=body,
-        subtype="html"
-    )
-
-    # proceso de envio del correo electrónico
-    fast_mail = FastMail(conf)
-    await fast_mail.send_message(message, template_name='reset_password.html')
-    return {"status_code": "200", "message": "Email has been sent"}
+    return await outbox.enqueue(recipient, RESET_PASSWORD_SUBJECT, 'reset_password.html', body, hold=True)
@@ -0,0 +1,312 @@
+import json
+import logging
+import time
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from src.cache import MISSING, TTLCache
+from src.database import DATABASE_REPLICA_URLS
+from src.fast_json import ColumnRows
+from src.metrics import register_collector
+from src.settings import settings
+
+"""
+Se establece la caché de respuestas del catálogo. Las respuestas se almacenan ya codificadas en JSON,
+en Redis para compartirlas entre procesos o en memoria si Redis no está disponible, y se etiquetan
+con las entidades que contienen (por ejemplo destination:42 o area:3) para invalidar únicamente las
+respuestas afectadas por una escritura. Cada invalidación incrementa un número de generación y lo
+registra en sus etiquetas; una respuesta solo se almacena si ninguna de sus etiquetas se invalidó
+después de comenzar a obtener los datos, de forma que no se guarden datos leídos antes de la escritura.
+La caché en memoria solo se invalida en el proceso que realiza la escritura, por lo que con varios
+procesos (WEB_CONCURRENCY mayor a uno) no se utiliza como respaldo de Redis, salvo que se indique con
+RESPONSE_CACHE_LOCAL.
+"""
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = settings.redis_url
+
+# Segundos de vida de una respuesta y número máximo de respuestas en memoria
+RESPONSE_CACHE_TTL = settings.response_cache_ttl
+RESPONSE_CACHE_SIZE = settings.response_cache_size
+
+# Segundos después de una invalidación en los que no se almacenan respuestas con esa etiqueta, evita
+# guardar datos leídos de una réplica que aún no recibe la escritura
+RESPONSE_CACHE_FENCE = settings.response_cache_fence
+if RESPONSE_CACHE_FENCE is None:
+    RESPONSE_CACHE_FENCE = 10 if DATABASE_REPLICA_URLS else 0
+
+# Respaldo en memoria cuando Redis no está disponible, por defecto solo con un proceso de la aplicación
+RESPONSE_CACHE_LOCAL = settings.response_cache_local
+if RESPONSE_CACHE_LOCAL is None:
+    RESPONSE_CACHE_LOCAL = settings.web_concurrency <= 1
+
+# Segundos de espera antes de volver a intentar conectarse a Redis después de una falla
+REDIS_RETRY_SECONDS = 5
+
+# Prefijos de las llaves utilizadas en Redis
+RESPONSE_PREFIX = "response:"
+TAG_PREFIX = "response-tag:"
+FENCE_PREFIX = "response-fence:"
+TAG_GENERATION_PREFIX = "response-tag-generation:"
+GENERATION_KEY = "response-generation"
+
+
+def encode_response(data, model=None):
+    """
+    Función para codificar una respuesta en JSON de la misma forma que FastAPI.
+    :param data: DAO, lista de DAO, filas de columnas o diccionario a codificar.
+    :param model: esquema de pydantic utilizado como response_model de la ruta.
+    :return: bytes con el contenido JSON.
+    """
+    if isinstance(data, ColumnRows):
+        return data.encode()
+    if model is not None:
+        data = [model.from_orm(item) for item in data] if isinstance(data, list) else model.from_orm(data)
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def entity_tags(prefix, items):
+    """
+    Función para obtener las etiquetas de las entidades contenidas en una respuesta.
+    :param prefix: tipo de entidad, por ejemplo destination o area.
+    :param items: lista de DAO.
+    :return: lista de etiquetas.
+    """
+    return [f'{prefix}:{item.id}' for item in items]
+
+
+class ResponseCache:
+    """
+    Clase que almacena respuestas codificadas con sus etiquetas, en Redis o en memoria.
+    """
+
+    def __init__(self, client=None, ttl=RESPONSE_CACHE_TTL, fence=RESPONSE_CACHE_FENCE, local=RESPONSE_CACHE_LOCAL):
+        self._client = client
+        self.ttl = ttl
+        self.fence = fence
+        self.local_fallback = local
+        self.local = TTLCache("response", RESPONSE_CACHE_SIZE, ttl)
+        self.fences = TTLCache("response_fence", RESPONSE_CACHE_SIZE, max(fence, 1))
+        self.generation = 0
+        self.tag_generations = TTLCache("response_generation", RESPONSE_CACHE_SIZE * 10, ttl)
+        self.unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def client(self):
+        """
+        Cliente asíncrono de Redis, se crea únicamente cuando se utiliza por primera vez.
+        """
+        if self._client is None:
+            import aioredis
+            self._client = aioredis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+        self.unavailable_until = 0.0
+        self.local.clear()
+
+    def _redis_available(self):
+        return time.monotonic() >= self.unavailable_until
+
+    def _redis_failed(self, error):
+        # se utiliza la caché en memoria, si está habilitada, hasta el siguiente intento
+        logger.warning("Response cache is using the in-process fallback: %s", error)
+        self.unavailable_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    async def current_generation(self):
+        """
+        Función para obtener la generación de las invalidaciones, se lee antes de obtener los datos de
+        una respuesta para descartarla si alguna de sus etiquetas se invalida mientras tanto.
+        :return: tupla con la generación en Redis (None si no está disponible) y la del proceso.
+        """
+        redis_generation = None
+        if self._redis_available():
+            try:
+                redis_generation = int(await self.client.get(GENERATION_KEY) or 0)
+            except Exception as error:
+                self._redis_failed(error)
+        return redis_generation, self.generation
+
+    async def get(self, key):
+        """
+        Función para obtener una respuesta codificada.
+        :param key: llave de la respuesta.
+        :return: bytes de la respuesta o None si no se encuentra.
+        """
+        if self._redis_available():
+            try:
+                return await self.client.get(RESPONSE_PREFIX + key)
+            except Exception as error:
+                self._redis_failed(error)
+        if not self.local_fallback:
+            return None
+        item = self.local.get(key)
+        return None if item is MISSING else item[0]
+
+    async def _fenced(self, tags):
+        """
+        Función para verificar si alguna de las etiquetas fue invalidada recientemente.
+        :param tags: etiquetas de la respuesta.
+        :return: verdadero si la respuesta no se debe almacenar.
+        """
+        if not self.fence:
+            return False
+        if any(self.fences.get(tag, None) for tag in tags):
+            return True
+        if self._redis_available():
+            try:
+                return any(await self.client.mget([FENCE_PREFIX + tag for tag in tags]))
+            except Exception as error:
+                self._redis_failed(error)
+        return False
+
+    async def _redis_set(self, key, content, tags, generation):
+        """
+        Función para almacenar una respuesta en Redis en una transacción que se cancela si alguna de
+        sus etiquetas se invalida entre la verificación de la generación y la escritura.
+        :param key: llave de la respuesta.
+        :param content: bytes de la respuesta.
+        :param tags: etiquetas de las entidades incluidas en la respuesta.
+        :param generation: generación en Redis leída antes de obtener los datos.
+        """
+        from aioredis.exceptions import WatchError
+
+        generation_keys = [TAG_GENERATION_PREFIX + tag for tag in tags]
+        async with self.client.pipeline(transaction=True) as pipeline:
+            if generation_keys:
+                await pipeline.watch(*generation_keys)
+                if any(int(value) > generation for value in await pipeline.mget(generation_keys) if value):
+                    return
+            pipeline.multi()
+            pipeline.set(RESPONSE_PREFIX + key, content, ex=self.ttl)
+            for tag in tags:
+                pipeline.sadd(TAG_PREFIX + tag, key)
+                pipeline.expire(TAG_PREFIX + tag, self.ttl)
+            try:
+                await pipeline.execute()
+            except WatchError:
+                # una invalidación modificó las etiquetas durante la transacción
+                pass
+
+    async def set(self, key, content, tags, generation=(None, None)):
+        """
+        Función para almacenar una respuesta codificada con sus etiquetas.
+        :param key: llave de la respuesta.
+        :param content: bytes de la respuesta.
+        :param tags: etiquetas de las entidades incluidas en la respuesta.
+        :param generation: generación obtenida con current_generation antes de obtener los datos,
+        la respuesta no se almacena si alguna de sus etiquetas se invalidó después.
+        """
+        if await self._fenced(tags):
+            return
+        redis_generation, local_generation = generation
+        if self._redis_available():
+            if redis_generation is None:
+                return
+            try:
+                await self._redis_set(key, content, tags, redis_generation)
+                return
+            except Exception as error:
+                self._redis_failed(error)
+        if not self.local_fallback or local_generation is None:
+            return
+        if any(self.tag_generations.get(tag, 0) > local_generation for tag in tags):
+            return
+        self.local.set(key, (content, frozenset(tags)))
+
+    async def invalidate(self, *tags):
+        """
+        Función para eliminar las respuestas que contienen alguna de las etiquetas.
+        :param tags: etiquetas de las entidades modificadas.
+        """
+        self.invalidations += 1
+        tags = set(tags)
+        self.generation += 1
+        for tag in tags:
+            self.tag_generations.set(tag, self.generation)
+        self.local.invalidate_where(lambda key, value: not tags.isdisjoint(value[1]))
+        for tag in tags:
+            self.fences.set(tag, True, self.fence)
+        if self._redis_available():
+            try:
+                generation = await self.client.incr(GENERATION_KEY)
+                tag_keys = [TAG_PREFIX + tag for tag in tags]
+                # la generación de las etiquetas se registra antes de leer las respuestas a eliminar, una
+                # respuesta almacenada después de esta lectura se descarta al verificar su generación
+                pipeline = self.client.pipeline(transaction=False)
+                for tag in tags:
+                    pipeline.set(TAG_GENERATION_PREFIX + tag, generation, ex=self.ttl)
+                for tag_key in tag_keys:
+                    pipeline.smembers(tag_key)
+                members = (await pipeline.execute())[len(tags):]
+                keys = {RESPONSE_PREFIX + (key.decode() if isinstance(key, bytes) else key)
+                        for tag_members in members for key in tag_members}
+                pipeline = self.client.pipeline(transaction=False)
+                pipeline.delete(*keys, *tag_keys)
+                if self.fence:
+                    for tag in tags:
+                        pipeline.set(FENCE_PREFIX + tag, 1, ex=self.fence)
+                await pipeline.execute()
+            except Exception as error:
+                self._redis_failed(error)
+
+    async def respond(self, key, loader, model=None):
+        """
+        Función para responder una solicitud desde la caché, si la respuesta no se encuentra se
+        obtiene con la función indicada, se codifica y se almacena.
+        :param key: llave de la respuesta, formada por la ruta y los parámetros.
+        :param loader: corrutina que retorna una tupla con los datos y sus etiquetas.
+        :param model: esquema de pydantic utilizado para codificar los datos.
+        :return: respuesta con el contenido JSON.
+        """
+        content = await self.get(key)
+        if content is not None:
+            self.hits += 1
+            return Response(content=content, media_type="application/json", headers={"X-Cache": "HIT"})
+        self.misses += 1
+        generation = await self.current_generation()
+        data, tags = await loader()
+        content = encode_response(data, model)
+        await self.set(key, content, tags, generation)
+        return Response(content=content, media_type="application/json", headers={"X-Cache": "MISS"})
+
+    def stats(self):
+        """
+        Función para obtener las métricas de la caché de respuestas.
+        :return: diccionario con los aciertos, fallos e invalidaciones.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'invalidations': self.invalidations,
+            'redis_available': self._redis_available(),
+            'local_fallback': self.local_fallback,
+            'local': self.local.stats(),
+        }
+
+
+response_cache = ResponseCache()
+
+
+@register_collector
+def response_cache_metrics():
+    stats = response_cache.stats()
+    return [
+        ('sinac_response_cache_hits_total', 'counter', 'Respuestas obtenidas de la caché.', [({}, stats['hits'])]),
+        ('sinac_response_cache_misses_total', 'counter', 'Respuestas que no se encontraban en la caché.',
+         [({}, stats['misses'])]),
+        ('sinac_response_cache_hit_ratio', 'gauge', 'Proporción de aciertos de la caché de respuestas.',
+         [({}, stats['hit_ratio'])]),
+        ('sinac_response_cache_redis_available', 'gauge', 'Indica si la caché de respuestas utiliza Redis.',
+         [({}, int(stats['redis_available']))]),
+    ]
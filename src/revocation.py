@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from src.settings import settings
+
+"""
+Se establece la lista de revocación de tokens. Los tokens revocados se almacenan en Redis por su
+identificador (jti) con un tiempo de vida igual al tiempo restante del token, y cada proceso mantiene
+un filtro de Bloom en memoria que evita consultar Redis para los tokens que no han sido revocados.
+La revocación de todas las sesiones de un usuario se compara en milisegundos con la fecha de emisión
+del token (iat_ms), de forma que un token emitido en el mismo segundo pero después de la revocación,
+por ejemplo al iniciar sesión de nuevo, sea válido.
+"""
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = settings.redis_url
+
+# Segundos entre cada verificación de nuevas revocaciones realizadas por otros procesos
+REVOCATION_SYNC_SECONDS = settings.revocation_sync_seconds
+
+# Tamaño en bits y número de funciones hash del filtro de Bloom
+BLOOM_SIZE = settings.revocation_bloom_size
+BLOOM_HASHES = 7
+
+# Prefijos de las llaves utilizadas en Redis
+PREFIX = "revoked:"
+JTI_PREFIX = PREFIX + "jti:"
+USER_PREFIX = PREFIX + "user:"
+VERSION_KEY = "revocation:version"
+
+
+class BloomFilter:
+    """
+    Clase que representa un filtro de Bloom, una estructura probabilística que indica si un elemento
+    definitivamente no pertenece al conjunto o si posiblemente pertenece.
+    """
+
+    def __init__(self, size, hashes):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    def _positions(self, key):
+        """
+        Función para obtener las posiciones de un elemento, se utiliza doble hashing a partir de un solo digest.
+        :param key: elemento.
+        :return: generador con las posiciones de los bits.
+        """
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        """
+        Función para agregar un elemento al filtro.
+        :param key: elemento a agregar.
+        """
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def issued_at_ms(payload):
+    """
+    Función para obtener la fecha de emisión de un token en milisegundos.
+    :param payload: contenido del token.
+    :return: milisegundos desde la época, los tokens sin iat_ms se consideran emitidos al final del segundo de iat.
+    """
+    if 'iat_ms' in payload:
+        return int(payload['iat_ms'])
+    return int(payload.get('iat', 0)) * 1000 + 999
+
+
+def revoked_at_ms(value):
+    """
+    Función para obtener la fecha de una revocación de sesiones en milisegundos.
+    :param value: valor almacenado en Redis.
+    :return: milisegundos desde la época, las revocaciones anteriores se almacenaban en segundos.
+    """
+    revoked_at = float(value)
+    return int(revoked_at * 1000) if revoked_at < 10 ** 11 else int(revoked_at)
+
+
+class RevocationList:
+    """
+    Clase que administra la revocación de tokens individuales y de todas las sesiones de un usuario.
+    """
+
+    def __init__(self, client=None, sync_seconds=REVOCATION_SYNC_SECONDS):
+        self._client = client
+        self.sync_seconds = sync_seconds
+        self.lock = threading.Lock()
+        self.bloom = BloomFilter(BLOOM_SIZE, BLOOM_HASHES)
+        self.version = None
+        self.last_sync = 0.0
+        self.checks = 0
+        self.redis_checks = 0
+
+    @property
+    def client(self):
+        """
+        Cliente de Redis, se crea únicamente cuando se utiliza por primera vez.
+        """
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        with self.lock:
+            self._client = client
+            self.bloom = BloomFilter(BLOOM_SIZE, BLOOM_HASHES)
+            self.version = None
+            self.last_sync = 0.0
+
+    def _rebuild(self):
+        """
+        Función para reconstruir el filtro de Bloom con todas las revocaciones vigentes en Redis.
+        """
+        bloom = BloomFilter(BLOOM_SIZE, BLOOM_HASHES)
+        for key in self.client.scan_iter(match=PREFIX + '*', count=1000):
+            bloom.add(key.decode()[len(PREFIX):])
+        self.bloom = bloom
+
+    def _sync(self):
+        """
+        Función para incorporar las revocaciones realizadas por otros procesos, consulta Redis como
+        máximo una vez cada REVOCATION_SYNC_SECONDS y reconstruye el filtro solo si hubo cambios.
+        """
+        now = time.monotonic()
+        if now - self.last_sync < self.sync_seconds:
+            return
+        with self.lock:
+            if now - self.last_sync < self.sync_seconds:
+                return
+            self.last_sync = now
+            try:
+                version = self.client.get(VERSION_KEY)
+                if version != self.version:
+                    self._rebuild()
+                    self.version = version
+            except Exception as error:
+                logger.warning("Revocation list sync failed: %s", error)
+
+    def revoke_token(self, payload):
+        """
+        Función para revocar un token, se almacena hasta la fecha de expiración del token.
+        :param payload: contenido del token.
+        """
+        jti = payload.get('jti')
+        ttl = int(payload['exp'] - time.time()) + 1
+        if not jti or ttl <= 0:
+            return
+        pipeline = self.client.pipeline()
+        pipeline.setex(JTI_PREFIX + jti, ttl, 1)
+        pipeline.incr(VERSION_KEY)
+        pipeline.execute()
+        self.bloom.add('jti:' + jti)
+
+    def revoke_user(self, user_id, ttl):
+        """
+        Función para revocar todas las sesiones de un usuario, los tokens emitidos antes de este
+        momento dejan de ser válidos.
+        :param user_id: identificador del usuario.
+        :param ttl: segundos durante los que se mantiene la revocación, la duración del token más largo.
+        """
+        pipeline = self.client.pipeline()
+        pipeline.setex(USER_PREFIX + str(user_id), ttl, int(time.time() * 1000))
+        pipeline.incr(VERSION_KEY)
+        pipeline.execute()
+        self.bloom.add('user:' + str(user_id))
+
+    def is_revoked(self, payload):
+        """
+        Función para verificar si un token fue revocado, solo se consulta Redis si el filtro de
+        Bloom indica que el token o el usuario posiblemente fueron revocados.
+        :param payload: contenido del token.
+        :return: verdadero si el token fue revocado.
+        """
+        self._sync()
+        self.checks += 1
+        jti = payload.get('jti')
+        user_key = 'user:' + str(payload['sub'])
+        maybe_jti = bool(jti) and ('jti:' + jti) in self.bloom
+        maybe_user = user_key in self.bloom
+        if not (maybe_jti or maybe_user):
+            return False
+        self.redis_checks += 1
+        try:
+            revoked_jti, revoked_at = self.client.mget(JTI_PREFIX + (jti or ''), PREFIX + user_key)
+        except Exception as error:
+            # ante una falla de Redis se rechazan los tokens que el filtro marca como posiblemente revocados
+            logger.warning("Revocation list check failed: %s", error)
+            return True
+        if maybe_jti and revoked_jti is not None:
+            return True
+        return maybe_user and revoked_at is not None and issued_at_ms(payload) <= revoked_at_ms(revoked_at)
+
+    def needs_redis(self, payload):
+        """
+        Función para saber si la verificación de un token consultará Redis, ya sea para sincronizar
+        el filtro de Bloom o porque el filtro indica que el token posiblemente fue revocado.
+        :param payload: contenido del token.
+        :return: verdadero si la verificación realiza operaciones de red.
+        """
+        if time.monotonic() - self.last_sync >= self.sync_seconds:
+            return True
+        jti = payload.get('jti')
+        return (bool(jti) and ('jti:' + jti) in self.bloom) or ('user:' + str(payload['sub'])) in self.bloom
+
+    async def is_revoked_async(self, payload):
+        """
+        Función para verificar si un token fue revocado desde una corrutina, las consultas a Redis se
+        realizan en el conjunto de hilos para no bloquear el ciclo de eventos.
+        :param payload: contenido del token.
+        :return: verdadero si el token fue revocado.
+        """
+        if self.needs_redis(payload):
+            return await run_in_threadpool(self.is_revoked, payload)
+        return self.is_revoked(payload)
+
+    def stats(self):
+        """
+        Función para obtener las métricas de la lista de revocación.
+        :return: diccionario con las verificaciones realizadas y las que consultaron Redis.
+        """
+        return {
+            'checks': self.checks,
+            'redis_checks': self.redis_checks,
+            'version': self.version.decode() if isinstance(self.version, bytes) else self.version,
+        }
+
+
+revocation_list = RevocationList()
@@ -0,0 +1,41 @@
+import io
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+
+from src.authentication import admin_wrapper
+from src.bulk_import import IMPORT_COLLECTIONS, IMPORT_FORMATS, import_rows
+from src.database import get_session
+
+"""
+Se establece la importación masiva del catálogo, el archivo se recibe como formulario y se importa
+por lotes con src.bulk_import, la misma función que utiliza la línea de comandos.
+"""
+
+import_router = APIRouter()
+
+
+@import_router.post("/import/{collection}.{import_format}", status_code=status.HTTP_200_OK)
+async def import_collection(collection: str, import_format: str, file: UploadFile = File(...),
+                            admin_id=Depends(admin_wrapper), session=Depends(get_session)):
+    """
+    Ruta para importar un archivo NDJSON o CSV a una colección, por ejemplo /import/tourist-destination.csv.
+    Las filas con un identificador mayor a cero se insertan o actualizan, las demás se insertan como nuevas.
+    :param collection: colección a importar: tourist-destination o conservation-area.
+    :param import_format: formato del archivo, ndjson o csv.
+    :param file: archivo con una fila por línea, los archivos CSV incluyen los nombres de las columnas.
+    :param admin_id: identificador del usuario administrador.
+    :return: reporte con las filas insertadas, actualizadas y con errores, y los errores de cada fila.
+    :raise Error 400: el archivo no está codificado en UTF-8.
+    :raise Error 401: No tiene permisos.
+    :raise Error 404: la colección o el formato no existen.
+    """
+    if collection not in IMPORT_COLLECTIONS or import_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Import not found")
+    lines = io.TextIOWrapper(file.file, encoding='utf-8-sig', newline='')
+    try:
+        return await import_rows(session, collection, lines, import_format)
+    except UnicodeDecodeError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    finally:
+        lines.detach()
@@ -0,0 +1,47 @@
+import gzip
+
+from fastapi import APIRouter, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+
+from src.catalog_bundle import catalog_bundle
+from src.conditional import add_validators, is_not_modified
+
+"""
+Se establece la descarga del paquete del catálogo, un solo archivo que reemplaza las consultas de áreas
+y destinos en el primer inicio de la aplicación móvil.
+"""
+
+catalog_router = APIRouter()
+
+# Bytes de cada bloque al descomprimir el paquete para clientes sin gzip
+CHUNK_SIZE = 64 * 1024
+
+
+def decompress(path):
+    # generador que descomprime el paquete por bloques, se ejecuta en el conjunto de hilos
+    with gzip.open(path, 'rb') as bundle:
+        while True:
+            chunk = bundle.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+@catalog_router.get("/catalog/bundle", status_code=status.HTTP_200_OK)
+async def get_catalog_bundle(request: Request):
+    """
+    Ruta para descargar el paquete del catálogo: áreas de conservación, destinos turísticos con su imagen
+    principal, resumen de calificaciones y el cursor para continuar con /sync/changes. Se envía comprimido
+    con gzip si el cliente lo acepta y se responde 304 si la copia del cliente sigue vigente.
+    :param request: solicitud HTTP, contiene los encabezados condicionales y Accept-Encoding.
+    :return: paquete del catálogo en JSON.
+    """
+    etag, last_modified, path = await catalog_bundle.get()
+    if is_not_modified(request, etag, last_modified):
+        return add_validators(Response(status_code=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        response = FileResponse(path, media_type="application/json", headers={'Content-Encoding': 'gzip'})
+    else:
+        response = StreamingResponse(decompress(path), media_type="application/json")
+    response.headers['Vary'] = 'Accept-Encoding'
+    return add_validators(response, etag, last_modified)
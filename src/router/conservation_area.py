@@ -1,29 +1,35 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi import File, UploadFile, status, Depends
-from fastapi_sqlalchemy import db
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
 
 from src import repository
-from src.authentication import auth_wrapper
-from src.router.user import select_user
+from src.authentication import auth_wrapper, admin_wrapper
+from src.database import get_session, get_read_session
+from src.response_cache import response_cache, entity_tags
+from src.conditional import conditional_response
 from src.models import ConservationArea as ModelConservationArea
 from src.models import FavoriteArea as ModelFavoriteArea
+from src.models import Review as ModelReview
+from src.models import TouristDestination as ModelTouristDestination
 from src.schema import ConservationArea as SchemaConservationArea
+from src.schema import ConservationAreaDetail as SchemaConservationAreaDetail
 from src.schema import FavoriteArea as SchemaFavoriteArea
 
 conservation_area_router = APIRouter()
 
 
-def select_conservation_area(conservation_area_id: int):
+async def select_conservation_area(session, conservation_area_id: int):
     """
     Función para buscar un área de conservación en la base de datos mediante un identificador.
+    :param session: sesión de la base de datos.
     :param conservation_area_id: identificador de un área de conservación.
     :return: db_conservation_area DAO de un área de conservación.
     :raise HTTPException: no se encontro el identificador.
     """
-    db_conservation_area = db.session.query(
-        ModelConservationArea).get(conservation_area_id)
+    db_conservation_area = await session.get(ModelConservationArea, conservation_area_id)
     if db_conservation_area is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_conservation_area
@@ -31,31 +37,30 @@ def select_conservation_area(conservation_area_id: int):
 
 @conservation_area_router.post("/conservation-area", response_model=SchemaConservationArea,
                                status_code=status.HTTP_201_CREATED)
-def add_conservation_area(conservation_area: SchemaConservationArea, user_id=Depends(auth_wrapper)):
+async def add_conservation_area(conservation_area: SchemaConservationArea, user_id=Depends(admin_wrapper),
+                                session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de una nueva área de conservación.
     :param conservation_area: DTO de un área de conservación con los datos que se van a registrar.
     :param user_id: identificador de un usuario administrador encargado de registrar un área.
     :return: DAO de un área de conservación con los datos actualizados.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
     db_conservation_area = ModelConservationArea(name=conservation_area.name,
                                                  description=conservation_area.description,
                                                  photos_path=conservation_area.photos_path,
                                                  region_path=conservation_area.region_path)
 
-    db.session.add(db_conservation_area)
-    db.session.commit()
+    session.add(db_conservation_area)
+    await session.commit()
+    await response_cache.invalidate('areas')
     return db_conservation_area
 
 
 @conservation_area_router.post('/conservation-area/{conservation_area_id}/photos',
                                status_code=status.HTTP_201_CREATED)
 async def add_conservation_area_photos(conservation_area_id: int, photos: List[UploadFile] = File(...),
-                                       region_photo: UploadFile = File(...), user_id=Depends(auth_wrapper)):
+                                       region_photo: UploadFile = File(...), user_id=Depends(admin_wrapper),
+                                       session=Depends(get_session)):
     """
     Ruta para agregar fotografías de un área de conservación.
     :param conservation_area_id: identificador de un área de conservación.
@@ -64,51 +69,120 @@ async def add_conservation_area_photos(conservation_area_id: int, photos: List[U
     :param user_id: identificador de un usuario administrador encargado de registrar un área.
     :return: db_conservation_area DAO de un área de conservación con los datos actualizados.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_conservation_area = select_conservation_area(conservation_area_id)
+    db_conservation_area = await select_conservation_area(session, conservation_area_id)
 
     new_directory_name = f'{db_conservation_area.id}_dir'
     photos_path, region_path = await repository.add_conservation_area_photo(new_directory_name, photos, region_photo)
     db_conservation_area.photos_path = photos_path
     db_conservation_area.region_path = region_path
 
-    db.session.commit()
-    db.session.refresh(db_conservation_area)
+    await session.commit()
+    await session.refresh(db_conservation_area)
+    await response_cache.invalidate(f'area:{conservation_area_id}')
     return db_conservation_area
 
 
 @conservation_area_router.get("/conservation-area", status_code=status.HTTP_200_OK)
-def get_conservation_area():
+async def get_conservation_area(request: Request, session=Depends(get_read_session)):
     """
     Ruta para obtener todas las áreas de conservación registradas.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :return: conservation_areas Lista de DAO de áreas de conservación.
     """
-    conservation_areas = db.session.query(ModelConservationArea).all()
-    return conservation_areas
+    async def load():
+        result = await session.execute(select(ModelConservationArea))
+        conservation_areas = result.scalars().all()
+        return conservation_areas, ['areas'] + entity_tags('area', conservation_areas)
+
+    return await conditional_response(request, session, ['conservation_area'], response_cache.respond,
+                                      'conservation-area', load)
 
 
 @conservation_area_router.get("/conservation-area/{conservation_area_id}", response_model=SchemaConservationArea,
                               status_code=status.HTTP_200_OK)
-def get_conservation_area(conservation_area_id: int):
+async def get_conservation_area(conservation_area_id: int, request: Request, session=Depends(get_read_session)):
     """
     Ruta para obtener un áreas de conservación en con un ID especifico.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :param conservation_area_id: identificador del áreas de conservación
     :return: DAO con la información de un área de conservación.
     """
-    conservation_area = db.session.query(
-        ModelConservationArea).get(conservation_area_id)
-    if conservation_area is None:
-        raise HTTPException(status_code=404, detail="Item not found")
-    return conservation_area
+    async def load():
+        conservation_area = await session.get(ModelConservationArea, conservation_area_id)
+        if conservation_area is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return conservation_area, [f'area:{conservation_area_id}']
+
+    return await conditional_response(request, session, ['conservation_area'], response_cache.respond,
+                                      f'conservation-area:{conservation_area_id}', load, SchemaConservationArea)
+
+
+# Tipos de destinos turísticos contados en el detalle de un área
+DESTINATION_TYPES = {
+    'beach': 'is_beach',
+    'forest': 'is_forest',
+    'volcano': 'is_volcano',
+    'mountain': 'is_mountain',
+}
+
+
+def rating_summary(count, total):
+    """
+    Función para obtener el resumen de calificaciones a partir de la cantidad y la suma.
+    :param count: cantidad de opiniones.
+    :param total: suma de las calificaciones.
+    :return: diccionario con la cantidad y el promedio, nulo si no hay opiniones.
+    """
+    return {'count': count, 'average': round(total / count, 2) if count else None}
+
+
+@conservation_area_router.get("/conservation-area/{conservation_area_id}/detail",
+                              response_model=SchemaConservationAreaDetail, status_code=status.HTTP_200_OK)
+async def get_conservation_area_detail(conservation_area_id: int, request: Request,
+                                       session=Depends(get_read_session)):
+    """
+    Ruta para obtener un área de conservación con sus destinos turísticos, la cantidad de destinos por
+    tipo y el resumen de calificaciones del área y de cada destino. Los destinos se cargan con
+    selectinload y las calificaciones con una sola consulta agrupada, por lo que la cantidad de
+    consultas no depende de la cantidad de destinos.
+    :param conservation_area_id: identificador del área de conservación.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
+    :return: DAO del área de conservación con sus destinos.
+    :raise Error 404: el área de conservación no existe.
+    """
+    async def load():
+        result = await session.execute(select(ModelConservationArea).
+                                       options(selectinload(ModelConservationArea.tourist_destinations)).
+                                       where(ModelConservationArea.id == conservation_area_id))
+        conservation_area = result.scalars().first()
+        if conservation_area is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        result = await session.execute(select(ModelReview.tourist_destination_id, func.count(ModelReview.id),
+                                              func.sum(ModelReview.calification)).
+                                       join(ModelTouristDestination,
+                                            ModelTouristDestination.id == ModelReview.tourist_destination_id).
+                                       where(ModelTouristDestination.conservation_area_id == conservation_area_id).
+                                       group_by(ModelReview.tourist_destination_id))
+        ratings = {tourist_destination_id: (count, total or 0) for tourist_destination_id, count, total in result}
+
+        tourist_destinations = conservation_area.tourist_destinations
+        for tourist_destination in tourist_destinations:
+            tourist_destination.rating = rating_summary(*ratings.get(tourist_destination.id, (0, 0)))
+        conservation_area.destination_count = len(tourist_destinations)
+        conservation_area.destination_types = {name: sum(1 for item in tourist_destinations if getattr(item, column))
+                                               for name, column in DESTINATION_TYPES.items()}
+        conservation_area.rating = rating_summary(sum(count for count, _ in ratings.values()),
+                                                  sum(total for _, total in ratings.values()))
+        return conservation_area
+
+    return await conditional_response(request, session, ['conservation_area', 'tourist_destination', 'review'], load,
+                                      model=SchemaConservationAreaDetail)
 
 
 @conservation_area_router.post("/conservation-area/update/{conservation_area_id}",
                                response_model=SchemaConservationArea, status_code=status.HTTP_200_OK)
-def update_conservation_area(conservation_area_id: int, conservation_area: SchemaConservationArea,
-                             user_id=Depends(auth_wrapper)):
+async def update_conservation_area(conservation_area_id: int, conservation_area: SchemaConservationArea,
+                                   user_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta para actualizar los datos asociadas a un área de conservación.
     :param conservation_area_id: identificador del área de conservación a actualizar.
@@ -116,26 +190,24 @@ def update_conservation_area(conservation_area_id: int, conservation_area: Schem
     :param user_id: identificador de un usuario administrador encargado de registrar un área.
     :return: db_conservation_area: DAO con los datos actualizados.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_conservation_area = select_conservation_area(conservation_area_id)
+    db_conservation_area = await select_conservation_area(session, conservation_area_id)
 
     db_conservation_area.name = conservation_area.name
     db_conservation_area.description = conservation_area.description
     db_conservation_area.photos_path = conservation_area.photos_path
     db_conservation_area.region_path = conservation_area.region_path
 
-    db.session.commit()
-    db.session.refresh(db_conservation_area)
+    await session.commit()
+    await session.refresh(db_conservation_area)
+    await response_cache.invalidate(f'area:{conservation_area_id}')
     return db_conservation_area
 
 
 @conservation_area_router.post("/conservation-area/update/{conservation_area_id}/photos",
                                response_model=SchemaConservationArea, status_code=status.HTTP_200_OK)
 async def update_conservation_area_photos(conservation_area_id: int, photos: List[UploadFile] = File(...),
-                                          region_photo: UploadFile = File(...), user_id=Depends(auth_wrapper)):
+                                          region_photo: UploadFile = File(...), user_id=Depends(admin_wrapper),
+                                          session=Depends(get_session)):
     """
     Ruta utilizada para actualizar las fotografías de un área de conservación.
     :param conservation_area_id: identificador del área de conservación a actualizar.
@@ -144,11 +216,7 @@ async def update_conservation_area_photos(conservation_area_id: int, photos: Lis
     :param user_id: identificador de un usuario administrador encargado de registrar un área.
     :return: db_conservation_area  DAO de un área de conservación con los datos actualizados.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_conservation_area = select_conservation_area(conservation_area_id)
+    db_conservation_area = await select_conservation_area(session, conservation_area_id)
 
     directory_name = f'{db_conservation_area.id}_dir'
     photos_path, region_path = await repository.update_conservation_area_photo(db_conservation_area,
@@ -156,80 +224,78 @@ async def update_conservation_area_photos(conservation_area_id: int, photos: Lis
     db_conservation_area.photos_path = photos_path
     db_conservation_area.region_path = region_path
 
-    db.session.commit()
-    db.session.refresh(db_conservation_area)
+    await session.commit()
+    await session.refresh(db_conservation_area)
+    await response_cache.invalidate(f'area:{conservation_area_id}')
     return db_conservation_area
 
 
 @conservation_area_router.delete("/conservation-area/{conservation_area_id}", status_code=status.HTTP_200_OK)
-async def delete_conservation_area(conservation_area_id: int, user_id=Depends(auth_wrapper)):
+async def delete_conservation_area(conservation_area_id: int, user_id=Depends(admin_wrapper),
+                                   session=Depends(get_session)):
     """
     Ruta utilizada para eliminar un área de conservacíon con los datos asociados.
     :param conservation_area_id: identificador del área de conservación.
     :param user_id: identificador de un usuario administrador encargado de registrar un área.
     :return: boolean Verdadero si fue correctamente eliminado.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_conservation_area = select_conservation_area(conservation_area_id)
+    db_conservation_area = await select_conservation_area(session, conservation_area_id)
 
     await repository.delete_conservation_area_photo(db_conservation_area.id)
 
-    db.session.delete(db_conservation_area)
-    db.session.commit()
+    await session.delete(db_conservation_area)
+    await session.commit()
+    await response_cache.invalidate(f'area:{conservation_area_id}', f'area:{conservation_area_id}:destinations')
     # db_conservation_area or HTTPException(status_code=200, detail="ok")
     return True
 
 
-def select_favorite_area(favorite_area_id: int):
+async def select_favorite_area(session, favorite_area_id: int):
     """
     Función para buscar la información de un área marcada como favorita para un usuario.
+    :param session: sesión de la base de datos.
     :param favorite_area_id: Identificador de la relación.
     :return db_favorites_area_id: Información del área marcada como favorita.
     """
-    db_favorite_area = db.session.query(
-        ModelFavoriteArea).get(favorite_area_id)
+    db_favorite_area = await session.get(ModelFavoriteArea, favorite_area_id)
     if db_favorite_area is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_favorite_area
 
 
 @conservation_area_router.get('/conservation-area/all/favorite')
-def get_favorite_areas(user_id=Depends(auth_wrapper)):
+async def get_favorite_areas(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para buscar las áreas favoritas de un usuario.
     :param user_id: Identificador del usuario.
     :return: db_favorites_area Lista de áreas.
     """
-    favorite_areas = []
-    for favorite_area in db.session.query(ModelFavoriteArea).filter(ModelFavoriteArea.user_id == user_id).all():
-        favorite_areas.append(favorite_area)
-
-    def getAreaId(item):
-        return [item.conservation_area_id, item.id]
-    favorite_areas_id = list(map(getAreaId, favorite_areas))
-
+    # se unen las áreas con las relaciones del usuario para no recorrer todas las áreas, si un área se marcó
+    # más de una vez se utiliza la primera relación
+    result = await session.execute(select(ModelConservationArea, ModelFavoriteArea.id)
+                                   .join(ModelFavoriteArea,
+                                         ModelFavoriteArea.conservation_area_id == ModelConservationArea.id)
+                                   .where(ModelFavoriteArea.user_id == user_id)
+                                   .order_by(ModelConservationArea.id, ModelFavoriteArea.id))
     conservation_areas = []
-    for conservation_area in db.session.query(ModelConservationArea).all():
-        for i in range(len(favorite_areas_id)):
-            if conservation_area.id == favorite_areas_id[i][0]:
-                conservation_area.favorite_id = favorite_areas_id[i][1]
-                conservation_areas.append(conservation_area)
-                break
+    for conservation_area, favorite_id in result:
+        if conservation_areas and conservation_areas[-1].id == conservation_area.id:
+            continue
+        conservation_area.favorite_id = favorite_id
+        conservation_areas.append(conservation_area)
     return conservation_areas
 
 
 @conservation_area_router.get('/conservation-area/{conservation_area_id}/favorite')
-def get_favorite_area_id(conservation_area_id: int, user_id=Depends(auth_wrapper)):
+async def get_favorite_area_id(conservation_area_id: int, user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para identificar si un área está marcado como favorita.
     :param conservation_area_id: Identificador del área de conservación.
     :param user_id: Identificador del usuario.
     :return: El identificador de la relación o cero.
     """
-    for favorite_area in db.session.query(ModelFavoriteArea).filter(ModelFavoriteArea.user_id == user_id).all():
+    result = await session.execute(select(ModelFavoriteArea).where(ModelFavoriteArea.user_id == user_id))
+    for favorite_area in result.scalars():
         if favorite_area.conservation_area_id == conservation_area_id:
             return favorite_area.id
 
@@ -238,7 +304,7 @@ def get_favorite_area_id(conservation_area_id: int, user_id=Depends(auth_wrapper
 
 @conservation_area_router.post('/conservation-area/{conservation_area_id}/favorite',
                                response_model=SchemaFavoriteArea, status_code=status.HTTP_201_CREATED)
-def add_favorite_area(conservation_area_id: int, user_id=Depends(auth_wrapper)):
+async def add_favorite_area(conservation_area_id: int, user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de una nueva área favorita.
     :param conservation_area_id: Identificador del área de conservación.
@@ -248,23 +314,23 @@ def add_favorite_area(conservation_area_id: int, user_id=Depends(auth_wrapper)):
     db_favorite_area = ModelFavoriteArea(user_id=user_id,
                                          conservation_area_id=conservation_area_id)
 
-    db.session.add(db_favorite_area)
-    db.session.commit()
+    session.add(db_favorite_area)
+    await session.commit()
     return db_favorite_area
 
 
 @conservation_area_router.delete('/conservation-area/all/favorite/{favorite_area_id}', status_code=status.HTTP_200_OK)
-def delete_favorite_area(favorite_area_id: int, user_id=Depends(auth_wrapper)):
+async def delete_favorite_area(favorite_area_id: int, user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Ruta utilizada para eliminar una área favorita.
     :param favorite_area_id: identificador de la área.
     :param user_id: credenciales del usuario para obtener su información
     :return: boolean Verdadero si fue correctamente eliminado.
     """
-    db_favorite_area = select_favorite_area(favorite_area_id)
+    db_favorite_area = await select_favorite_area(session, favorite_area_id)
     if db_favorite_area.user_id != user_id:
         return False
 
-    db.session.delete(db_favorite_area)
-    db.session.commit()
+    await session.delete(db_favorite_area)
+    await session.commit()
     return True
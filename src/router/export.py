@@ -0,0 +1,104 @@
+import csv
+import io
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from src.authentication import admin_wrapper
+from src.database import get_read_session
+from src.fast_json import dumps
+from src.models import ConservationArea, FavoriteArea, FavoriteDestination, Review, TouristDestination
+from src.settings import settings
+
+"""
+Se establece la exportación masiva del catálogo. Las filas se leen con un cursor del servidor en
+lotes de EXPORT_BATCH_SIZE y cada lote se envía al cliente en cuanto se codifica, por lo que la
+memoria utilizada no depende de la cantidad de registros.
+"""
+
+export_router = APIRouter()
+
+# Filas obtenidas de la base de datos en cada lote
+EXPORT_BATCH_SIZE = settings.export_batch_size
+
+# Colecciones que se pueden exportar
+EXPORT_MODELS = {
+    'tourist-destination': TouristDestination,
+    'conservation-area': ConservationArea,
+    'review': Review,
+    'favorite-destination': FavoriteDestination,
+    'favorite-area': FavoriteArea,
+}
+
+# Formatos disponibles y su tipo de contenido
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def csv_value(value):
+    # fechas en formato ISO 8601 y valores nulos como campos vacíos
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def encode_csv(rows):
+    """
+    Función para codificar un lote de filas en CSV.
+    :param rows: lista de tuplas con los valores de cada fila.
+    :return: bytes con las líneas del lote.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(keys, rows):
+    """
+    Función para codificar un lote de filas en NDJSON, un objeto JSON por línea.
+    :param keys: nombres de las columnas.
+    :param rows: lista de tuplas con los valores de cada fila.
+    :return: bytes con las líneas del lote.
+    """
+    return b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in rows)
+
+
+async def export_rows(session, model, export_format):
+    """
+    Generador que lee una tabla con un cursor del servidor y la codifica por lotes.
+    :param session: sesión de la base de datos, se cierra al finalizar la solicitud.
+    :param model: modelo de la tabla a exportar.
+    :param export_format: formato de la exportación, ndjson o csv.
+    :return: generador asíncrono de bytes.
+    """
+    result = await session.stream(select(*model.__table__.columns).order_by(model.id))
+    keys = list(result.keys())
+    if export_format == 'csv':
+        yield encode_csv([keys])
+    async for rows in result.partitions(EXPORT_BATCH_SIZE):
+        yield encode_csv(rows) if export_format == 'csv' else encode_ndjson(keys, rows)
+
+
+@export_router.get("/export/{collection}.{export_format}", status_code=status.HTTP_200_OK)
+async def export_collection(collection: str, export_format: str, admin_id=Depends(admin_wrapper),
+                            session=Depends(get_read_session)):
+    """
+    Ruta para exportar todos los registros de una colección, por ejemplo /export/review.ndjson.
+    :param collection: colección a exportar: tourist-destination, conservation-area, review,
+    favorite-destination o favorite-area.
+    :param export_format: formato de la exportación, ndjson o csv.
+    :param admin_id: identificador del usuario administrador.
+    :return: respuesta que envía los registros a medida que se leen.
+    :raise Error 401: No tiene permisos.
+    :raise Error 404: la colección o el formato no existen.
+    """
+    model = EXPORT_MODELS.get(collection)
+    if model is None or export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Export not found")
+    filename = f'{collection}.{export_format}'
+    return StreamingResponse(export_rows(session, model, export_format), media_type=EXPORT_FORMATS[export_format],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
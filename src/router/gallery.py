@@ -2,9 +2,10 @@ import os
 import secrets
 from typing import List
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi_sqlalchemy import db
+from sqlalchemy import select
 from fastapi import status, File, UploadFile
-from src.authentication import auth_wrapper
+from src.database import get_session
+from src.router.profile import profile_wrapper
 from src.models import Gallery as ModelGallery
 from src.schema import Gallery as SchemaGallery
 from src.repository import reduce_image_size, remove_image
@@ -30,24 +31,25 @@ async def add_new_image(path, image):
 
 
 @gallery.get("/gallery", response_model=SchemaGallery, status_code=status.HTTP_200_OK)
-def get_gallery(gallery_id=Depends(auth_wrapper)):
-    db_gallery = select_gallery(gallery_id)
+async def get_gallery(gallery_id=Depends(profile_wrapper), session=Depends(get_session)):
+    db_gallery = await select_gallery(session, gallery_id)
     return db_gallery
 
 
 @gallery.post("/add-gallery", response_model=SchemaGallery, status_code=status.HTTP_201_CREATED)
-def add_gallery(gallery_schema: SchemaGallery):
+async def add_gallery(gallery_schema: SchemaGallery, session=Depends(get_session)):
     db_gallery = ModelGallery(photos_path='/', profile_id=gallery_schema.profile_id)
 
-    db.session.add(db_gallery)
-    db.session.commit()
+    session.add(db_gallery)
+    await session.commit()
 
     return db_gallery
 
 
 @gallery.post("/add-photo", status_code=status.HTTP_200_OK)
-async def add_gallery_photo(photos: List[UploadFile] = File(...), gallery_id=Depends(auth_wrapper)):
-    db_gallery = select_gallery(gallery_id)
+async def add_gallery_photo(photos: List[UploadFile] = File(...), gallery_id=Depends(profile_wrapper),
+                            session=Depends(get_session)):
+    db_gallery = await select_gallery(session, gallery_id)
 
     PATH = f'/data_repository/profile/gallery/{gallery_id}/'
     if db_gallery.photos_path == "/":
@@ -64,13 +66,13 @@ async def add_gallery_photo(photos: List[UploadFile] = File(...), gallery_id=Dep
             photos_path += "," + path
 
     db_gallery.photos_path = photos_path
-    db.session.commit()
-    db.session.refresh(db_gallery)
+    await session.commit()
+    await session.refresh(db_gallery)
     return photos_path
 
 
 @gallery.delete("/delete-photo/{name}", status_code=status.HTTP_200_OK)
-async def delete_gallery_photo(name: str, gallery_id=Depends(auth_wrapper)):
+async def delete_gallery_photo(name: str, gallery_id=Depends(profile_wrapper), session=Depends(get_session)):
     PATH = f'/data_repository/profile/gallery/{gallery_id}'
     if os.path.isdir(os.getcwd() + PATH):
         directory_files = os.listdir(os.getcwd() + PATH)
@@ -78,7 +80,7 @@ async def delete_gallery_photo(name: str, gallery_id=Depends(auth_wrapper)):
             if file == name:
                 await remove_image(PATH + "/" + file)
 
-    db_gallery = select_gallery(gallery_id)
+    db_gallery = await select_gallery(session, gallery_id)
     photos_path = db_gallery.photos_path.split(',')
     new_photos_path = ""
     for photo in photos_path:
@@ -90,14 +92,15 @@ async def delete_gallery_photo(name: str, gallery_id=Depends(auth_wrapper)):
                 new_photos_path += ',' + photo
 
     gallery.photos_path = new_photos_path
-    db.session.commit()
-    db.session.refresh(db_gallery)
+    await session.commit()
+    await session.refresh(db_gallery)
 
     return new_photos_path
 
 
-def select_gallery(gallery_id: int):
-    db_g = db.session.query(ModelGallery).filter(ModelGallery.profile_id == gallery_id).one()
+async def select_gallery(session, gallery_id: int):
+    result = await session.execute(select(ModelGallery).where(ModelGallery.profile_id == gallery_id))
+    db_g = result.scalars().one()
     if not db_g:
         raise HTTPException(status_code=404, detail="Gallery not found")
 
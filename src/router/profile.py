@@ -1,40 +1,50 @@
 import os
 from datetime import date
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi import status, File, UploadFile
-from fastapi_sqlalchemy import db
+from typing import Optional
 
-from src.authentication import auth_wrapper
-from src.models import FavoriteDestination, Profile as ModelProfile
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi import status, File, UploadFile
+from sqlalchemy import select
+
+from src.authentication import auth_wrapper, admin_wrapper, claims_wrapper
+from src.database import concurrent_reads, get_session, get_read_session
+from src.conditional import record_response
+from src.fast_json import select_list
+from src.models import FavoriteDestination, Profile as ModelProfile, TouristDestination as ModelTouristDestination
+from src.pagination import ADMIN_PAGE_LIMIT, ADMIN_PAGE_MAX_LIMIT, approximate_count, like_pattern, page_headers
+from src.pagination import page_statement, split_page
 from src.repository import EXTENSIONS, reduce_image_size
-from src.router.tourist_destination import *
-import src.router.user as user
+from src.response_cache import encode_response
+from src.router.tourist_destination import select_season_destinations
 from src.schema import Profile as SchemaProfile
 
 profile = APIRouter()
 
 
-def select_profile_by_user_id(user_id):
+async def select_profile_by_user_id(session, user_id):
     """
     Función para obtener el perfil de un usuario apartir del identificador.
+    :param session: sesión de la base de datos.
     :param user_id: identificador de un usuario.
     :return db_profile: DAO de un perfil de usuario.
     :raise: HTTPException: no se encontro el perfil.
     """
-    db_profile = db.session.query(ModelProfile).filter(ModelProfile.user_id == user_id).one()
+    result = await session.execute(select(ModelProfile).where(ModelProfile.user_id == user_id))
+    db_profile = result.scalars().one()
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return db_profile
 
 
-def select_profile(profile_id: int):
+async def select_profile(session, profile_id: int):
     """
     Función para obtener los datos de un usuario de la base de datos.
+    :param session: sesión de la base de datos.
     :param profile_id: identificador del perfil del usuario
     :return: DTO con los datos del perfil
     """
-    db_profile = db.session.query(ModelProfile).get(profile_id)
+    db_profile = await session.get(ModelProfile, profile_id)
 
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -42,38 +52,72 @@ def select_profile(profile_id: int):
     return db_profile
 
 
-@profile.get("/profiles", status_code=status.HTTP_200_OK)
-def get_profiles(admin_id=Depends(auth_wrapper)):
+async def profile_wrapper(claims=Depends(claims_wrapper), session=Depends(get_session)):
     """
-    Función para obtener los datos de todos los perfiles registrados.
+    Función utilizada para obtener el identificador del perfil del usuario autenticado a partir
+    del contenido firmado del token, los tokens que no incluyen el perfil lo buscan por el usuario.
+    :param claims: contenido del token del usuario.
+    :param session: sesión de la base de datos.
+    :return: identificador del perfil.
+    :raise HTTPException: no se encontro el perfil.
+    """
+    profile_id = claims.get('pid')
+    if profile_id is None:
+        result = await session.execute(select(ModelProfile.id).where(ModelProfile.user_id == claims['sub']).limit(1))
+        profile_id = result.scalar()
+        if profile_id is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+    return profile_id
+
+
+@profile.get("/profiles", status_code=status.HTTP_200_OK)
+async def get_profiles(name: Optional[str] = Query(None, min_length=3), after: int = Query(0, ge=0),
+                       limit: int = Query(ADMIN_PAGE_LIMIT, ge=1, le=ADMIN_PAGE_MAX_LIMIT),
+                       admin_id=Depends(admin_wrapper), session=Depends(get_session)):
+    """
+    Función para obtener los datos de los perfiles registrados, por páginas ordenadas por identificador.
+    La página siguiente se solicita con el encabezado X-Next-After de la respuesta, la primera página
+    incluye el total aproximado en X-Total-Count.
+    :param name: parte del nombre de los perfiles, al menos tres caracteres, sin distinguir mayúsculas y minúsculas.
+    :param after: identificador del último perfil de la página anterior.
+    :param limit: cantidad de perfiles de la página.
     :param admin_id: credenciales de ususario administrador.
-    :return: Lista con todos los datos de los perfiles.
+    :return: Lista con los datos de los perfiles de la página.
     :raise Error 401: No tiene permisos.
     """
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-    db_profiles = db.session.query(ModelProfile).all()
+    statement = select(ModelProfile)
+    if name:
+        statement = statement.where(ModelProfile.name.ilike(like_pattern(name, contains=True), escape='\\'))
+
+    async def page(page_session):
+        return await select_list(page_session, page_statement(statement, ModelProfile.id, after, limit))
+
+    async def count(count_session):
+        return await approximate_count(count_session, statement, ModelProfile.__table__, bool(name))
 
-    return db_profiles
+    # el total se calcula únicamente en la primera página, al mismo tiempo que la página
+    results = await concurrent_reads(session, page, *([count] if not after else []))
+    db_profiles, next_after = split_page(results[0], limit)
+
+    response = Response(content=encode_response(db_profiles), media_type="application/json")
+    page_headers(response, next_after, *(results[1] if len(results) > 1 else (None, None)))
+    return response
 
 
 @profile.get("/profile", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def get_profile(profile_id=Depends(auth_wrapper)):
+async def get_profile(request: Request, profile_id=Depends(profile_wrapper), session=Depends(get_session)):
     """
     Ruta para obtener el perfil de un usuario.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :param profile_id: identificador del perfil.
     :return: DTO con los datos del perfil.
     """
-    db_profile = select_profile(profile_id)
-    if not db_profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-
-    return db_profile
+    return await record_response(request, session, ModelProfile, profile_id, select_profile, session, profile_id,
+                                 model=SchemaProfile)
 
 
 @profile.get("/profile/{profile_id}", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def get_profile_by_id(profile_id: int, admin_id=Depends(auth_wrapper)):
+async def get_profile_by_id(profile_id: int, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta para obtener el perfil de un usuario.
     :param profile_id: identificador del perfil.
@@ -82,11 +126,7 @@ def get_profile_by_id(profile_id: int, admin_id=Depends(auth_wrapper)):
     :raise Error 401: No tiene permisos.
     :raise Error 404: el perfil no se encontro
     """
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_profile = select_profile(profile_id)
+    db_profile = await select_profile(session, profile_id)
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
@@ -94,7 +134,7 @@ def get_profile_by_id(profile_id: int, admin_id=Depends(auth_wrapper)):
 
 
 @profile.post("/add-profile", response_model=SchemaProfile, status_code=status.HTTP_201_CREATED)
-def add_profile(profile_schema: SchemaProfile):
+async def add_profile(profile_schema: SchemaProfile, session=Depends(get_session)):
     """
     Ruta para registrar un nuevo perfil en la base de datos.
     :param profile_schema: datos del perfil ha registrar.
@@ -104,21 +144,22 @@ def add_profile(profile_schema: SchemaProfile):
         db_profile = ModelProfile(name=profile_schema.name, phone=profile_schema.phone,
                                   profile_photo_path='/', cover_photo_path='/', user_id=profile_schema.user_id)
 
-        db.session.add(db_profile)
-        db.session.commit()
+        session.add(db_profile)
+        await session.commit()
         return db_profile
     except:
         raise HTTPException(status_code=404, detail="User not exists")
 
 
-def update_profile(profile_schema: SchemaProfile, profile_id: int):
+async def update_profile(session, profile_schema: SchemaProfile, profile_id: int):
     """
     Función para actualizar los datos de un perfil de la base de datos.
+    :param session: sesión de la base de datos.
     :param profile_schema: datos a actualizar del perfil
     :param profile_id: identificador del pefil.
     :return: DTO del perfil actualizado
     """
-    db_profile = select_profile(profile_id)
+    db_profile = await select_profile(session, profile_id)
     if profile_schema.name:
         db_profile.name = profile_schema.name
     if profile_schema.phone:
@@ -128,24 +169,26 @@ def update_profile(profile_schema: SchemaProfile, profile_id: int):
     if profile_schema.cover_photo_path:
         db_profile.cover_photo_path = profile_schema.cover_photo_path
 
-    db.session.commit()
-    db.session.refresh(db_profile)
+    await session.commit()
+    await session.refresh(db_profile)
     return db_profile
 
 
 @profile.post("/update-profile", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def update_personal_profile(profile_schema: SchemaProfile, profile_id=Depends(auth_wrapper)):
+async def update_personal_profile(profile_schema: SchemaProfile, profile_id=Depends(profile_wrapper),
+                                  session=Depends(get_session)):
     """
     Ruta para que un usuario pueda modificar su propio perfil.
     :param profile_schema: datos del perfil ha actualizar.
     :param profile_id: indentificador del perfil del usuario.
     :return: datos del pefil actualizado
     """
-    return update_profile(profile_schema, profile_id)
+    return await update_profile(session, profile_schema, profile_id)
 
 
 @profile.post("/update-profile/{profile_id}", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def update_profile_by_id(profile_id: int, profile_schema: SchemaProfile, admin_id=Depends(auth_wrapper)):
+async def update_profile_by_id(profile_id: int, profile_schema: SchemaProfile, admin_id=Depends(admin_wrapper),
+                               session=Depends(get_session)):
     """
     Ruta para que un usuario pueda modificar su propio perfil.
     :param profile_schema: datos del perfil ha actualizar.
@@ -154,50 +197,43 @@ def update_profile_by_id(profile_id: int, profile_schema: SchemaProfile, admin_i
     :return: datos del pefil actualizado
     """
 
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    return update_profile(profile_schema, profile_id)
+    return await update_profile(session, profile_schema, profile_id)
 
 
-async def delete_profile(profile_id: int):
-    db_profile = select_profile(profile_id)
+async def delete_profile(session, profile_id: int):
+    db_profile = await select_profile(session, profile_id)
 
-    await delete_photo('profile', profile_id)
-    await delete_photo( 'cover', profile_id)
+    await delete_photo(session, 'profile', profile_id)
+    await delete_photo(session, 'cover', profile_id)
 
-    db.session.delete(db_profile)
-    db.session.commit()
+    await session.delete(db_profile)
+    await session.commit()
     return True
 
 
 @profile.delete("/delete-profile", status_code=status.HTTP_200_OK)
-async def delete_personal_profile(profile_id=Depends(auth_wrapper)):
+async def delete_personal_profile(profile_id=Depends(profile_wrapper), session=Depends(get_session)):
     """
     Ruta utilizada para que los usuarios eliminen sus propios perfiles.
     :param profile_id: identificador del perfil.
     :return: Verdadero si se elimino correctamente
     """
-    return await delete_profile(profile_id)
+    return await delete_profile(session, profile_id)
 
 
 @profile.delete("/delete-profile/{profile_id}", status_code=status.HTTP_200_OK)
-async def delete_profile_by_id(profile_id: int, admin_id=Depends(auth_wrapper)):
+async def delete_profile_by_id(profile_id: int, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta utilizada para eliminen un perfil perfiles.
     :param profile_id: identificador del perfil.
     :param admin_id: credenciales de un usuario administrador.
     :return: Verdadero si se elimino correctamente
     """
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-    return await delete_profile(profile_id)
+    return await delete_profile(session, profile_id)
 
 
 @profile.get("/profiles/photo/{type}", status_code=status.HTTP_200_OK)
-async def get_photo(type, profile_id=Depends(auth_wrapper)):
+async def get_photo(type, profile_id=Depends(profile_wrapper)):
     """
     Ruta para obtener las fotografías de perfil o portada de un usuario.
     :param type: tipo de fotografia, puede ser profile o cover.
@@ -217,15 +253,16 @@ async def get_photo(type, profile_id=Depends(auth_wrapper)):
     raise HTTPException(status_code=404, detail="File not found")
 
 
-async def add_photo(type, image, profile_id):
+async def add_photo(session, type, image, profile_id):
     """
     Función para guardar una fotografia de perfil o portada de un usuario.
+    :param session: sesión de la base de datos.
     :param type:
     :param image:
     :param profile_id:
     :return: ruta de la imagen.
     """
-    db_profile = select_profile(profile_id)
+    db_profile = await select_profile(session, profile_id)
 
     filename = image.filename
     extension = filename.split(".")[-1]
@@ -234,7 +271,7 @@ async def add_photo(type, image, profile_id):
     for ext in EXTENSIONS:
         pathExt = f'/data_repository/profile/{type}/{profile_id}.{ext}'
         if os.path.exists(pathExt):
-            await delete_photo(profile_id, type)
+            await delete_photo(session, type, profile_id)
 
     path = f'/data_repository/profile/{type}/{profile_id}.{extension}'
     image_content = await image.read()
@@ -251,13 +288,14 @@ async def add_photo(type, image, profile_id):
     if type == 'cover':
         db_profile.cover_photo_path = path
 
-    db.session.commit()
-    db.session.refresh(db_profile)
+    await session.commit()
+    await session.refresh(db_profile)
     return path
 
 
 @profile.post("/profiles/photo/{type}", status_code=status.HTTP_200_OK)
-async def add_personal_photo(type: str, image: UploadFile = File(...), profile_id=Depends(auth_wrapper)):
+async def add_personal_photo(type: str, image: UploadFile = File(...), profile_id=Depends(profile_wrapper),
+                             session=Depends(get_session)):
     """
     Ruta para que el usuario agrege las fotogracias de perfil y portada de un usuario.
     :param type: tipo de fotografia, puede ser profile o cover.
@@ -265,11 +303,12 @@ async def add_personal_photo(type: str, image: UploadFile = File(...), profile_i
     :param image: imagen a registrar.
     :return: ruta de la imagen
     """
-    return await add_photo(type, image, profile_id)
+    return await add_photo(session, type, image, profile_id)
 
 
 @profile.post("/profiles/photo/{type}/{profile_id}", status_code=status.HTTP_200_OK)
-async def add_photo_by_id(profile_id: int, type: str, image: UploadFile = File(...), admin_id=Depends(auth_wrapper)):
+async def add_photo_by_id(profile_id: int, type: str, image: UploadFile = File(...), admin_id=Depends(admin_wrapper),
+                          session=Depends(get_session)):
     """
     Ruta para agregar las fotogracias de perfil y portada de un usuario.
     :param type: tipo de fotografia, puede ser profile o cover.
@@ -278,23 +317,20 @@ async def add_photo_by_id(profile_id: int, type: str, image: UploadFile = File(.
     :param image: imagen a registrar.
     :return: ruta de la imagen
     """
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    return await add_photo(type, image, profile_id)
+    return await add_photo(session, type, image, profile_id)
 
 
-async def delete_photo(type, profile_id):
+async def delete_photo(session, type, profile_id):
     """
     Función para eliminar fotografías de los usuarios del sistema de archivos.
+    :param session: sesión de la base de datos.
     :param type: tipo de fotografia, puede ser profile o cover.
     :param profile_id: identificador del perfil al que estan asociadas las imagenes.
     :return: profile_id
     """
     directory_name = f'{type}'
     PATH = f'/data_repository/profile/{directory_name}/{profile_id}'
-    db_profile = select_profile(profile_id)
+    db_profile = await select_profile(session, profile_id)
 
     path = os.getcwd() + PATH
 
@@ -307,26 +343,26 @@ async def delete_photo(type, profile_id):
             if type == 'cover':
                 db_profile.cover_photo_path = "/"
 
-            db.session.commit()
-            db.session.refresh(db_profile)
+            await session.commit()
+            await session.refresh(db_profile)
             return profile_id
 
     raise HTTPException(status_code=404, detail="File not found")
 
 
 @profile.delete("/profiles/photo/{type}", status_code=status.HTTP_200_OK)
-async def delete_personal_photo(type, profile_id=Depends(auth_wrapper)):
+async def delete_personal_photo(type, profile_id=Depends(profile_wrapper), session=Depends(get_session)):
     """
      Función para eliminar fotografías de los usuarios del sistema de archivos.
      :param type: tipo de fotografia, puede ser profile o cover.
      :param profile_id: identificador del perfil al que estan asociadas las imagenes.
      :return: profile_id
      """
-    return await delete_photo(type, profile_id)
+    return await delete_photo(session, type, profile_id)
 
 
 @profile.delete("/profiles/photo/{type}/{profile_id}", status_code=status.HTTP_200_OK)
-async def delete_photo_by_id(profile_id: int, type, admin_id=Depends(auth_wrapper)):
+async def delete_photo_by_id(profile_id: int, type, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
      Función para eliminar fotografías de los usuarios del sistema de archivos.
      :param type: tipo de fotografia, puede ser profile o cover.
@@ -334,17 +370,13 @@ async def delete_photo_by_id(profile_id: int, type, admin_id=Depends(auth_wrappe
      :param admin_id: credenciales de un usuario administrador.
      :return: profile_id
      """
-    db_user = user.select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    return await delete_photo(type, profile_id)
+    return await delete_photo(session, type, profile_id)
 
 
 @profile.get("/users/{user_id}/profiles/", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def get_profile_by_user(user_id: int):
-    favorite_areas = db.session.query(ModelProfile).filter(
-        ModelProfile.user_id == user_id).all()
+async def get_profile_by_user(user_id: int, session=Depends(get_session)):
+    result = await session.execute(select(ModelProfile).where(ModelProfile.user_id == user_id))
+    favorite_areas = result.scalars().all()
     if len(favorite_areas) != 0:
         return favorite_areas[0]
 
@@ -352,9 +384,9 @@ def get_profile_by_user(user_id: int):
 
 
 @profile.get("/users/all/auth-profiles/", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def get_authenticated_profile(user_id=Depends(auth_wrapper)):
-    profiles = db.session.query(ModelProfile).filter(
-        ModelProfile.user_id == user_id).all()
+async def get_authenticated_profile(user_id=Depends(auth_wrapper), session=Depends(get_session)):
+    result = await session.execute(select(ModelProfile).where(ModelProfile.user_id == user_id))
+    profiles = result.scalars().all()
     if len(profiles) != 0:
         return profiles[0]
 
@@ -362,57 +394,60 @@ def get_authenticated_profile(user_id=Depends(auth_wrapper)):
 
 
 @profile.get("/users/all/auth-profiles/", response_model=SchemaProfile, status_code=status.HTTP_200_OK)
-def get_authenticated_profile(user_id=Depends(auth_wrapper)):
+async def get_authenticated_profile(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Ruta para obtener el perfil del usuario autentificado con sus credenciales.
     :param user_id: credenciales del usuario.
     :return: DTO del perfil del usuario
     """
-    profiles = db.session.query(ModelProfile).filter(
-        ModelProfile.user_id == user_id).all()
+    result = await session.execute(select(ModelProfile).where(ModelProfile.user_id == user_id))
+    profiles = result.scalars().all()
     if len(profiles) != 0:
         return profiles[0]
 
     raise HTTPException(status_code=404, detail="Profile not found")
 
 
+async def select_destinations_by_type(session, column):
+    """
+    Función para obtener los primeros destinos turísticos de un tipo.
+    :param session: sesión de la base de datos.
+    :param column: columna booleana del tipo de destino.
+    :return: lista con un máximo de tres destinos.
+    """
+    result = await session.execute(select(ModelTouristDestination).where(column == True).limit(3))
+    return result.scalars().all()
+
+
 @profile.get("/profile/recommendation/")
-async def recommendation(user_id=Depends(auth_wrapper)):
+async def recommendation(user_id=Depends(auth_wrapper), session=Depends(get_read_session)):
     """
     Ruta que se encarga de generar los destinos favoritos de un usuario.
     :param user_id: credenciales del usuario
     :return: lista de destinos recomendados
     """
-    favorite = db.session.query(ModelTouristDestination).join(FavoriteDestination). \
-        filter(FavoriteDestination.user_id == user_id).all()
+    result = await session.execute(select(ModelTouristDestination).join(FavoriteDestination).
+                                   where(FavoriteDestination.user_id == user_id))
+    favorite = result.scalars().all()
     if favorite:
-        beach = len(db.session.query(ModelTouristDestination).join(FavoriteDestination). \
-                    filter(FavoriteDestination.user_id == user_id, ModelTouristDestination.is_beach == True).all())
-        volcano = len(db.session.query(ModelTouristDestination).join(FavoriteDestination). \
-                      filter(FavoriteDestination.user_id == user_id, ModelTouristDestination.is_volcano == True).all())
-        forest = len(db.session.query(ModelTouristDestination).join(FavoriteDestination). \
-                     filter(FavoriteDestination.user_id == user_id, ModelTouristDestination.is_forest == True).all())
-        mountain = len(db.session.query(ModelTouristDestination).join(FavoriteDestination). \
-                       filter(FavoriteDestination.user_id == user_id,
-                              ModelTouristDestination.is_mountain == True).all())
+        beach = len([destination for destination in favorite if destination.is_beach])
+        volcano = len([destination for destination in favorite if destination.is_volcano])
+        forest = len([destination for destination in favorite if destination.is_forest])
+        mountain = len([destination for destination in favorite if destination.is_mountain])
         maxi = max(beach, volcano, forest, mountain)
 
         tourist_destinations = []
         if maxi == beach:
-            tourist_destinations.extend(db.session.query(ModelTouristDestination). \
-                                        filter(ModelTouristDestination.is_beach == True).all()[:3])
+            tourist_destinations.extend(await select_destinations_by_type(session, ModelTouristDestination.is_beach))
         if maxi == volcano:
-            tourist_destinations.extend(db.session.query(ModelTouristDestination). \
-                                        filter(ModelTouristDestination.is_volcano == True).all()[:3])
+            tourist_destinations.extend(await select_destinations_by_type(session, ModelTouristDestination.is_volcano))
         if maxi == forest:
-            tourist_destinations.extend(db.session.query(ModelTouristDestination). \
-                                        filter(ModelTouristDestination.is_forest == True).all()[:3])
+            tourist_destinations.extend(await select_destinations_by_type(session, ModelTouristDestination.is_forest))
         if maxi == mountain:
-            tourist_destinations.extend(db.session.query(ModelTouristDestination). \
-                                        filter(ModelTouristDestination.is_mountain == True).all()[:3])
+            tourist_destinations.extend(await select_destinations_by_type(session, ModelTouristDestination.is_mountain))
         return tourist_destinations
     else:
         today = date.today()
-        season = await get_tourist_destinations_of_season(today.month)
+        season = await select_season_destinations(session, today.month)
 
         return season
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from src.authentication import admin_wrapper
+from src.profiling import list_profiles, profile_path
+
+profiling_router = APIRouter()
+
+
+@profiling_router.get("/debug/profiles", status_code=status.HTTP_200_OK)
+async def get_profiles(admin_id=Depends(admin_wrapper)):
+    """
+    Ruta para obtener los perfiles de solicitudes almacenados, del más reciente al más antiguo.
+    :param admin_id: identificador del usuario administrador.
+    :return: lista con el nombre, tamaño y fecha de cada perfil.
+    :raise Error 401: No tiene permisos.
+    """
+    return list_profiles()
+
+
+@profiling_router.get("/debug/profiles/{name}", status_code=status.HTTP_200_OK)
+async def get_profile_file(name: str, admin_id=Depends(admin_wrapper)):
+    """
+    Ruta para descargar un perfil en formato folded, se visualiza con flamegraph.pl o speedscope.
+    :param name: nombre del perfil.
+    :param admin_id: identificador del usuario administrador.
+    :return: archivo del perfil.
+    :raise Error 401: No tiene permisos.
+    :raise Error 404: el perfil no existe.
+    """
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
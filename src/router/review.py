@@ -1,14 +1,17 @@
 from src import repository
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException
-from fastapi_sqlalchemy import db
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import select
 from fastapi import File, UploadFile, status, Depends
 
 from src.models import Review as ModelReview
 from src.schema import Review as SchemaReview
 
 from src.authentication import auth_wrapper
+from src.database import get_session, get_read_session
+from src.conditional import conditional_response
+from src.fast_json import select_list
 
 review_router = APIRouter()
 
@@ -20,27 +23,30 @@ def formatDate(date):
     return date.strftime("%d de " + month[date.month - 1] + ". %Y")
 
 
-def select_review(review_id: int):
+async def select_review(session, review_id: int):
     """
     Función para buscar la información de una opinión de un usuario sobre un destino.
+    :param session: sesión de la base de datos.
     :param review_id: Identificador de la relación.
     :return db_favorites_area_id: Información de la opinión.
     """
-    db_review = db.session.query(ModelReview).get(review_id)
+    db_review = await session.get(ModelReview, review_id)
     if db_review is None:
         raise HTTPException(status_code=404, detail="Item not found")
     db_review.date = formatDate(db_review.date)
     return db_review
 
 
-def select_review_by_user(tourist_destination_id: int, user_id: int):
+async def select_review_by_user(session, tourist_destination_id: int, user_id: int):
     """
     Función para buscar la información de la opinión de un usuario a partir de su identificador.
+    :param session: sesión de la base de datos.
     :param tourist_destination_id: Identificador del destino.
     :param user_id: Identificador del usuario.
     :return db_favorites_area_id: Información de la opinión.
     """
-    for review in db.session.query(ModelReview).filter(ModelReview.user_id == user_id).all():
+    result = await session.execute(select(ModelReview).where(ModelReview.user_id == user_id))
+    for review in result.scalars():
         if (review.tourist_destination_id == tourist_destination_id):
             review.date = datetime.now()  # formatDate(review.date)
             return review
@@ -50,36 +56,37 @@ def select_review_by_user(tourist_destination_id: int, user_id: int):
 
 @review_router.get('/tourist-destination/{tourist_destination_id}/user-review', response_model=SchemaReview,
                    status_code=status.HTTP_200_OK)
-def get_user_review(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def get_user_review(tourist_destination_id: int, user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para buscar la opinión de un usuario en un destino.
     :param user_id: Identificador del usuario.
     :param tourist_destination_id: Identificador del destino.
     :return review: Opinión del destino.
     """
-    review = select_review_by_user(tourist_destination_id, user_id)
+    review = await select_review_by_user(session, tourist_destination_id, user_id)
     return review
 
 
 @review_router.get('/tourist-destination/{tourist_destination_id}/reviews')
-def get_reviews(tourist_destination_id: int):
+async def get_reviews(tourist_destination_id: int, request: Request, session=Depends(get_read_session)):
     """
     Función para buscar las opiniones de un destino.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :param tourist_destination_id: Identificador del destino.
     :return reviews: Lista de opiniones del destino.
     """
-    reviews = db.session.query(ModelReview).filter(
-        ModelReview.tourist_destination_id == tourist_destination_id).order_by(ModelReview.date.desc()).all()
+    async def load():
+        return await select_list(session, select(ModelReview).
+                                 where(ModelReview.tourist_destination_id == tourist_destination_id).
+                                 order_by(ModelReview.date.desc()), date=formatDate)
 
-    for review in reviews:
-        review.date = formatDate(review.date)
-
-    return reviews
+    return await conditional_response(request, session, ['review'], load)
 
 
 @review_router.post('/tourist-destination/{tourist_destination_id}/user-review', response_model=SchemaReview,
                     status_code=status.HTTP_201_CREATED)
-def add_review(tourist_destination_id: int, review: SchemaReview, user_id=Depends(auth_wrapper)):
+async def add_review(tourist_destination_id: int, review: SchemaReview, user_id=Depends(auth_wrapper),
+                     session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de una nueva opinión.
     :param tourist_destination_id: Identificador del destino turístico.
@@ -95,8 +102,8 @@ def add_review(tourist_destination_id: int, review: SchemaReview, user_id=Depend
                             user_id=user_id,
                             tourist_destination_id=tourist_destination_id)
 
-    db.session.add(db_review)
-    db.session.commit()
+    session.add(db_review)
+    await session.commit()
     db_review.date = datetime.now()
     return db_review
 
@@ -117,7 +124,8 @@ async def add_review_image(tourist_destination_id: int, image: UploadFile = File
 
 @review_router.patch("/tourist-destination/{tourist_destination_id}/update-review",
                      response_model=SchemaReview, status_code=status.HTTP_200_OK)
-def update_review(review_id: int, review: SchemaReview, user_id=Depends(auth_wrapper)):
+async def update_review(review_id: int, review: SchemaReview, user_id=Depends(auth_wrapper),
+                        session=Depends(get_session)):
     """
     Ruta para actualizar los datos de una opinión.
     :param review_id: identificador de la opinión.
@@ -125,7 +133,7 @@ def update_review(review_id: int, review: SchemaReview, user_id=Depends(auth_wra
     :param user_id: identificador del usuario.
     :return db_review: DAO con los datos actualizados.
     """
-    db_review = select_review_by_user(review_id, user_id)
+    db_review = await select_review_by_user(session, review_id, user_id)
 
     update_data = review.dict(exclude_unset=True)
 
@@ -141,28 +149,28 @@ def update_review(review_id: int, review: SchemaReview, user_id=Depends(auth_wra
     db_review.calification = update_data.get("calification")
     db_review.image_path = update_data.get("image_path")
 
-    db.session.add(db_review)
-    db.session.commit()
-    db.session.refresh(db_review)
+    session.add(db_review)
+    await session.commit()
+    await session.refresh(db_review)
     db_review.date = datetime.now()
     return db_review
 
 
 @review_router.delete('/tourist-destination/{tourist_destination_id}/user-review/{review_id}',
                       status_code=status.HTTP_200_OK)
-def delete_review(review_id: int, user_id=Depends(auth_wrapper)):
+async def delete_review(review_id: int, user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Ruta utilizada para eliminar una opinión de un destino.
     :param review_id: identificador de la opinion.
     :param user_id: Identificador del usuario.
     :return boolean: Verdadero si fue correctamente eliminado.
     """
-    db_review = select_review(review_id)
+    db_review = await select_review(session, review_id)
     if db_review.user_id != user_id:
         return False
 
     # Photos
 
-    db.session.delete(db_review)
-    db.session.commit()
+    await session.delete(db_review)
+    await session.commit()
     return True
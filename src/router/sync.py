@@ -0,0 +1,277 @@
+import json
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+from sqlalchemy.exc import DBAPIError
+
+from src.authentication import auth_wrapper
+from src.change_log import CHANGE_LOG_MODELS, DELETE, UPSERT
+from src.database import get_read_session, get_session
+from src.fast_json import dumps
+from src.models import ChangeLog as ModelChangeLog
+from src.models import ConservationArea as ModelConservationArea
+from src.models import FavoriteArea as ModelFavoriteArea
+from src.models import FavoriteDestination as ModelFavoriteDestination
+from src.models import Review as ModelReview
+from src.models import SyncOperation as ModelSyncOperation
+from src.models import TouristDestination as ModelTouristDestination
+from src.models import VisitedDestination as ModelVisitedDestination
+from src.schema import FavoriteArea as SchemaFavoriteArea
+from src.schema import FavoriteDestination as SchemaFavoriteDestination
+from src.schema import Review as SchemaReview
+from src.schema import SyncBatch as SchemaSyncBatch
+from src.schema import VisitedDestination as SchemaVisitedDestination
+from src.settings import settings
+
+"""
+Se establece la sincronización de las operaciones que la aplicación móvil realiza sin conexión. Las
+operaciones se reciben en una sola solicitud y se aplican en orden dentro de una transacción, cada una
+en un punto de guardado para que una operación con errores no descarte las demás. El resultado de cada
+operación se guarda con el identificador generado por el cliente, si la aplicación vuelve a enviar la
+misma operación se responde el resultado guardado sin aplicarla de nuevo.
+
+También se establece la sincronización incremental del catálogo: los clientes guardan el cursor de la
+última respuesta y solicitan únicamente los cambios posteriores, registrados en src.change_log.
+"""
+
+sync_router = APIRouter()
+
+SYNC_MAX_OPERATIONS = settings.sync_max_operations
+SYNC_RETENTION_DAYS = settings.sync_retention_days
+
+# Cambios por página por defecto y máximo de la sincronización incremental
+SYNC_CHANGES_LIMIT = settings.sync_changes_limit
+SYNC_CHANGES_MAX_LIMIT = 5000
+
+
+async def select_target(session, model, target_id):
+    """
+    Función para buscar el registro al que hace referencia una operación.
+    :param session: sesión de la base de datos.
+    :param model: modelo del registro.
+    :param target_id: identificador del registro.
+    :return: DAO del registro.
+    :raise Error 404: el registro no existe.
+    """
+    item = await session.get(model, target_id) if target_id is not None else None
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+def add_relation(model, column, target_model, schema):
+    """
+    Función para crear la operación que marca un destino o área como favorito o visitado.
+    :param model: modelo de la relación.
+    :param column: columna de la relación con el destino o área.
+    :param target_model: modelo del destino o área.
+    :param schema: esquema de la relación en la respuesta.
+    :return: corrutina de la operación.
+    """
+    async def apply(session, user_id, operation, target_id):
+        await select_target(session, target_model, target_id)
+        item = model(user_id=user_id, **{column: target_id})
+        session.add(item)
+        await session.flush()
+        return status.HTTP_201_CREATED, schema.from_orm(item)
+
+    return apply
+
+
+def delete_owned(model):
+    """
+    Función para crear la operación que elimina un registro del usuario, igual que las rutas se
+    responde falso si el registro pertenece a otro usuario.
+    :param model: modelo del registro.
+    :return: corrutina de la operación.
+    """
+    async def apply(session, user_id, operation, target_id):
+        item = await select_target(session, model, target_id)
+        if item.user_id != user_id:
+            return status.HTTP_200_OK, False
+        await session.delete(item)
+        await session.flush()
+        return status.HTTP_200_OK, True
+
+    return apply
+
+
+async def add_review(session, user_id, operation, target_id):
+    # opinión del usuario sobre el destino target_id
+    await select_target(session, ModelTouristDestination, target_id)
+    if operation.review is None:
+        raise HTTPException(status_code=422, detail="Review is required")
+    item = ModelReview(title=operation.review.title,
+                       text=operation.review.text,
+                       date=datetime.now(),
+                       calification=operation.review.calification,
+                       image_path=operation.review.image_path,
+                       user_id=user_id,
+                       tourist_destination_id=target_id)
+    session.add(item)
+    await session.flush()
+    return status.HTTP_201_CREATED, SchemaReview.from_orm(item)
+
+
+async def update_review(session, user_id, operation, target_id):
+    # opinión target_id del usuario, otros usuarios no la pueden modificar
+    item = await select_target(session, ModelReview, target_id)
+    if item.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if operation.review is None:
+        raise HTTPException(status_code=422, detail="Review is required")
+    item.title = operation.review.title
+    item.text = operation.review.text
+    item.date = datetime.now()
+    item.calification = operation.review.calification
+    item.image_path = operation.review.image_path
+    await session.flush()
+    return status.HTTP_200_OK, SchemaReview.from_orm(item)
+
+
+# Operaciones disponibles, con el mismo nombre y comportamiento que las rutas individuales
+SYNC_ACTIONS = {
+    'add_favorite_destination': add_relation(ModelFavoriteDestination, 'tourist_destination_id',
+                                             ModelTouristDestination, SchemaFavoriteDestination),
+    'delete_favorite_destination': delete_owned(ModelFavoriteDestination),
+    'add_visited_destination': add_relation(ModelVisitedDestination, 'tourist_destination_id',
+                                            ModelTouristDestination, SchemaVisitedDestination),
+    'delete_visited_destination': delete_owned(ModelVisitedDestination),
+    'add_favorite_area': add_relation(ModelFavoriteArea, 'conservation_area_id',
+                                      ModelConservationArea, SchemaFavoriteArea),
+    'delete_favorite_area': delete_owned(ModelFavoriteArea),
+    'add_review': add_review,
+    'update_review': update_review,
+    'delete_review': delete_owned(ModelReview),
+}
+
+
+def resolve_target(operation, results):
+    """
+    Función para obtener el registro de una operación, si se indica target_op_id se utiliza el
+    registro creado por esa operación anterior.
+    :param operation: DTO de la operación.
+    :param results: resultados de las operaciones anteriores por op_id.
+    :return: identificador del registro.
+    :raise Error 404: la operación anterior no existe o no creó un registro.
+    """
+    if operation.target_op_id is None:
+        return operation.target_id
+    result = results.get(operation.target_op_id, {}).get('result')
+    if not isinstance(result, dict) or 'id' not in result:
+        raise HTTPException(status_code=404, detail="Target operation not found")
+    return result['id']
+
+
+async def apply_operation(session, user_id, operation, results):
+    """
+    Función para aplicar una operación y guardar su resultado en un punto de guardado, si la
+    operación falla se revierten únicamente sus cambios.
+    :param session: sesión de la base de datos.
+    :param user_id: identificador del usuario.
+    :param operation: DTO de la operación.
+    :param results: resultados de las operaciones anteriores por op_id.
+    :return: diccionario con op_id, el código de estado y el resultado de la operación.
+    """
+    try:
+        async with session.begin_nested():
+            try:
+                apply = SYNC_ACTIONS.get(operation.action)
+                if apply is None:
+                    raise HTTPException(status_code=400, detail="Unknown action")
+                target_id = resolve_target(operation, results)
+                async with session.begin_nested():
+                    status_code, result = await apply(session, user_id, operation, target_id)
+            except HTTPException as error:
+                status_code, result = error.status_code, {'detail': error.detail}
+            result = jsonable_encoder(result)
+            session.add(ModelSyncOperation(user_id=user_id, op_id=operation.op_id, status=status_code,
+                                           result=dumps(result).decode('utf-8')))
+            await session.flush()
+    except DBAPIError as error:
+        # los errores de la base de datos no se guardan, el cliente puede volver a intentar la operación
+        return {'op_id': operation.op_id, 'status': status.HTTP_409_CONFLICT, 'result': {'detail': str(error.orig)},
+                'replayed': False}
+    return {'op_id': operation.op_id, 'status': status_code, 'result': result, 'replayed': False}
+
+
+@sync_router.post("/sync/batch", status_code=status.HTTP_200_OK)
+async def sync_batch(batch: SchemaSyncBatch, user_id=Depends(auth_wrapper), session=Depends(get_session)):
+    """
+    Ruta para aplicar en orden las operaciones realizadas sin conexión: agregar y eliminar destinos
+    favoritos, destinos visitados y áreas favoritas, y agregar, actualizar o eliminar opiniones.
+    :param batch: DTO con la lista ordenada de operaciones.
+    :param user_id: identificador del usuario.
+    :return: resultados de cada operación en el mismo orden, con replayed verdadero si la operación
+    ya se había aplicado en una sincronización anterior.
+    :raise Error 400: la lista contiene op_id repetidos.
+    :raise Error 413: la lista supera SYNC_MAX_OPERATIONS operaciones.
+    """
+    if len(batch.operations) > SYNC_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail="Too many operations")
+    op_ids = [operation.op_id for operation in batch.operations]
+    if len(set(op_ids)) != len(op_ids):
+        raise HTTPException(status_code=400, detail="Duplicate op_id")
+
+    # se eliminan los resultados vencidos del usuario y se buscan las operaciones ya aplicadas
+    expired = datetime.utcnow() - timedelta(days=SYNC_RETENTION_DAYS)
+    await session.execute(delete(ModelSyncOperation).
+                          where(ModelSyncOperation.user_id == user_id, ModelSyncOperation.created_at < expired).
+                          execution_options(synchronize_session=False))
+    recorded = await session.execute(select(ModelSyncOperation.op_id, ModelSyncOperation.status,
+                                            ModelSyncOperation.result).
+                                     where(ModelSyncOperation.user_id == user_id,
+                                           ModelSyncOperation.op_id.in_(op_ids)))
+    results = {row.op_id: {'op_id': row.op_id, 'status': row.status, 'result': json.loads(row.result),
+                           'replayed': True} for row in recorded}
+
+    for operation in batch.operations:
+        if operation.op_id not in results:
+            results[operation.op_id] = await apply_operation(session, user_id, operation, results)
+    await session.commit()
+    return {'results': [results[op_id] for op_id in op_ids]}
+
+
+@sync_router.get("/sync/changes", status_code=status.HTTP_200_OK)
+async def get_changes(since: int = Query(0, ge=0),
+                      limit: int = Query(SYNC_CHANGES_LIMIT, ge=1, le=SYNC_CHANGES_MAX_LIMIT),
+                      session=Depends(get_read_session)):
+    """
+    Ruta para obtener los cambios del catálogo (áreas de conservación, destinos turísticos y opiniones)
+    posteriores a un cursor. Con since=0 se obtiene el catálogo completo, después se envía el cursor
+    de la respuesta anterior mientras has_more sea verdadero.
+    :param since: cursor de la última respuesta recibida por el cliente.
+    :param limit: cantidad máxima de cambios de la respuesta.
+    :return: cambios ordenados por cursor, con los datos actuales de cada registro (operation upsert) o
+    únicamente su identificador si fue eliminado (operation delete), el cursor del último cambio y
+    has_more verdadero si hay más cambios.
+    """
+    result = await session.execute(select(ModelChangeLog.id, ModelChangeLog.collection, ModelChangeLog.entity_id,
+                                          ModelChangeLog.operation).
+                                   where(ModelChangeLog.id > since).order_by(ModelChangeLog.id).limit(limit + 1))
+    entries = result.all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # se consultan los registros de cada colección con una sola consulta
+    upserts = {}
+    for entry in entries:
+        if entry.operation == UPSERT:
+            upserts.setdefault(entry.collection, []).append(entry.entity_id)
+    rows = {}
+    for collection, ids in upserts.items():
+        model = CHANGE_LOG_MODELS[collection]
+        result = await session.execute(select(*model.__table__.columns).where(model.id.in_(ids)))
+        rows[collection] = {row.id: dict(row._mapping) for row in result}
+
+    changes = []
+    for entry in entries:
+        # un registro que ya no existe se eliminó en un cambio posterior
+        data = rows.get(entry.collection, {}).get(entry.entity_id)
+        changes.append({'cursor': entry.id, 'collection': entry.collection, 'id': entry.entity_id,
+                        'operation': UPSERT if data is not None else DELETE, 'data': data})
+    cursor = entries[-1].id if entries else since
+    return Response(content=dumps({'changes': changes, 'cursor': cursor, 'has_more': has_more}),
+                    media_type="application/json")
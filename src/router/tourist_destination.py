@@ -1,11 +1,15 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException
-from fastapi_sqlalchemy import db
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import func, select
 from fastapi import File, UploadFile, status, Depends
 
 from src.models import TouristDestination as ModelTouristDestination
 from src.schema import TouristDestination as SchemaTouristDestination
+from src.schema import TouristDestinationAggregate as SchemaTouristDestinationAggregate
+
+from src.models import ConservationArea as ModelConservationArea
+from src.models import Review as ModelReview
 
 from src.models import FavoriteDestination as ModelFavoriteDestination
 from src.schema import FavoriteDestination as SchemaFavoriteDestination
@@ -13,22 +17,31 @@ from src.models import VisitedDestination as ModelVisitedDestination
 from src.schema import VisitedDestination as SchemaVisitedDestination
 
 from src import repository
-from src.router.user import select_user
 
-from src.authentication import auth_wrapper
+from src.authentication import auth_wrapper, admin_wrapper
+from src.database import get_session, get_read_session, concurrent_reads
+from src.router.conservation_area import rating_summary
+from src.router.review import formatDate
+from src.settings import settings
+from src.response_cache import response_cache, entity_tags
+from src.conditional import conditional_response
+from src.fast_json import FAST_JSON, ColumnRows, select_list
 
 tourist_destination_router = APIRouter()
 
+# Opiniones incluidas en el detalle de un destino
+DESTINATION_DETAIL_REVIEWS = settings.destination_detail_reviews
+
 
-def select_tourist_destination(tourist_destination_id: int):
+async def select_tourist_destination(session, tourist_destination_id: int):
     """
     Función para buscar un destino turístico en la base de datos mediante un identificador.
+    :param session: sesión de la base de datos.
     :param tourist_destination_id: identificador de un área de conservación.
     :return db_tourist_destination: DAO de un área de conservación.
     :raise Error: no se encontro el identificador.
     """
-    db_tourist_destination = db.session.query(
-        ModelTouristDestination).get(tourist_destination_id)
+    db_tourist_destination = await session.get(ModelTouristDestination, tourist_destination_id)
     if db_tourist_destination is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_tourist_destination
@@ -36,17 +49,14 @@ def select_tourist_destination(tourist_destination_id: int):
 
 @tourist_destination_router.post("/tourist-destination", response_model=SchemaTouristDestination,
                                  status_code=status.HTTP_201_CREATED)
-def add_tourist_destination(tourist_destination: SchemaTouristDestination, user_id=Depends(auth_wrapper)):
+async def add_tourist_destination(tourist_destination: SchemaTouristDestination, user_id=Depends(admin_wrapper),
+                                  session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de un nuevo destino turístico.
     :param tourist_destination: DTO con los datos a almacenar.
     :param user_id: identificador de un usuario administrador encargado de registrar un destino.
     :return: db_tourist_destination DAO de un destino turístico con los datos.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
     db_tourist_destination = ModelTouristDestination(name=tourist_destination.name,
                                                      description=tourist_destination.description,
                                                      schedule=tourist_destination.schedule,
@@ -65,15 +75,17 @@ def add_tourist_destination(tourist_destination: SchemaTouristDestination, user_
                                                      start_season=tourist_destination.start_season,
                                                      end_season=tourist_destination.end_season,
                                                      conservation_area_id=tourist_destination.conservation_area_id)
-    db.session.add(db_tourist_destination)
-    db.session.commit()
+    session.add(db_tourist_destination)
+    await session.commit()
+    await response_cache.invalidate('destinations', 'season',
+                                    f'area:{db_tourist_destination.conservation_area_id}:destinations')
     return db_tourist_destination
 
 
 @tourist_destination_router.post("/tourist-destination/{tourist_destination_id}/photos",
                                  response_model=SchemaTouristDestination, status_code=status.HTTP_201_CREATED)
 async def add_tourist_destination_photos(tourist_destination_id: int, photos: List[UploadFile] = File(...),
-                                         user_id=Depends(auth_wrapper)):
+                                         user_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta para agregar fotografías a un destino turístico.
     :param tourist_destination_id: identificador de un destino turístico.
@@ -81,47 +93,122 @@ async def add_tourist_destination_photos(tourist_destination_id: int, photos: Li
     :param user_id: identificador de un usuario administrador encargado de registrar fotos de un destino.
     :return: db_tourist_destination DAO con los datos actualizados de las rutas de almacenamiento de las imagenes.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_tourist_destination = select_tourist_destination(tourist_destination_id)
+    db_tourist_destination = await select_tourist_destination(session, tourist_destination_id)
 
     new_directory_name = f'{db_tourist_destination.id}_dir'
     photos_path = await repository.add_tourist_destination_photo(new_directory_name, photos)
 
     db_tourist_destination.photos_path = photos_path
-    db.session.commit()
-    db.session.refresh(db_tourist_destination)
+    await session.commit()
+    await session.refresh(db_tourist_destination)
+    await response_cache.invalidate(f'destination:{tourist_destination_id}')
     return db_tourist_destination
 
 
 @tourist_destination_router.get("/tourist-destination", status_code=status.HTTP_200_OK)
-def get_tourist_destination():
+async def get_tourist_destination(request: Request, session=Depends(get_read_session)):
     """
     Ruta para obtener todos los destinos turisticos
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :return: tourist_destination lista con DAO de todos los destinos registrados.
     """
-    tourist_destination = db.session.query(ModelTouristDestination).all()
-    return tourist_destination
+    async def load():
+        tourist_destination = await select_list(session, select(ModelTouristDestination))
+        return tourist_destination, ['destinations'] + entity_tags('destination', tourist_destination)
+
+    return await conditional_response(request, session, ['tourist_destination'], response_cache.respond,
+                                      'tourist-destination', load)
 
 
 @tourist_destination_router.get("/tourist-destination/{tourist_destination_id}",
                                 response_model=SchemaTouristDestination, status_code=status.HTTP_200_OK)
-def get_tourist_destination(tourist_destination_id: int):
+async def get_tourist_destination(tourist_destination_id: int, request: Request, session=Depends(get_read_session)):
     """
     Ruta para obtener un destino turístico mediante identificador.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :param tourist_destination_id: identificador de un destino turístico.
     :return: tourist_destination DAO del destino turístico registrado.
     """
-    tourist_destination = select_tourist_destination(tourist_destination_id)
-    return tourist_destination
+    async def load():
+        tourist_destination = await select_tourist_destination(session, tourist_destination_id)
+        return tourist_destination, [f'destination:{tourist_destination_id}']
+
+    return await conditional_response(request, session, ['tourist_destination'], response_cache.respond,
+                                      f'tourist-destination:{tourist_destination_id}', load, SchemaTouristDestination)
+
+
+@tourist_destination_router.get("/tourist-destination/{tourist_destination_id}/detail",
+                                response_model=SchemaTouristDestinationAggregate, status_code=status.HTTP_200_OK)
+async def get_tourist_destination_detail(tourist_destination_id: int, user_id=Depends(auth_wrapper),
+                                         session=Depends(get_read_session)):
+    """
+    Ruta para obtener en una sola solicitud la pantalla de un destino turístico: el destino, el resumen
+    de su área de conservación y de sus calificaciones, la primera página de opiniones y el estado del
+    usuario (favorito, visitado y su opinión). Reemplaza las solicitudes al destino, /reviews,
+    /user-review, /favorite y /visited; las consultas utilizan índices y se ejecutan de forma concurrente.
+    :param tourist_destination_id: identificador del destino turístico.
+    :param user_id: identificador del usuario.
+    :return: detalle del destino con las DESTINATION_DETAIL_REVIEWS opiniones más recientes.
+    :raise Error 404: el destino no existe.
+    """
+    async def destination(read_session):
+        result = await read_session.execute(select(*ModelTouristDestination.__table__.columns,
+                                                   ModelConservationArea.id.label('area_id'),
+                                                   ModelConservationArea.name.label('area_name'),
+                                                   ModelConservationArea.photos_path.label('area_photos_path')).
+                                            outerjoin(ModelConservationArea, ModelConservationArea.id ==
+                                                      ModelTouristDestination.conservation_area_id).
+                                            where(ModelTouristDestination.id == tourist_destination_id))
+        return result.first()
+
+    async def rating(read_session):
+        result = await read_session.execute(select(func.count(ModelReview.id), func.sum(ModelReview.calification)).
+                                            where(ModelReview.tourist_destination_id == tourist_destination_id))
+        return rating_summary(*result.one())
+
+    async def reviews(read_session):
+        result = await read_session.execute(select(*ModelReview.__table__.columns).
+                                            where(ModelReview.tourist_destination_id == tourist_destination_id).
+                                            order_by(ModelReview.date.desc(), ModelReview.id.desc()).
+                                            limit(DESTINATION_DETAIL_REVIEWS))
+        return [dict(row._mapping, date=formatDate(row.date)) for row in result]
+
+    async def relations(read_session):
+        # identificadores del favorito y del visitado en una sola consulta, cero si no existen
+        favorite = (select(ModelFavoriteDestination.id).
+                    where(ModelFavoriteDestination.user_id == user_id,
+                          ModelFavoriteDestination.tourist_destination_id == tourist_destination_id).
+                    limit(1).scalar_subquery())
+        visited = (select(ModelVisitedDestination.id).
+                   where(ModelVisitedDestination.user_id == user_id,
+                         ModelVisitedDestination.tourist_destination_id == tourist_destination_id).
+                   limit(1).scalar_subquery())
+        result = await read_session.execute(select(func.coalesce(favorite, 0), func.coalesce(visited, 0)))
+        return result.one()
+
+    async def user_review(read_session):
+        result = await read_session.execute(select(*ModelReview.__table__.columns).
+                                            where(ModelReview.user_id == user_id,
+                                                  ModelReview.tourist_destination_id == tourist_destination_id).
+                                            limit(1))
+        row = result.first()
+        return dict(row._mapping) if row is not None else None
+
+    row, rating_result, review_list, (favorite_id, visited_id), review = await concurrent_reads(
+        session, destination, rating, reviews, relations, user_review)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    item = dict(row._mapping)
+    area = {'id': item.pop('area_id'), 'name': item.pop('area_name'), 'photos_path': item.pop('area_photos_path')}
+    return dict(item, rating=rating_result, conservation_area=area if area['id'] is not None else None,
+                reviews=review_list, user={'favorite_id': favorite_id, 'visited_id': visited_id, 'review': review})
 
 
 @tourist_destination_router.post("/tourist-destination/update/{tourist_destination_id}",
                                  response_model=SchemaTouristDestination, status_code=status.HTTP_200_OK)
-def update_tourist_destination(tourist_destination_id: int, tourist_destination: SchemaTouristDestination,
-                               user_id=Depends(auth_wrapper)):
+async def update_tourist_destination(tourist_destination_id: int, tourist_destination: SchemaTouristDestination,
+                                     user_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta para actualizar los datos de un destino turístico.
     :param tourist_destination_id: identificador del destino turístico.
@@ -129,11 +216,8 @@ def update_tourist_destination(tourist_destination_id: int, tourist_destination:
     :param user_id: identificador de un usuario administrador encargado de actualizar un destino.
     :return: db_tourist_destination DAO con los datos actualizados.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_tourist_destination = select_tourist_destination(tourist_destination_id)
+    db_tourist_destination = await select_tourist_destination(session, tourist_destination_id)
+    season = (db_tourist_destination.start_season, db_tourist_destination.end_season)
 
     db_tourist_destination.name = tourist_destination.name
     db_tourist_destination.description = tourist_destination.description
@@ -153,15 +237,19 @@ def update_tourist_destination(tourist_destination_id: int, tourist_destination:
     db_tourist_destination.start_season = tourist_destination.start_season
     db_tourist_destination.end_season = tourist_destination.end_season
 
-    db.session.commit()
-    db.session.refresh(db_tourist_destination)
+    await session.commit()
+    await session.refresh(db_tourist_destination)
+    tags = [f'destination:{tourist_destination_id}']
+    if season != (db_tourist_destination.start_season, db_tourist_destination.end_season):
+        tags.append('season')
+    await response_cache.invalidate(*tags)
     return db_tourist_destination
 
 
 @tourist_destination_router.post("/tourist-destination/update/{tourist_destination_id}/photos",
                                  response_model=SchemaTouristDestination, status_code=status.HTTP_200_OK)
 async def update_tourist_destination_photos(tourist_destination_id: int, photos: List[UploadFile] = File(...),
-                                            user_id=Depends(auth_wrapper)):
+                                            user_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Ruta para actualizar las fotografías asociadas a un destino turístico.
     :param tourist_destination_id: identificador del destino turístico.
@@ -169,94 +257,86 @@ async def update_tourist_destination_photos(tourist_destination_id: int, photos:
     :param user_id: identificador de un usuario administrador encargado de actualizar las fotos de un destino.
     :return: db_tourist_destination DAO con las rutas de las fotografías actualizadas.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_tourist_destination = select_tourist_destination(tourist_destination_id)
+    db_tourist_destination = await select_tourist_destination(session, tourist_destination_id)
 
     directory_name = f'{db_tourist_destination.id}_dir'
     photos_path = await repository.update_tourist_destination_photo(db_tourist_destination.photos_path,
                                                                     directory_name, photos)
 
     db_tourist_destination.photos_path = photos_path
-    db.session.commit()
-    db.session.refresh(db_tourist_destination)
+    await session.commit()
+    await session.refresh(db_tourist_destination)
+    await response_cache.invalidate(f'destination:{tourist_destination_id}')
     return db_tourist_destination
 
 
 @tourist_destination_router.delete("/tourist-destination/{tourist_destination_id}",
                                    status_code=status.HTTP_200_OK)
-async def delete_tourist_destination(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def delete_tourist_destination(tourist_destination_id: int, user_id=Depends(admin_wrapper),
+                                     session=Depends(get_session)):
     """
     Ruta utilizada para eliminar todos los datos asociados a un destino turístico.
     :param tourist_destination_id: identificador del destino turístico a eliminar.
     :param user_id: identificador de un usuario administrador encargado de eliminar un destino.
     :return: boolean Verdadedo si se completa correctamente.
     """
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_tourist_destination = select_tourist_destination(tourist_destination_id)
+    db_tourist_destination = await select_tourist_destination(session, tourist_destination_id)
 
     await repository.delete_tourist_destination_photo(db_tourist_destination.id)
 
-    db.session.delete(db_tourist_destination)
-    db.session.commit()
+    await session.delete(db_tourist_destination)
+    await session.commit()
+    await response_cache.invalidate(f'destination:{tourist_destination_id}')
     return True
 
 
-def select_favorite_destination(favorite_destination_id: int):
+async def select_favorite_destination(session, favorite_destination_id: int):
     """
     Función para buscar la información de un destino marcado como favorito para un usuario.
+    :param session: sesión de la base de datos.
     :param favorite_destination_id: Identificador de la relación.
     :return: db_favorite_destination Información del destino marcada como favorito.
     """
-    db_favorite_destination = db.session.query(
-        ModelFavoriteDestination).get(favorite_destination_id)
+    db_favorite_destination = await session.get(ModelFavoriteDestination, favorite_destination_id)
     if db_favorite_destination is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_favorite_destination
 
 
 @tourist_destination_router.get('/tourist-destination/all/favorite')
-def get_favorite_destinations(user_id=Depends(auth_wrapper)):
+async def get_favorite_destinations(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para buscar los destinos favoritos de un usuario.
     :param user_id: Identificador del usuario.
     :return: tourist_destinations Lista de destinos favoritos.
     """
-    favorite_destinations = []
-    for favorite_destination in db.session.query(ModelFavoriteDestination). \
-            filter(ModelFavoriteDestination.user_id == user_id).all():
-        favorite_destinations.append(favorite_destination)
-
-    def getIds(item):
-        return [item.tourist_destination_id, item.id]
-
-    favorite_destinations_id = list(map(getIds, favorite_destinations))
-
+    # se unen los destinos con las relaciones del usuario para no recorrer todos los destinos, si un destino
+    # se marcó más de una vez se utiliza la primera relación
+    result = await session.execute(select(ModelTouristDestination, ModelFavoriteDestination.id)
+                                   .join(ModelFavoriteDestination,
+                                         ModelFavoriteDestination.tourist_destination_id == ModelTouristDestination.id)
+                                   .where(ModelFavoriteDestination.user_id == user_id)
+                                   .order_by(ModelTouristDestination.id, ModelFavoriteDestination.id))
     tourist_destinations = []
-    for tourist_destination in db.session.query(ModelTouristDestination).all():
-        for i in range(len(favorite_destinations_id)):
-            if tourist_destination.id == favorite_destinations_id[i][0]:
-                tourist_destination.favorite_id = favorite_destinations_id[i][1]
-                tourist_destinations.append(tourist_destination)
-                break
+    for tourist_destination, favorite_id in result:
+        if tourist_destinations and tourist_destinations[-1].id == tourist_destination.id:
+            continue
+        tourist_destination.favorite_id = favorite_id
+        tourist_destinations.append(tourist_destination)
     return tourist_destinations
 
 
 @tourist_destination_router.get('/tourist-destination/{tourist_destination_id}/favorite')
-def get_favorite_destination_id(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def get_favorite_destination_id(tourist_destination_id: int, user_id=Depends(auth_wrapper),
+                                      session=Depends(get_session)):
     """
     Función para identificar si un destino está marcado como favorito.
     :param tourist_destination_id: Identificador del destino turístico.
     :param user_id: Identificador del usuario.
     :return: El identificador de la relación o cero.
     """
-    for favorite_destination in db.session.query(ModelFavoriteDestination). \
-            filter(ModelFavoriteDestination.user_id == user_id).all():
+    result = await session.execute(select(ModelFavoriteDestination).where(ModelFavoriteDestination.user_id == user_id))
+    for favorite_destination in result.scalars():
         if favorite_destination.tourist_destination_id == tourist_destination_id:
             return favorite_destination.id
 
@@ -265,7 +345,8 @@ def get_favorite_destination_id(tourist_destination_id: int, user_id=Depends(aut
 
 @tourist_destination_router.post('/tourist-destination/{tourist_destination_id}/favorite',
                                  response_model=SchemaFavoriteDestination, status_code=status.HTTP_201_CREATED)
-def add_favorite_destination(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def add_favorite_destination(tourist_destination_id: int, user_id=Depends(auth_wrapper),
+                                   session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de un nuevo destino favorito.
     :param tourist_destination_id: Identificador del destino turístico.
@@ -275,80 +356,77 @@ def add_favorite_destination(tourist_destination_id: int, user_id=Depends(auth_w
     db_favorite_destination = ModelFavoriteDestination(user_id=user_id,
                                                        tourist_destination_id=tourist_destination_id)
 
-    db.session.add(db_favorite_destination)
-    db.session.commit()
+    session.add(db_favorite_destination)
+    await session.commit()
     return db_favorite_destination
 
 
 @tourist_destination_router.delete('/tourist-destination/all/favorite/{favorite_destination_id}',
                                    status_code=status.HTTP_200_OK)
-def delete_favorite_destination(favorite_destination_id: int, user_id=Depends(auth_wrapper)):
+async def delete_favorite_destination(favorite_destination_id: int, user_id=Depends(auth_wrapper),
+                                      session=Depends(get_session)):
     """
     Ruta utilizada para eliminar un destino favorita.
     :param favorite_destination_id: identificador del destino.
     :param user_id: Identificador del usuario.
     :return: boolean Verdadero si fue correctamente eliminado.
     """
-    db_favorite_destination = select_favorite_destination(
-        favorite_destination_id)
+    db_favorite_destination = await select_favorite_destination(session, favorite_destination_id)
     if db_favorite_destination.user_id != user_id:
         return False
 
-    db.session.delete(db_favorite_destination)
-    db.session.commit()
+    await session.delete(db_favorite_destination)
+    await session.commit()
     return True
 
 
-def select_visited_destination(visited_destination_id: int):
+async def select_visited_destination(session, visited_destination_id: int):
     """
     Función para buscar la información de un destino marcado como visitado para un usuario.
+    :param session: sesión de la base de datos.
     :param visited_destination_id: Identificador de la relación.
     :return: db_visited_destination Información del destino marcada como visitado.
     """
-    db_visited_destination = db.session.query(
-        ModelVisitedDestination).get(visited_destination_id)
+    db_visited_destination = await session.get(ModelVisitedDestination, visited_destination_id)
     if db_visited_destination is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return db_visited_destination
 
 
 @tourist_destination_router.get('/tourist-destination/all/visited')
-def get_visited_destinations(user_id=Depends(auth_wrapper)):
+async def get_visited_destinations(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para buscar los destinos visitados por un usuario.
     :param user_id: Identificador del usuario.
     :return: tourist_destinations Lista de destinos visitados.
     """
-    visited_destinations = []
-    for visited_destination in db.session.query(ModelVisitedDestination). \
-            filter(ModelVisitedDestination.user_id == user_id).all():
-        visited_destinations.append(visited_destination)
-
-    def getIds(item):
-        return [item.tourist_destination_id, item.id]
-
-    visited_destinations_id = list(map(getIds, visited_destinations))
-
+    # se unen los destinos con las relaciones del usuario para no recorrer todos los destinos, si un destino
+    # se marcó más de una vez se utiliza la primera relación
+    result = await session.execute(select(ModelTouristDestination, ModelVisitedDestination.id)
+                                   .join(ModelVisitedDestination,
+                                         ModelVisitedDestination.tourist_destination_id == ModelTouristDestination.id)
+                                   .where(ModelVisitedDestination.user_id == user_id)
+                                   .order_by(ModelTouristDestination.id, ModelVisitedDestination.id))
     tourist_destinations = []
-    for tourist_destination in db.session.query(ModelTouristDestination).all():
-        for i in range(len(visited_destinations_id)):
-            if tourist_destination.id == visited_destinations_id[i][0]:
-                tourist_destination.visited_id = visited_destinations_id[i][1]
-                tourist_destinations.append(tourist_destination)
-                break
+    for tourist_destination, visited_id in result:
+        if tourist_destinations and tourist_destinations[-1].id == tourist_destination.id:
+            continue
+        tourist_destination.visited_id = visited_id
+        tourist_destinations.append(tourist_destination)
     return tourist_destinations
 
 
 @tourist_destination_router.get('/tourist-destination/{tourist_destination_id}/visited')
-def get_visited_destination_id(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def get_visited_destination_id(tourist_destination_id: int, user_id=Depends(auth_wrapper),
+                                     session=Depends(get_session)):
     """
     Función para identificar si un destino está marcado como visitado.
     :param tourist_destination_id: Identificador del destino turístico.
     :param user_id: Identificador del usuario.
     :return: El identificador de la relación o cero.
     """
-    for favorite_destination in db.session.query(ModelVisitedDestination).filter(
-            ModelVisitedDestination.user_id == user_id).all():
+    result = await session.execute(select(ModelVisitedDestination).where(ModelVisitedDestination.user_id == user_id))
+    for favorite_destination in result.scalars():
         if favorite_destination.tourist_destination_id == tourist_destination_id:
             return favorite_destination.id
 
@@ -357,7 +435,8 @@ def get_visited_destination_id(tourist_destination_id: int, user_id=Depends(auth
 
 @tourist_destination_router.post('/tourist-destination/{tourist_destination_id}/visited',
                                  response_model=SchemaVisitedDestination, status_code=status.HTTP_201_CREATED)
-def add_visited_destination(tourist_destination_id: int, user_id=Depends(auth_wrapper)):
+async def add_visited_destination(tourist_destination_id: int, user_id=Depends(auth_wrapper),
+                                  session=Depends(get_session)):
     """
     Ruta utilizada para agregar información de un nuevo destino favorito.
     :param tourist_destination_id: Identificador del destino turístico.
@@ -367,56 +446,62 @@ def add_visited_destination(tourist_destination_id: int, user_id=Depends(auth_wr
     db_visited_destination = ModelVisitedDestination(user_id=user_id,
                                                      tourist_destination_id=tourist_destination_id)
 
-    db.session.add(db_visited_destination)
-    db.session.commit()
+    session.add(db_visited_destination)
+    await session.commit()
     return db_visited_destination
 
 
 @tourist_destination_router.delete('/tourist-destination/all/visited/{visited_destination_id}',
                                    status_code=status.HTTP_200_OK)
-def delete_visited_destination(visited_destination_id: int, user_id=Depends(auth_wrapper)):
+async def delete_visited_destination(visited_destination_id: int, user_id=Depends(auth_wrapper),
+                                     session=Depends(get_session)):
     """
     Ruta utilizada para eliminar un destino favorita.
     :param visited_destination_id: identificador del destino favorito.
     :param user_id: Identificador del usuario.
     :return: boolean Verdadero si fue correctamente eliminado.
     """
-    db_visited_destination = select_visited_destination(
-        visited_destination_id)
+    db_visited_destination = await select_visited_destination(session, visited_destination_id)
     if db_visited_destination.user_id != user_id:
         return False
 
-    db.session.delete(db_visited_destination)
-    db.session.commit()
+    await session.delete(db_visited_destination)
+    await session.commit()
     return True
 
 
 @tourist_destination_router.get("/tourist-destination/conservation-area/{conservation_area_id}")
-def get_tourist_destination_by_conservation_area_id(conservation_area_id: int):
+async def get_tourist_destination_by_conservation_area_id(conservation_area_id: int, request: Request,
+                                                          session=Depends(get_read_session)):
     """
     Ruta que resuelve todos los destinos turísticos que pertenecen a
     una misma área de conservación.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
     :param conservation_area_id: identificador del área de conservación a obtener los destinos.
     :return: arreglo con los destinos asociados al área.
     """
-    tourist_destinations = db.session.query(ModelTouristDestination). \
-        filter(ModelTouristDestination.conservation_area_id == conservation_area_id).all()
-    return tourist_destinations
+    async def load():
+        tourist_destinations = await select_list(session, select(ModelTouristDestination).
+                                                 where(ModelTouristDestination.conservation_area_id ==
+                                                       conservation_area_id))
+        return tourist_destinations, ([f'area:{conservation_area_id}:destinations'] +
+                                      entity_tags('destination', tourist_destinations))
 
+    return await conditional_response(request, session, ['tourist_destination'], response_cache.respond,
+                                      f'tourist-destination:area:{conservation_area_id}', load)
 
-@tourist_destination_router.get("/tourist-destination/season/{current_month}")
-async def get_tourist_destinations_of_season(current_month: int):
+
+async def select_season_destinations(session, current_month: int, fast=False):
     """
-    Ruta utilizada para obtener los destinos que se encuentren en temporada en un
-    mes en especifico del año, los destinos tienen un mes de inicio y finalización
-    de temporada, por lo que se valida si inicia y finaliza un mismo año o no.
+    Función para obtener los destinos que se encuentren en temporada en un mes en especifico del año,
+    los destinos tienen un mes de inicio y finalización de temporada, por lo que se valida si inicia
+    y finaliza un mismo año o no.
+    :param session: sesión de la base de datos.
     :param current_month: número del mes actual del año
+    :param fast: verdadero para obtener filas de columnas en lugar de DAO.
     :return: arreglo con los destinos que se encuentren en temporada
-    :raise error HTTP 400: si el número de mes actual es mayor a 12.
     """
-    if current_month > 12:
-        raise HTTPException(status_code=400, detail="Bad Request, month < 12")
-    tourist_destinations = db.session.query(ModelTouristDestination).all()
+    tourist_destinations = await select_list(session, select(ModelTouristDestination), fast)
     response = []
     for destination in tourist_destinations:
         init_month = destination.start_season
@@ -427,4 +512,28 @@ async def get_tourist_destinations_of_season(current_month: int):
             response.append(destination)
         elif final_month < init_month and not (final_month < current_month < init_month):
             response.append(destination)
+    if isinstance(tourist_destinations, ColumnRows):
+        return tourist_destinations.subset(response)
     return response
+
+
+@tourist_destination_router.get("/tourist-destination/season/{current_month}")
+async def get_tourist_destinations_of_season(current_month: int, request: Request,
+                                             session=Depends(get_read_session)):
+    """
+    Ruta utilizada para obtener los destinos que se encuentren en temporada en un
+    mes en especifico del año.
+    :param request: solicitud HTTP, utilizada para responder solicitudes condicionales.
+    :param current_month: número del mes actual del año
+    :return: arreglo con los destinos que se encuentren en temporada
+    :raise error HTTP 400: si el número de mes actual es mayor a 12.
+    """
+    if current_month > 12:
+        raise HTTPException(status_code=400, detail="Bad Request, month < 12")
+
+    async def load():
+        tourist_destinations = await select_season_destinations(session, current_month, FAST_JSON)
+        return tourist_destinations, ['season'] + entity_tags('destination', tourist_destinations)
+
+    return await conditional_response(request, session, ['tourist_destination'], response_cache.respond,
+                                      f'tourist-destination:season:{current_month}', load)
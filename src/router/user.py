@@ -1,40 +1,53 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi_sqlalchemy import db
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from fastapi import status
+from sqlalchemy import func, select
 
-from src.authentication import verify_password, encode_token, get_password_hash, auth_wrapper
+from src.authentication import check_password, encode_token, hash_password, auth_wrapper, admin_wrapper
+from src.authentication import encode_refresh_token, decode_refresh_token, password_executor, token_cache
+from src.authentication import ACCESS_TOKEN_MINUTES, claims_wrapper, revoke_token, revoke_user_sessions
+from src.database import concurrent_reads, get_session
+from src.models import Profile as ModelProfile
 from src.models import User as ModelUser
+from src.pagination import ADMIN_PAGE_LIMIT, ADMIN_PAGE_MAX_LIMIT, approximate_count, like_pattern, page_headers
+from src.pagination import page_statement, split_page
 from src.router.profile import select_profile_by_user_id
-from src.reset_password import new_password_generator, send_email
+from src.reset_password import hold_email, new_password_generator, outbox
+from src.revocation import revocation_list
 from src.schema import Authentication as SchemaAuthentication
+from src.schema import RefreshToken as SchemaRefreshToken
 from src.schema import User as SchemaUser
+from src.throttling import login_succeeded, throttle, throttle_reset, throttling_stats
 
 user = APIRouter()
 
 
-def select_user(user_id: int):
+async def select_user(session, user_id: int):
     """
     Función para buscar los usuarios mediante el identificador en la base de datos.
+    :param session: sesión de la base de datos.
     :param user_id: identificador
     :return db_user: información del usuario
     :raise Error 404: el usuario no se encontro
     """
-    db_user = db.session.query(ModelUser).get(user_id)
+    db_user = await session.get(ModelUser, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 
-def select_user_by_email(email: str):
+async def select_user_by_email(session, email: str):
     """
     Funcion para buscar usuarios por correo electronico.
+    :param session: sesión de la base de datos.
     :param email: correo del usuario que se busca
     :return: usuario cuyo correo coincida
     :raise error  404:, no se encontro un usuario
     """
     try:
-        db_user = db.session.query(ModelUser).filter(
-            ModelUser.email == email).one()
+        result = await session.execute(select(ModelUser).where(ModelUser.email == email))
+        db_user = result.scalars().one()
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found")
         return db_user
@@ -42,159 +55,288 @@ def select_user_by_email(email: str):
         raise HTTPException(status_code=400, detail="User not found")
 
 
+async def select_profile_id(session, user_id: int):
+    """
+    Función para obtener el identificador del perfil de un usuario, utilizado en el contenido de los tokens.
+    :param session: sesión de la base de datos.
+    :param user_id: identificador del usuario.
+    :return: identificador del perfil o None si el usuario no tiene perfil.
+    """
+    result = await session.execute(select(ModelProfile.id).where(ModelProfile.user_id == user_id).limit(1))
+    return result.scalar()
+
+
+async def create_tokens(session, db_user):
+    """
+    Función para generar el token de acceso, con el rol y perfil del usuario, y el token de refresco.
+    :param session: sesión de la base de datos.
+    :param db_user: DAO del usuario.
+    :return: diccionario con los tokens y el tipo correspondiente.
+    """
+    profile_id = await select_profile_id(session, db_user.id)
+    access_token = encode_token(db_user.id, bool(db_user.admin), profile_id)
+    return {'token': access_token, 'token_type': 'bearer', 'refresh_token': encode_refresh_token(db_user.id),
+            'expires_in': ACCESS_TOKEN_MINUTES * 60}
+
+
 @user.post("/find-user", status_code=status.HTTP_200_OK)
-def find_profile_by_email(auth: SchemaAuthentication):
+async def find_profile_by_email(auth: SchemaAuthentication, session=Depends(get_session)):
     """
     Ruta para obtener el perfil de un usuario, apartir del correo de un usuario.
     :param auth: credenciales con el correo del usuario.
     :return: esquema con el perfil del usuario
     :raise Error 404: Error no se encuentra un usuario
     """
-    db_user = select_user_by_email(auth.email)
+    db_user = await select_user_by_email(session, auth.email)
     if db_user is None:
         return HTTPException(status_code=400, detail="Email not found")
-    return select_profile_by_user_id(db_user.id)
+    return await select_profile_by_user_id(session, db_user.id)
 
 
 @user.post("/reset-password", status_code=status.HTTP_200_OK)
-async def reset_password(auth: SchemaAuthentication):
+async def reset_password(auth: SchemaAuthentication, request: Request, session=Depends(get_session)):
     """
     Funcionalidad para solicitar una nueva contraseña al correo electrónico para los usuarios registrados.
     :param auth: esquema con el correo del usuario al que se desea cambiar la contraseña.
+    :param request: solicitud HTTP, utilizada para limitar los intentos por dirección IP.
     :return: estado del envío de la nueva contraseña, una expección en caso de no encontrar el correo.
+    :raise Error 429: se excedió el número de intentos permitidos.
+    :raise Error 503: la bandeja de salida de correos se encuentra llena, la contraseña no se modifica.
     """
-    db_user = select_user_by_email(auth.email)
+    throttle_reset(request, auth.email)
+    db_user = await select_user_by_email(session, auth.email)
     if db_user is None:
         return HTTPException(status_code=400, detail="Email not found")
     new_password = new_password_generator()
-    hashed_password = get_password_hash(new_password)
-    db_user.password = hashed_password
-    db.session.commit()
-    db.session.refresh(db_user)
-    return await send_email(db_user.email, {"password": new_password})
+    hashed_password = await hash_password(new_password)
+    # el correo se reserva antes de guardar la contraseña y se envía solo si la transacción se confirma
+    message = await hold_email(db_user.email, {"password": new_password})
+    try:
+        db_user.password = hashed_password
+        await session.commit()
+    except BaseException:
+        outbox.discard(message)
+        raise
+    outbox.release(message)
+    return {"status_code": "200", "message": "Email has been queued"}
 
 
 @user.post("/login", status_code=status.HTTP_200_OK)
-def login(auth: SchemaAuthentication):
+async def login(auth: SchemaAuthentication, request: Request, session=Depends(get_session)):
     """
     Función para iniciar sesión y acceder a los endpoint de los usuarios de
     la aplicación movil, se genera un token para que acceda a las funciones correspondientes.
+    La verificación de la contraseña se realiza en el conjunto de hilos dedicado a bcrypt.
     :param auth: credenciales utilizadas para iniciar sesión
-    :return: esquema con el token y el tipo correspondiente
+    :param request: solicitud HTTP, utilizada para limitar los intentos por dirección IP.
+    :return: esquema con el token de acceso, el token de refresco y el tipo correspondiente
     :raise Error HTTP 400: el correo o contraseña no funcionan
+    :raise Error HTTP 429: se excedió el número de intentos permitidos.
     """
-    db_user = select_user_by_email(auth.email)
+    throttle(request, auth.email)
+    db_user = await select_user_by_email(session, auth.email)
 
-    if (db_user is None) or (not verify_password(auth.password, db_user.password)):
+    if (db_user is None) or (not await check_password(auth.password, db_user.password)):
         return HTTPException(status_code=400, detail="Email or Password not found")
     else:
-        access_token = encode_token(db_user.id)
-        return {'token': access_token, 'token_type': 'bearer'}
+        login_succeeded(auth.email)
+        return await create_tokens(session, db_user)
+
+
+@user.post("/refresh", status_code=status.HTTP_200_OK)
+async def refresh(refresh_schema: SchemaRefreshToken, session=Depends(get_session)):
+    """
+    Función para obtener un nuevo token de acceso a partir de un token de refresco, el rol y
+    el perfil del usuario se leen nuevamente de la base de datos. El token de refresco utilizado
+    se revoca y se entrega uno nuevo.
+    :param refresh_schema: esquema con el token de refresco.
+    :return: esquema con los nuevos tokens y el tipo correspondiente
+    :raise Error HTTP 401: el token de refresco es invalido, fue revocado o ya expiro.
+    :raise Error HTTP 404: el usuario no se encontro
+    """
+    payload = await decode_refresh_token(refresh_schema.refresh_token)
+    db_user = await select_user(session, payload['sub'])
+    await revoke_token(payload)
+    return await create_tokens(session, db_user)
+
+
+@user.post("/logout", status_code=status.HTTP_200_OK)
+async def logout(refresh_schema: Optional[SchemaRefreshToken] = None, claims=Depends(claims_wrapper)):
+    """
+    Función para cerrar la sesión de un usuario, revoca el token de acceso utilizado y, si se
+    envía, el token de refresco de la sesión.
+    :param refresh_schema: esquema con el token de refresco de la sesión (opcional).
+    :param claims: contenido del token de acceso del usuario.
+    :return: verdadero si la sesión se cerró correctamente.
+    """
+    await revoke_token(claims)
+    if refresh_schema:
+        refresh_payload = await decode_refresh_token(refresh_schema.refresh_token)
+        if refresh_payload['sub'] == claims['sub']:
+            await revoke_token(refresh_payload)
+    return True
+
+
+@user.post("/revoke-sessions", status_code=status.HTTP_200_OK)
+async def revoke_personal_sessions(user_id=Depends(auth_wrapper)):
+    """
+    Función para que un usuario cierre todas sus sesiones, en todos sus dispositivos.
+    :param user_id: credenciales del usuario.
+    :return: verdadero si las sesiones se revocaron correctamente.
+    """
+    await revoke_user_sessions(user_id)
+    return True
+
+
+@user.post("/revoke-sessions/{user_id}", status_code=status.HTTP_200_OK)
+async def revoke_sessions_by_id(user_id: int, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
+    """
+    Función para que un administrador cierre todas las sesiones de un usuario.
+    :param user_id: identificador del usuario.
+    :param admin_id: credenciales de un usuario administrador.
+    :return: verdadero si las sesiones se revocaron correctamente.
+    """
+    await select_user(session, user_id)
+    await revoke_user_sessions(user_id)
+    return True
 
 
 @user.get("/users", status_code=status.HTTP_200_OK)
-def get_users(admin_id=Depends(auth_wrapper)):
+async def get_users(response: Response, email: Optional[str] = None, after: int = Query(0, ge=0),
+                    limit: int = Query(ADMIN_PAGE_LIMIT, ge=1, le=ADMIN_PAGE_MAX_LIMIT),
+                    admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
-    Función utilizada para obtener todos los usuarios registrados en la base de datos.
+    Función utilizada para obtener los usuarios registrados en la base de datos, por páginas ordenadas
+    por identificador. La página siguiente se solicita con el encabezado X-Next-After de la respuesta,
+    la primera página incluye el total aproximado en X-Total-Count.
+    :param response: respuesta HTTP, utilizada para los encabezados de la paginación.
+    :param email: prefijo del correo de los usuarios, sin distinguir mayúsculas y minúsculas.
+    :param after: identificador del último usuario de la página anterior.
+    :param limit: cantidad de usuarios de la página.
     :param admin_id: identificador del usuario administrador que obtiene los usuarios.
-    :return: Una lista con todos los datos de los usuarios registrados.
+    :return: Una lista con los datos de los usuarios de la página.
     :raise Error 401: No tiene permisos.
+    :raise Error 404: no hay usuarios registrados.
     """
-    db_user = select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
+    statement = select(ModelUser)
+    if email:
+        statement = statement.where(func.lower(ModelUser.email).like(like_pattern(email.lower()), escape='\\'))
+
+    async def page(page_session):
+        result = await page_session.execute(page_statement(statement, ModelUser.id, after, limit))
+        return result.scalars().all()
 
-    db_users = db.session.query(ModelUser).all()
-    if not db_users:
+    async def count(count_session):
+        return await approximate_count(count_session, statement, ModelUser.__table__, bool(email))
+
+    # el total se calcula únicamente en la primera página, al mismo tiempo que la página
+    results = await concurrent_reads(session, page, *([count] if not after else []))
+    db_users, next_after = split_page(results[0], limit)
+    if not db_users and not email and not after:
         raise HTTPException(status_code=404, detail="Users not found")
+    page_headers(response, next_after, *(results[1] if len(results) > 1 else (None, None)))
     return db_users
 
 
+@user.get("/auth/stats", status_code=status.HTTP_200_OK)
+async def get_auth_stats(admin_id=Depends(admin_wrapper)):
+    """
+    Función para obtener las métricas de la ruta de autenticación: cachés, cola de hashes y limitación de intentos.
+    :param admin_id: identificador del usuario administrador.
+    :return: diccionario con las métricas.
+    :raise Error 401: No tiene permisos.
+    """
+    return {
+        'token_cache': token_cache.stats(),
+        'revocation_list': revocation_list.stats(),
+        'password_executor': password_executor.stats(),
+        'throttling': throttling_stats(),
+    }
+
+
 @user.get("/user", response_model=SchemaUser, status_code=status.HTTP_200_OK)
-def get_user(user_id=Depends(auth_wrapper)):
+async def get_user(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función para obtener un usuario apartir de las credenciales
     :param user_id: token asociado a un usuario
     :return: datos del usuario del identificador
     """
-    db_user = select_user(user_id)
+    db_user = await select_user(session, user_id)
     return db_user
 
 
 @user.get("/user/{user_id}", response_model=SchemaUser, status_code=status.HTTP_200_OK)
-def get_user_by_id(user_id=Depends(auth_wrapper), admin_id=Depends(auth_wrapper)):
+async def get_user_by_id(user_id: int, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Función para obtener un usuario apartir de las credenciales
     :param user_id: identificador del usuario
     :param admin_id: token asociado a un usuario administrador
     :return: datos del usuario del identificador
     """
-    db_user = select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_user = select_user(user_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    db_user = select_user(user_id)
+    db_user = await select_user(session, user_id)
     return db_user
 
 
 @user.post("/add-user", response_model=SchemaUser, status_code=status.HTTP_201_CREATED)
-def add_user(user_schema: SchemaUser):
+async def add_user(user_schema: SchemaUser, session=Depends(get_session)):
     """
     Función utilizada para agregar nuevos usuarios a la base de datos desde la aplicación movil.
     :param user_schema: esquema con los datos asociados a un usuario.
     :return: DTO datos del usuario registrados.
     """
+    hashed_password = await hash_password(user_schema.password)
     try:
-        hashed_password = get_password_hash(user_schema.password)
-
         db_user = ModelUser(
             email=user_schema.email, password=hashed_password, admin=user_schema.admin)
-        db.session.add(db_user)
-        db.session.commit()
+        session.add(db_user)
+        await session.commit()
         return db_user
 
     except:
         raise HTTPException(status_code=400, detail="User already exists")
 
 
-def update_user(user_schema: SchemaUser, user_id: int):
+async def update_user(session, user_schema: SchemaUser, user_id: int):
     """
-    Función para actualizar un usuario de la base de datos.
+    Función para actualizar un usuario de la base de datos. Si cambia el rol de administrador se
+    revocan las sesiones del usuario, ya que sus tokens tienen el rol anterior firmado.
+    :param session: sesión de la base de datos.
     :param user_id: identificador del usuario actualizado.
     :param user_schema: DTO con los datos del usuario.
     :return: DAO con los nuevos datos.
     """
-    db_user = select_user(user_id)
+    db_user = await select_user(session, user_id)
 
     if user_schema.password:
-        hashed_password = get_password_hash(user_schema.password)
+        hashed_password = await hash_password(user_schema.password)
         db_user.password = hashed_password
     if user_schema.email:
         db_user.email = user_schema.email
+    role_changed = bool(db_user.admin) != bool(user_schema.admin)
     db_user.admin = user_schema.admin
 
-    db.session.commit()
-    db.session.refresh(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    if role_changed:
+        await revoke_user_sessions(user_id)
     return db_user
 
 
 @user.post("/update-user", response_model=SchemaUser, status_code=status.HTTP_200_OK)
-def update_personal_user(user_schema: SchemaUser, user_id=Depends(auth_wrapper)):
+async def update_personal_user(user_schema: SchemaUser, user_id=Depends(auth_wrapper),
+                               session=Depends(get_session)):
     """
     Función utilizada para actualizar un usuario de la base de datos.
     :param user_schema: esquema con los datos asociados a un usuario, los valores nuevos seran actualizados.
     :param user_id: credenciales de un usuario (Token JWT).
     :return: usuario con los datos actualizados.
     """
-    return update_user(user_schema, user_id)
+    return await update_user(session, user_schema, user_id)
 
 
 @user.post("/update-user/{user_id}", response_model=SchemaUser, status_code=status.HTTP_200_OK)
-def update_user_by_id(user_id: int, user_schema: SchemaUser, admin_id=Depends(auth_wrapper)):
+async def update_user_by_id(user_id: int, user_schema: SchemaUser, admin_id=Depends(admin_wrapper),
+                            session=Depends(get_session)):
     """
     Función utilizada para actualizar un usuario de la base de datos.
     :param user_id: identificador del usuario que va actualizar
@@ -202,41 +344,34 @@ def update_user_by_id(user_id: int, user_schema: SchemaUser, admin_id=Depends(au
     :param admin_id: credenciales de un usuario administrador.
     :return: usuario con los datos actualizados.
     """
-    db_user = select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
+    return await update_user(session, user_schema, user_id)
 
-    return update_user(user_schema, user_id)
 
+async def delete_user(session, user_id: int):
+    db_user = await select_user(session, user_id)
 
-def delete_user(user_id: int):
-    db_user = select_user(user_id)
-
-    db.session.delete(db_user)
-    db.session.commit()
+    await session.delete(db_user)
+    await session.commit()
+    await revoke_user_sessions(user_id)
     return True
 
 
 @user.delete("/delete-user", status_code=status.HTTP_200_OK)
-async def delete_personal_user(user_id=Depends(auth_wrapper)):
+async def delete_personal_user(user_id=Depends(auth_wrapper), session=Depends(get_session)):
     """
     Función utilizada en la aplicación movil, para que un usuario pueda eliminar su usuario.
     :param user_id: credenciales del usuario.
     :return: verdadero en caso de cumplirse.
     """
-    return delete_user(user_id)
+    return await delete_user(session, user_id)
 
 
 @user.delete("/delete-user/{user_id}", status_code=status.HTTP_200_OK)
-async def delete_user_by_id(user_id: int, admin_id=Depends(auth_wrapper)):
+async def delete_user_by_id(user_id: int, admin_id=Depends(admin_wrapper), session=Depends(get_session)):
     """
     Función utilizada en la aplicación movil, para que un usuario pueda eliminar su usuario.
     :param user_id: credenciales del usuario.
     :param admin_id: credenciales de un usuario administrador.
     :return: verdadero en caso de cumplirse.
     """
-    db_user = select_user(admin_id)
-    if not db_user.admin:
-        raise HTTPException(status_code=401, detail='Unauthorized')
-
-    return delete_user(user_id)
+    return await delete_user(session, user_id)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Dict, List, Optional
 
 """
 Se establecen los objetos de transferencia de datos (DTO), esquemas que son utilizados para
@@ -50,6 +51,14 @@ class Authentication(BaseModel):
         orm_mode = True
 
 
+class RefreshToken(BaseModel):
+    """
+    Clase que hereda de BaseModel, se utiliza para pasar el token de refresco
+    con el que se solicita un nuevo token de acceso.
+    """
+    refresh_token: str
+
+
 class TouristDestination(BaseModel):
     """
         Clase que hereda de Base y hace referencía a un DTO de la información
@@ -94,6 +103,34 @@ class ConservationArea(BaseModel):
         orm_mode = True
 
 
+
+class RatingSummary(BaseModel):
+    """
+        Clase que hereda de BaseModel y representa el resumen de las calificaciones de las
+        opiniones: cantidad y promedio, nulo si no hay opiniones.
+    """
+    count: int
+    average: Optional[float] = None
+
+
+class TouristDestinationDetail(TouristDestination):
+    """
+        Clase que hereda de TouristDestination y agrega el resumen de calificaciones del destino.
+    """
+    rating: RatingSummary
+
+
+class ConservationAreaDetail(ConservationArea):
+    """
+        Clase que hereda de ConservationArea y representa el detalle de un área de conservación
+        con sus destinos turísticos, la cantidad de destinos por tipo y el resumen de calificaciones.
+    """
+    destination_count: int
+    destination_types: Dict[str, int]
+    rating: RatingSummary
+    tourist_destinations: List[TouristDestinationDetail]
+
+
 class Gallery(BaseModel):
     id: int
     profile_id: int
@@ -158,3 +195,66 @@ class Review(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class PublishedReview(Review):
+    """
+        Clase que hereda de Review y representa una opinión de la lista de opiniones de un
+        destino, con la fecha en el formato de la aplicación.
+    """
+    date: str
+
+
+class ConservationAreaSummary(BaseModel):
+    """
+        Clase que hereda de BaseModel y representa el resumen de un área de conservación
+        incluido en el detalle de un destino.
+    """
+    id: int
+    name: str
+    photos_path: str
+
+    class Config:
+        orm_mode = True
+
+
+class DestinationUserState(BaseModel):
+    """
+        Clase que hereda de BaseModel y representa la relación del usuario con un destino:
+        identificador del favorito y del visitado, cero si no existen, y su opinión.
+    """
+    favorite_id: int
+    visited_id: int
+    review: Optional[Review] = None
+
+
+class TouristDestinationAggregate(TouristDestinationDetail):
+    """
+        Clase que hereda de TouristDestinationDetail y representa la pantalla de un destino:
+        el destino, su área de conservación, la primera página de opiniones y el estado del usuario.
+    """
+    conservation_area: Optional[ConservationAreaSummary] = None
+    reviews: List[PublishedReview]
+    user: DestinationUserState
+
+
+class SyncOperation(BaseModel):
+    """
+        Clase que hereda de BaseModel y representa una operación realizada sin conexión por la
+        aplicación móvil. op_id es generado por el cliente y se utiliza para no aplicar dos veces
+        la misma operación; target_id es el destino o área para agregar y el registro para
+        actualizar o eliminar, o bien target_op_id la operación anterior que creó ese registro.
+    """
+    op_id: str
+    action: str
+    target_id: Optional[int] = None
+    target_op_id: Optional[str] = None
+    review: Optional[Review] = None
+
+
+class SyncBatch(BaseModel):
+    """
+        Clase que hereda de BaseModel y representa la lista ordenada de operaciones enviadas
+        por la aplicación móvil al recuperar la conexión.
+    """
+    operations: List[SyncOperation]
@@ -0,0 +1,129 @@
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseSettings, Field
+
+"""
+Se establece la configuración de la aplicación. Las variables de entorno y el archivo .env se leen una
+sola vez al importar este módulo y se validan con sus tipos, de forma que un valor inválido se detecta
+al iniciar y los demás módulos no vuelven a leer el archivo.
+"""
+
+
+class Settings(BaseSettings):
+    """
+    Clase con la configuración de la aplicación, cada atributo corresponde a la variable de entorno
+    con el mismo nombre en mayúsculas.
+    """
+
+    # Base de datos
+    database_url: str
+    database_async: bool = True
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Conexiones adicionales que pueden utilizar a la vez las consultas concurrentes del proceso
+    db_read_fanout: int = 5
+
+    # Réplicas de lectura separadas por comas
+    database_replica_urls: str = ''
+    replica_max_lag: float = 5
+    replica_check_seconds: float = 5
+    replica_sticky_seconds: float = 10
+
+    # Autenticación
+    secret_key: str
+    password_workers: int = 2
+    password_max_pending: int = 64
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 300
+    access_token_minutes: int = 15
+    refresh_token_days: int = 30
+
+    # Redis, revocación de tokens y caché de respuestas
+    redis_url: str = 'redis://localhost:6379/0'
+    revocation_sync_seconds: float = 1
+    revocation_bloom_size: int = 2 ** 20
+    response_cache_ttl: int = 300
+    response_cache_size: int = 1000
+    response_cache_fence: Optional[int] = None
+    response_cache_local: Optional[bool] = None
+
+    # Procesos de la aplicación, la misma variable que utilizan uvicorn y gunicorn
+    web_concurrency: int = 1
+
+    # Límites de intentos de inicio de sesión y de solicitudes de una nueva contraseña
+    throttle_window: int = 60
+    throttle_ip_limit: int = 30
+    throttle_email_limit: int = 5
+    throttle_reset_window: int = 3600
+    throttle_reset_limit: int = 3
+
+    # Correo electrónico
+    mail_username: Optional[str] = None
+    mail_password: Optional[str] = None
+    mail_from: Optional[str] = None
+    mail_port: int
+    mail_server: Optional[str] = None
+    mail_from_name: Optional[str] = Field(None, env=['MAIL_FROM_NAME', 'MAIN_FROM_NAME'])
+    mail_tls: bool = True
+    mail_ssl: bool = False
+    mail_use_credentials: bool = True
+    mail_batch_size: int = 20
+    mail_max_retries: int = 5
+
+    # Diagnóstico: consultas por solicitud, métricas y perfiles
+    query_debug: bool = False
+    query_count_threshold: int = 10
+    query_time_threshold: float = 200
+    n_plus_one_threshold: int = 5
+    metrics_token: Optional[str] = None
+    profile_dir: str = 'profiles'
+    profile_limit: int = 20
+    profile_interval: float = 0.002
+
+    # Codificación de las listas con orjson a partir de las columnas, sin objetos del ORM
+    fast_json: bool = False
+
+    # Filas de cada lote de la exportación del catálogo
+    export_batch_size: int = 1000
+
+    # Filas de cada lote de la importación del catálogo y errores por fila incluidos en el reporte
+    import_batch_size: int = 1000
+    import_max_errors: int = 1000
+
+    # Operaciones máximas de una sincronización y días que se conserva el resultado de cada operación
+    sync_max_operations: int = 200
+    sync_retention_days: int = 30
+
+    # Cambios por página de la sincronización incremental del catálogo
+    sync_changes_limit: int = 500
+
+    # Registros por página de los listados de la administración y máximo contado exactamente al filtrar
+    admin_page_limit: int = 100
+    admin_count_limit: int = 10000
+
+    # Opiniones incluidas en el detalle de un destino
+    destination_detail_reviews: int = 10
+
+    # Directorio del paquete del catálogo y segundos entre cada verificación de cambios, cero para desactivarla
+    catalog_bundle_dir: str = 'bundle'
+    catalog_bundle_seconds: int = 30
+
+    class Config:
+        env_file = '.env'
+        env_file_encoding = 'utf-8'
+
+
+@lru_cache()
+def get_settings():
+    """
+    Función para obtener la configuración, se carga únicamente en la primera llamada.
+    :return: objeto con la configuración de la aplicación.
+    """
+    return Settings()
+
+
+settings = get_settings()
@@ -0,0 +1,144 @@
+import threading
+import time
+
+from fastapi import HTTPException, Request
+
+from src.settings import settings
+
+"""
+Se establecen los límites de intentos permitidos para las rutas que verifican o generan
+contraseñas dentro de una ventana de tiempo. Por dirección IP se cuentan todas las solicitudes, por
+correo electrónico cada intento se reserva antes de verificar la contraseña, de forma que los intentos
+simultáneos no superen el límite, y un inicio de sesión correcto reinicia la ventana, por lo que solo
+se acumulan los intentos fallidos. Las solicitudes de una nueva contraseña se cuentan por separado, de
+forma que un tercero no pueda bloquear el inicio de sesión de otro usuario.
+Los conteos se mantienen en la memoria de cada proceso: con varios procesos de la aplicación cada
+uno aplica sus propios límites, por lo que el límite efectivo es el configurado por la cantidad de
+procesos.
+"""
+THROTTLE_WINDOW = settings.throttle_window
+
+THROTTLE_IP_LIMIT = settings.throttle_ip_limit
+
+THROTTLE_EMAIL_LIMIT = settings.throttle_email_limit
+
+THROTTLE_RESET_WINDOW = settings.throttle_reset_window
+
+THROTTLE_RESET_LIMIT = settings.throttle_reset_limit
+
+# Cantidad de llaves a partir de la cual se eliminan las ventanas vencidas
+THROTTLE_MAX_KEYS = 10000
+
+
+class RateLimiter:
+    """
+    Clase que lleva el conteo de intentos por llave en ventanas fijas de tiempo.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.windows = dict()
+        self.throttled = 0
+
+    def _purge(self, now):
+        """
+        Función para eliminar las ventanas vencidas cuando se acumulan demasiadas llaves.
+        :param now: tiempo actual.
+        """
+        expired = [key for key, (start, _) in self.windows.items() if now - start >= self.window]
+        for key in expired:
+            del self.windows[key]
+
+    def reset(self, key):
+        """
+        Función para reiniciar la ventana de una llave.
+        :param key: llave del intento (dirección IP o correo).
+        """
+        with self.lock:
+            self.windows.pop(key, None)
+
+    def hit(self, key):
+        """
+        Función para registrar un intento de una llave.
+        :param key: llave del intento (dirección IP o correo).
+        :return: segundos que debe esperar la llave, cero si el intento es permitido.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if len(self.windows) > THROTTLE_MAX_KEYS:
+                self._purge(now)
+            start, count = self.windows.get(key, (now, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            count += 1
+            self.windows[key] = (start, count)
+            if count > self.limit:
+                self.throttled += 1
+                return int(self.window - (now - start)) + 1
+            return 0
+
+
+ip_limiter = RateLimiter(THROTTLE_IP_LIMIT, THROTTLE_WINDOW)
+email_limiter = RateLimiter(THROTTLE_EMAIL_LIMIT, THROTTLE_WINDOW)
+reset_limiter = RateLimiter(THROTTLE_RESET_LIMIT, THROTTLE_RESET_WINDOW)
+
+
+def email_key(email: str):
+    return email.strip().lower()
+
+
+def too_many_attempts(retry_after):
+    if retry_after:
+        raise HTTPException(status_code=429, detail='Too many attempts',
+                            headers={'Retry-After': str(retry_after)})
+
+
+def throttle(request: Request, email: str):
+    """
+    Función para limitar los intentos de inicio de sesión de una dirección IP y de un correo
+    electrónico. El intento se registra antes de verificar la contraseña para que los intentos
+    simultáneos de un mismo correo no superen el límite.
+    :param request: solicitud HTTP de la que se obtiene la dirección IP.
+    :param email: correo electrónico utilizado en la solicitud.
+    :raise Error 429: se excedió el número de intentos permitidos.
+    """
+    client_ip = request.client.host if request.client else 'unknown'
+    too_many_attempts(max(ip_limiter.hit(client_ip), email_limiter.hit(email_key(email))))
+
+
+def login_succeeded(email: str):
+    """
+    Función para reiniciar los intentos de un correo electrónico después de iniciar sesión, de forma
+    que los inicios de sesión correctos no se cuenten.
+    :param email: correo electrónico utilizado en la solicitud.
+    """
+    email_limiter.reset(email_key(email))
+
+
+def throttle_reset(request: Request, email: str):
+    """
+    Función para limitar las solicitudes de una nueva contraseña de una dirección IP y de un correo
+    electrónico, sin afectar los intentos de inicio de sesión del correo.
+    :param request: solicitud HTTP de la que se obtiene la dirección IP.
+    :param email: correo electrónico utilizado en la solicitud.
+    :raise Error 429: se excedió el número de solicitudes permitidas.
+    """
+    client_ip = request.client.host if request.client else 'unknown'
+    too_many_attempts(max(ip_limiter.hit(client_ip), reset_limiter.hit(email_key(email))))
+
+
+def throttling_stats():
+    """
+    Función para obtener las métricas de los intentos limitados.
+    :return: diccionario con las llaves registradas y solicitudes rechazadas.
+    """
+    return {
+        'ip_keys': len(ip_limiter.windows),
+        'ip_throttled': ip_limiter.throttled,
+        'email_keys': len(email_limiter.windows),
+        'email_throttled': email_limiter.throttled,
+        'reset_keys': len(reset_limiter.windows),
+        'reset_throttled': reset_limiter.throttled,
+    }